@@ -0,0 +1,197 @@
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Set
+from urllib.parse import parse_qs
+
+import anyio
+from mcp import types
+from mcp.server.sse import SseServerTransport
+from pydantic import ValidationError
+from starlette.responses import Response
+from starlette.types import Message, Receive, Scope, Send
+
+# JSON-RPC error code (implementation-defined server error range) for requests shed under load
+OVERLOADED = -32000
+
+
+class SessionSlot:
+    """Admission state of one SSE session: the ids of its unanswered requests and its queued rejections"""
+
+    def __init__(self, rejections, cancel_scope: anyio.CancelScope):
+        self.rejections = rejections
+        self.cancel_scope = cancel_scope
+        self.inflight: Set[Any] = set()
+
+
+class CountingWriteStream:
+    """The write stream handed to the MCP server; frees an in-flight slot as each response goes out"""
+
+    def __init__(self, stream, slot: SessionSlot):
+        self._stream = stream
+        self._slot = slot
+
+    async def send(self, message: types.JSONRPCMessage) -> None:
+        if isinstance(message.root, (types.JSONRPCResponse, types.JSONRPCError)):
+            self._slot.inflight.discard(message.root.id)
+        await self._stream.send(message)
+
+    async def __aenter__(self) -> "CountingWriteStream":
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> Optional[bool]:
+        return await self._stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+class AdmissionControl:
+    """Caps concurrent SSE sessions and each session's in-flight requests
+
+    A new stream beyond `max_sessions` gets 503 with Retry-After. A request
+    beyond `max_inflight` unanswered ones on its session is answered with a
+    JSON-RPC error (code OVERLOADED, data.retry_after) instead of joining
+    the queue, so admitted requests keep their latency under a burst. The
+    POST itself still gets 202 at once: the MCP SSE client drops the whole
+    session when a message POST fails. The error is queued behind the
+    session's responses in a buffer of `max_inflight` messages, so each
+    session holds at most 2 * max_inflight messages. When that buffer is
+    full the POST waits up to `reject_timeout` seconds for room; a session
+    still not reading its stream by then is closed, which fails every
+    request still pending on it, rather than leaving a shed request
+    unanswered. A cap of 0 disables it.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_inflight: int = 32, retry_after: float = 1.0,
+                 reject_timeout: float = 5.0):
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.reject_timeout = reject_timeout
+        self.sessions: Dict[str, SessionSlot] = {}
+        self.rejected_sessions = 0
+        self.rejected_requests = 0
+        self.closed_sessions = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionControl":
+        """Configure from MCP_SSE_MAX_SESSIONS, MCP_SSE_MAX_INFLIGHT, MCP_SSE_RETRY_AFTER and MCP_SSE_REJECT_TIMEOUT"""
+        return cls(
+            max_sessions=int(os.environ.get("MCP_SSE_MAX_SESSIONS", "1000")),
+            max_inflight=int(os.environ.get("MCP_SSE_MAX_INFLIGHT", "32")),
+            retry_after=float(os.environ.get("MCP_SSE_RETRY_AFTER", "1")),
+            reject_timeout=float(os.environ.get("MCP_SSE_REJECT_TIMEOUT", "5")),
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "sessions": len(self.sessions),
+            "inflight": sum(len(slot.inflight) for slot in self.sessions.values()),
+            "rejected_sessions": self.rejected_sessions,
+            "rejected_requests": self.rejected_requests,
+            "closed_sessions": self.closed_sessions,
+        }
+
+    def _overloaded(self, what: str) -> Response:
+        return Response(f"{what}; retry after {self.retry_after:g}s", status_code=503,
+                        headers={"Retry-After": str(math.ceil(self.retry_after))})
+
+    def reject_session(self) -> Optional[Response]:
+        """The 503 to answer a new SSE stream with when at the session cap, else None"""
+        if self.max_sessions and len(self.sessions) >= self.max_sessions:
+            self.rejected_sessions += 1
+            return self._overloaded("Too many sessions")
+        return None
+
+    @asynccontextmanager
+    async def session(self, sse: SseServerTransport, scope: Scope, receive: Receive, send: Send):
+        """Connect an admitted SSE stream and track it until the client goes away"""
+        with anyio.CancelScope() as cancel_scope:
+            async def watch_disconnect() -> Message:
+                # connect_sse keeps serving a session after its client disconnects;
+                # end it here so dead sessions do not hold slots under the cap
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    cancel_scope.cancel()
+                return message
+
+            before = set(sse._read_stream_writers)
+            async with sse.connect_sse(scope, watch_disconnect, send) as (read_stream, write_stream):
+                # connect_sse registers its session before it first suspends, so the one new id is ours
+                (session_id,) = set(sse._read_stream_writers) - before
+                rejections, queued = anyio.create_memory_object_stream(max(self.max_inflight, 1))
+                slot = self.sessions[session_id.hex] = SessionSlot(rejections, cancel_scope)
+
+                async def send_rejections() -> None:
+                    async with queued:
+                        async for error in queued:
+                            await write_stream.send(error)
+
+                try:
+                    async with anyio.create_task_group() as tg:
+                        tg.start_soon(send_rejections)
+                        try:
+                            yield read_stream, CountingWriteStream(write_stream, slot)
+                        finally:
+                            tg.cancel_scope.cancel()
+                finally:
+                    rejections.close()
+                    del self.sessions[session_id.hex]
+                    # Later POSTs for the session get 404 instead of waiting on a stream nobody reads
+                    sse._read_stream_writers.pop(session_id, None)
+
+    async def handle_post_message(self, sse: SseServerTransport, scope: Scope, receive: Receive, send: Send) -> None:
+        """ASGI app in front of sse.handle_post_message that sheds requests over the in-flight cap"""
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+
+        session_id = parse_qs(scope.get("query_string", b"").decode()).get("session_id", [None])[0]
+        slot = self.sessions.get(session_id)
+        if slot is not None:
+            try:
+                request = types.JSONRPCMessage.model_validate_json(body).root
+            except ValidationError:
+                request = None
+            if isinstance(request, types.JSONRPCRequest):
+                if self.max_inflight and len(slot.inflight) >= self.max_inflight:
+                    self.rejected_requests += 1
+                    if await self._reject(slot, request.id):
+                        await Response("Accepted", status_code=202)(scope, receive, send)
+                    else:
+                        await self._overloaded("Session closed: not reading its responses")(scope, receive, send)
+                    return
+                slot.inflight.add(request.id)
+
+        replayed = False
+
+        async def replay() -> dict:
+            # The body was read above; hand it to the transport as if unread
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await sse.handle_post_message(scope, replay, send)
+
+    async def _reject(self, slot: SessionSlot, request_id: Any) -> bool:
+        """Queue the OVERLOADED error for `request_id`; False if the session was closed instead"""
+        error = types.ErrorData(code=OVERLOADED, message=f"Server overloaded; retry after {self.retry_after:g}s",
+                                data={"retry_after": self.retry_after})
+        message = types.JSONRPCMessage(types.JSONRPCError(jsonrpc="2.0", id=request_id, error=error))
+        try:
+            with anyio.fail_after(self.reject_timeout):
+                await slot.rejections.send(message)
+            return True
+        except TimeoutError:
+            # The client is not reading its stream; end the session so nothing is left waiting on it
+            self.closed_sessions += 1
+            slot.cancel_scope.cancel()
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            pass
+        return False
@@ -0,0 +1,251 @@
+"""Open-loop overload test of SSE admission control.
+
+    python bench_admission.py --rates 200 400 800 1600 --duration 5
+    python bench_admission.py multi_tools_server.py --op get_order_by_id --sessions 16 --max-inflight 2
+    python bench_admission.py --handler-delay 0.2 --rates 20 40 80 160 --duration 10 --drain 120
+
+Sends requests at fixed offered rates, whether or not earlier ones have
+been answered, against one SSE worker started without caps
+(MCP_SSE_MAX_SESSIONS/MCP_SSE_MAX_INFLIGHT=0) and with them. The mcp
+client posts one message at a time per session, so this drives the
+transport with raw JSON-RPC instead and keeps many requests in flight per
+session, as a pipelining client would.
+
+With the default cheap ops the client and server share the CPU and the
+cap barely matters. --handler-delay makes handler time dominate: a session
+handles its requests one at a time, so 8 sessions at 0.2s top out at 40/s.
+On one core (p99 ms):
+
+    rate/s   uncapped   capped (shed)
+        40        400      312 (0)
+        80      10291      843 (384)
+       160      30906    32173 (4)
+
+At 80/s the uncapped run queues without bound. The capped run sheds the
+excess with fast OVERLOADED errors, and admitted requests stay within a few
+handler times. At 160/s the client process itself saturates the core and
+posts arrive slower than they are shed, so neither run is meaningful there.
+
+--burst N instead posts N requests at once on one session of a capped
+server and exits non-zero unless every request id gets an answer, either a
+result or an OVERLOADED error; pick N above 2 * --max-inflight so shed
+errors back up behind the session's responses.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+import httpx
+from httpx_sse import aconnect_sse
+from rich import print
+
+from admission import OVERLOADED
+from bench_load import PROFILES, SERVER_PROFILES, percentile, start_sse_server, stop_process
+
+# JSON-RPC method and params for each kind of bench_load operation
+METHODS = {
+    "call_tool": lambda target, arguments: ("tools/call", {"name": target, "arguments": arguments}),
+    "read_resource": lambda target, arguments: ("resources/read", {"uri": target}),
+    "get_prompt": lambda target, arguments: ("prompts/get", {"name": target, "arguments": arguments}),
+}
+
+
+class PipelinedSession:
+    """One SSE session that posts requests without waiting for earlier answers"""
+
+    def __init__(self, client: httpx.AsyncClient, url: str):
+        self._client = client
+        self._url = url
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._endpoint: Optional[asyncio.Future] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "PipelinedSession":
+        self._endpoint = asyncio.get_running_loop().create_future()
+        self._reader = asyncio.create_task(self._read())
+        self.endpoint = await self._endpoint
+        await self.request("initialize", {"protocolVersion": "2024-11-05", "capabilities": {},
+                                          "clientInfo": {"name": "bench_admission", "version": "1"}})
+        await self._post({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._reader.cancel()
+        await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read(self) -> None:
+        try:
+            async with aconnect_sse(self._client, "GET", self._url) as source:
+                async for sse in source.aiter_sse():
+                    if sse.event == "endpoint":
+                        self._endpoint.set_result(urljoin(self._url, sse.data))
+                    elif sse.event == "message":
+                        message = json.loads(sse.data)
+                        future = self._pending.pop(message.get("id"), None)
+                        if future is not None and not future.done():
+                            future.set_result(message)
+            raise ConnectionError("SSE stream closed")
+        except Exception as e:
+            # Fail whoever is still waiting rather than leaving them hanging
+            for future in [self._endpoint, *self._pending.values()]:
+                if not future.done():
+                    future.set_exception(e)
+            self._pending.clear()
+            raise
+
+    async def _post(self, message: dict) -> None:
+        response = await self._client.post(self.endpoint, json=message)
+        response.raise_for_status()
+
+    async def request(self, method: str, params: dict) -> dict:
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        await self._post({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        return await future
+
+
+async def offer(url: str, method: str, params: dict, sessions: int, rate: float,
+                duration: float, drain: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    counts = {"sent": 0, "rejected": 0, "errors": 0, "timeouts": 0}
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    timing = {}
+
+    async def one(session: PipelinedSession) -> None:
+        start = time.perf_counter()
+        try:
+            message = await session.request(method, params)
+        except Exception:
+            counts["errors"] += 1
+            return
+        if "error" in message:
+            counts["rejected" if message["error"]["code"] == OVERLOADED else "errors"] += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    async def session_task(i: int, client: httpx.AsyncClient) -> None:
+        released = False
+        try:
+            async with PipelinedSession(client, url) as session:
+                ready.release()
+                released = True
+                await go.wait()
+                interval = sessions / rate
+                # Stagger the sessions so arrivals are spread evenly
+                next_at = timing["start"] + interval * i / sessions
+                pending = set()
+                while next_at < timing["start"] + duration:
+                    await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                    pending.add(asyncio.create_task(one(session)))
+                    counts["sent"] += 1
+                    next_at += interval
+                if pending:
+                    _, pending = await asyncio.wait(pending, timeout=drain)
+                counts["timeouts"] += len(pending)
+                for task in pending:
+                    task.cancel()
+        finally:
+            if not released:
+                ready.release()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(None), limits=limits) as client:
+        tasks = [asyncio.create_task(session_task(i, client)) for i in range(sessions)]
+        for _ in tasks:
+            await ready.acquire()
+        timing["start"] = time.perf_counter()
+        go.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    values = sorted(latencies)
+    return {**counts, "ok": len(values), "goodput": len(values) / duration,
+            "p50_ms": percentile(values, 50) * 1000, "p99_ms": percentile(values, 99) * 1000}
+
+
+async def burst(url: str, method: str, params: dict, count: int, drain: float) -> Dict[str, int]:
+    """Post `count` requests at once on one session; count how each id was answered"""
+    counts = {"ok": 0, "rejected": 0, "errors": 0, "unanswered": 0}
+    async with httpx.AsyncClient(timeout=httpx.Timeout(None)) as client:
+        async with PipelinedSession(client, url) as session:
+            tasks = [asyncio.create_task(session.request(method, params)) for _ in range(count)]
+            done, pending = await asyncio.wait(tasks, timeout=drain)
+            counts["unanswered"] = len(pending)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                message = None if task.exception() else task.result()
+                if message is None or ("error" in message and message["error"]["code"] != OVERLOADED):
+                    counts["errors"] += 1
+                else:
+                    counts["rejected" if "error" in message else "ok"] += 1
+    return counts
+
+
+async def run(args) -> None:
+    args.server = args.server or ("slow_echo_server.py" if args.handler_delay else "server_sse.py")
+    profile = PROFILES[SERVER_PROFILES.get(os.path.basename(args.server), "customerdb")]
+    if args.handler_delay:
+        kind, target, arguments = "call_tool", "slow_echo_tool", {"message": "hello", "seconds": args.handler_delay}
+    else:
+        kind, target, arguments, _ = profile[args.op] if args.op else next(iter(profile.values()))
+    method, params = METHODS[kind](target, arguments)
+    if args.burst:
+        env = dict(os.environ, MCP_SSE_MAX_SESSIONS=str(args.max_sessions), MCP_SSE_MAX_INFLIGHT=str(args.max_inflight),
+                   MCP_SSE_RETRY_AFTER=str(args.retry_after), FASTMCP_LOG_LEVEL=args.log_level)
+        server, url = await start_sse_server(args.server, env)
+        try:
+            r = await burst(url, method, params, args.burst, args.drain)
+        finally:
+            stop_process(server)
+        print(f"burst of {args.burst}: {r['ok']} ok, {r['rejected']} shed, {r['errors']} errors, "
+              f"{r['unanswered']} unanswered")
+        if r["errors"] or r["unanswered"]:
+            raise SystemExit(1)
+        return
+    configs = {"uncapped": ("0", "0"), "capped": (str(args.max_sessions), str(args.max_inflight))}
+    print(f"{'config':<10}{'rate/s':>8}{'sent':>7}{'ok':>7}{'shed':>7}{'err':>6}{'t/o':>6}"
+          f"{'goodput/s':>11}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, (max_sessions, max_inflight) in configs.items():
+        env = dict(os.environ, MCP_SSE_MAX_SESSIONS=max_sessions, MCP_SSE_MAX_INFLIGHT=max_inflight,
+                   MCP_SSE_RETRY_AFTER=str(args.retry_after), FASTMCP_LOG_LEVEL=args.log_level)
+        for rate in args.rates:
+            # A fresh server per step, so one step's backlog never leaks into the next
+            server, url = await start_sse_server(args.server, env)
+            try:
+                r = await offer(url, method, params, args.sessions, rate, args.duration, args.drain)
+            finally:
+                stop_process(server)
+            print(f"{label:<10}{rate:>8g}{r['sent']:>7}{r['ok']:>7}{r['rejected']:>7}{r['errors']:>6}"
+                  f"{r['timeouts']:>6}{r['goodput']:>11.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("server", nargs="?",
+                        help="default: server_sse.py, or slow_echo_server.py with --handler-delay")
+    parser.add_argument("--op", help="operation from the server's bench_load profile (default: the first)")
+    parser.add_argument("--handler-delay", type=float, default=0.0,
+                        help="call slow_echo_server.py's slow_echo_tool, which waits this many seconds, instead")
+    parser.add_argument("--rates", nargs="+", type=float, default=[200, 400, 800, 1600],
+                        help="offered requests per second, across all sessions")
+    parser.add_argument("--burst", type=int, default=0,
+                        help="post this many requests at once on one capped session and check each is answered")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for answers after sending stops")
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--max-inflight", type=int, default=4)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--log-level", default="WARNING",
+                        help="server log level; per-request INFO lines cost as much as the requests")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
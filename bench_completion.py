@@ -0,0 +1,88 @@
+"""Per-turn latency of MCPClient.chat_loop under each completion-detection mode.
+
+    python bench_completion.py --token-delay 0.01 --first-token-delay 0.2
+
+Drives a scripted conversation through chat_loop against the CustomerDB
+server and fake_llm_server.py, once per mode, and reports the mean and p95
+time per user turn plus how many completion-check requests were made.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from rich import print
+
+from bench_load import free_port, percentile, stop_process, wait_for_port
+from completion import COMPLETION_MODES
+from test_mcp_client import load_client_module
+
+SCRIPT = [
+    "What is the status of order 24601?",
+    "And order 97531?",
+    "Look up the customer john@gmail.com",
+    "Check orders 86420 and 19283",
+    "Thanks, that's all for now",
+]
+
+
+async def run_mode(module, mode: str, rounds: int) -> dict:
+    client = module.MCPClient(completion_mode=mode)
+    await client.connect_to_server("multi_tools_server.py")
+    checks = 0
+    create = client.anthropic.messages.create
+
+    async def counted_create(**kwargs):
+        # chat_loop only uses create() for the completion check; turns are streamed
+        nonlocal checks
+        checks += 1
+        return await create(**kwargs)
+
+    client.anthropic.messages.create = counted_create
+    inputs = iter(SCRIPT * rounds + ["quit"])
+    stamps = []
+
+    def read_input(prompt: str) -> str:
+        stamps.append(time.perf_counter())
+        return next(inputs)
+
+    await client.chat_loop(read_input)
+    turns = sorted(b - a for a, b in zip(stamps, stamps[1:]))
+    return {"mode": mode, "turns": len(turns), "mean_ms": sum(turns) / len(turns) * 1000,
+            "p95_ms": percentile(turns, 95) * 1000, "checks": checks}
+
+
+async def run(args) -> None:
+    port = free_port()
+    llm = subprocess.Popen([sys.executable, "fake_llm_server.py", "--port", str(port),
+                            "--first-token-delay", str(args.first_token_delay),
+                            "--token-delay", str(args.token_delay)])
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("ANTHROPIC_API_KEY", "fake")
+    try:
+        await wait_for_port(port)
+        module = load_client_module()
+        reports = [await run_mode(module, mode, args.rounds) for mode in args.modes]
+    finally:
+        stop_process(llm)
+
+    baseline = next((r for r in reports if r["mode"] == "llm"), None)
+    print(f"\n{'mode':<14}{'turns':>7}{'mean ms':>10}{'p95 ms':>10}{'checks':>8}{'saved/turn':>12}")
+    for r in reports:
+        saved = f"{baseline['mean_ms'] - r['mean_ms']:.1f} ms" if baseline else "n/a"
+        print(f"{r['mode']:<14}{r['turns']:>7}{r['mean_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['checks']:>8}{saved:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=COMPLETION_MODES, default=list(COMPLETION_MODES))
+    parser.add_argument("--rounds", type=int, default=2, help="times to repeat the scripted conversation")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="fake LLM time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake LLM delay per streamed chunk")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Load generator and latency benchmark for the MCP servers over stdio or SSE.
+
+Starts the server locally, opens N concurrent client sessions and drives a
+weighted mix of call_tool / read_resource / get_prompt operations for a
+fixed duration, then reports throughput and p50/p95/p99 latency per
+operation. Results can be written as JSON and compared with an earlier run.
+
+    python bench_load.py multi_tools_server.py --sessions 8 --duration 10
+    python bench_load.py server.py --transport sse --json echo.json
+    python bench_load.py multi_tools_server.py --mix get_user=5,list_orders=1 --compare before.json
+    python bench_load.py --url http://localhost:8000/sse --profile echo
+    python bench_load.py multi_tools_server.py --sessions 16 --pool 4
+
+With --pool N the --sessions concurrent drivers share one SessionPool of N
+server sessions instead of each opening its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from rich import print
+
+from session_pool import SessionPool
+
+# Named operations per server: (kind, name or uri, arguments, default weight)
+PROFILES: Dict[str, Dict[str, Tuple[str, str, dict, int]]] = {
+    "echo": {
+        "echo_tool": ("call_tool", "echo_tool", {"message": "hello"}, 4),
+        "echo_resource": ("read_resource", "echo://hello", {}, 2),
+        "echo_prompt": ("get_prompt", "echo_prompt", {"message": "hello"}, 1),
+    },
+    "customerdb": {
+        "get_user": ("call_tool", "get_user", {"key": "email", "value": "john@gmail.com"}, 4),
+        "get_order_by_id": ("call_tool", "get_order_by_id", {"order_id": "24601"}, 4),
+        "get_customer_orders": ("call_tool", "get_customer_orders", {"customer_id": "1213210"}, 2),
+        "get_orders_by_ids": ("call_tool", "get_orders_by_ids", {"order_ids": ["24601", "97531", "86420"]}, 1),
+        "list_customers": ("read_resource", "customers://all", {}, 1),
+        "list_orders": ("read_resource", "orders://all", {}, 1),
+        "track_order": ("get_prompt", "track_order", {"order_id": "24601"}, 1),
+    },
+}
+SERVER_PROFILES = {"server.py": "echo", "server_sse.py": "echo", "slow_echo_server.py": "echo",
+                   "multi_tools_server.py": "customerdb"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def parse_mix(spec: Optional[str], profile: Dict[str, tuple]) -> Dict[str, int]:
+    if not spec:
+        return {name: op[3] for name, op in profile.items()}
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name not in profile:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(profile)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stop_process(process: subprocess.Popen, timeout: float = 5.0) -> None:
+    """Terminate a server, killing it if graceful shutdown stalls on open SSE streams"""
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"server did not listen on port {port}")
+
+
+async def start_sse_server(script: str, env: Optional[dict] = None) -> Tuple[subprocess.Popen, str]:
+    """Serve `script`'s FastMCP app over SSE in one worker; returns the process and its /sse URL"""
+    port = free_port()
+    module = os.path.splitext(os.path.basename(script))[0]
+    server = subprocess.Popen([sys.executable, "sse_cluster.py", f"{module}:mcp", "--worker", "--port", str(port)],
+                              cwd=os.path.dirname(os.path.abspath(script)), env=env)
+    try:
+        await wait_for_port(port)
+    except BaseException:
+        # Never leave a half-started worker behind
+        stop_process(server)
+        raise
+    return server, f"http://127.0.0.1:{port}/sse"
+
+
+@asynccontextmanager
+async def open_session(args, url: Optional[str]):
+    """Open one initialized ClientSession over the configured transport"""
+    async with AsyncExitStack() as stack:
+        if url:
+            read, write = await stack.enter_async_context(sse_client(url))
+        else:
+            params = StdioServerParameters(command=sys.executable, args=[args.server], env=dict(os.environ))
+            read, write = await stack.enter_async_context(stdio_client(params))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        yield session
+
+
+async def run_op(session: ClientSession, op: tuple):
+    kind, target, arguments, _ = op
+    if kind == "call_tool":
+        result = await session.call_tool(target, arguments)
+        if getattr(result, "isError", False):
+            raise RuntimeError(result.content[0].text if result.content else "tool error")
+        return result
+    if kind == "read_resource":
+        return await session.read_resource(target)
+    return await session.get_prompt(target, arguments)
+
+
+async def drive(session: ClientSession, ops: List[tuple], names: List[str], weights: List[int],
+                deadline: float, rng: random.Random, latencies: Dict[str, List[float]],
+                errors: Dict[str, int]) -> None:
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            await run_op(session, ops[names.index(name)])
+        except Exception:
+            errors[name] += 1
+            continue
+        latencies[name].append(time.perf_counter() - start)
+
+
+async def run_benchmark(args) -> dict:
+    profile_name = args.profile or SERVER_PROFILES.get(os.path.basename(args.server or ""), "customerdb")
+    profile = PROFILES[profile_name]
+    mix = parse_mix(args.mix, profile)
+    names = list(mix)
+    ops = [profile[name] for name in names]
+    weights = [mix[name] for name in names]
+
+    server = None
+    url = args.url
+    if not url and args.transport == "sse":
+        server, url = await start_sse_server(args.server)
+
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    timing = {}
+
+    async def session_task(i: int) -> None:
+        # Each session lives in its own task: anyio scopes must exit in the task that entered them
+        released = False
+        try:
+            async with open_session(args, url) as session:
+                # Warm every session (and the server's caches) before measuring
+                for op in ops:
+                    await run_op(session, op)
+                ready.release()
+                released = True
+                await go.wait()
+                await drive(session, ops, names, weights, timing["deadline"], random.Random(args.seed + i),
+                            latencies, errors)
+        except BaseException:
+            # Unblock the coordinator so the failure surfaces from gather()
+            if not released:
+                ready.release()
+            raise
+
+    try:
+        if args.pool:
+            pool = SessionPool.sse(url, args.pool) if url else SessionPool.stdio(args.server, args.pool)
+            async with pool:
+                # Warm every pool member before measuring
+                await asyncio.gather(*(run_op(pool, op) for _ in range(args.pool) for op in ops))
+                start = time.perf_counter()
+                await asyncio.gather(*(drive(pool, ops, names, weights, start + args.duration,
+                                             random.Random(args.seed + i), latencies, errors)
+                                       for i in range(args.sessions)))
+                elapsed = time.perf_counter() - start
+        else:
+            tasks = [asyncio.create_task(session_task(i)) for i in range(args.sessions)]
+            for _ in range(args.sessions):
+                await ready.acquire()
+            start = time.perf_counter()
+            timing["deadline"] = start + args.duration
+            go.set()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            stop_process(server)
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "config": {
+            "server": args.server, "url": args.url, "transport": "sse" if url else "stdio",
+            "profile": profile_name, "sessions": args.sessions, "pool": args.pool, "duration": args.duration,
+            "mix": mix, "seed": args.seed,
+            "python": platform.python_version(), "platform": platform.platform(),
+        },
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "operations": {name: summarize(latencies[name], errors[name], elapsed) for name in names},
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    config = report["config"]
+    print(f"\n{config['transport']} | {config['server'] or config['url']} | "
+          f"{config['sessions']} sessions | {config['duration']}s")
+    print(f"{'operation':<22}{'count':>8}{'err':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(report["operations"].items()) + [("TOTAL", report["total"])]
+    for name, stats in rows:
+        print(f"{name:<22}{stats['count']:>8}{stats['errors']:>6}{stats['throughput']:>10.1f}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+        if baseline is not None:
+            old = baseline["total"] if name == "TOTAL" else baseline["operations"].get(name)
+            if old:
+                print(f"{'  vs baseline':<22}{'':>14}{_delta(stats['throughput'], old['throughput']):>10}"
+                      f"{_delta(stats['p50_ms'], old['p50_ms']):>10}{_delta(stats['p95_ms'], old['p95_ms']):>10}"
+                      f"{_delta(stats['p99_ms'], old['p99_ms']):>10}")
+
+
+def _delta(new: float, old: float) -> str:
+    return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("server", nargs="?", default="multi_tools_server.py", help="server script to start")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--url", help="benchmark an already running SSE server instead of starting one")
+    parser.add_argument("--profile", choices=list(PROFILES), help="operation set (default: inferred from server)")
+    parser.add_argument("--mix", help="operation weights, e.g. get_user=5,list_orders=1")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--pool", type=int, default=0,
+                        help="share a SessionPool of this many server sessions between the drivers")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
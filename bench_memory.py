@@ -0,0 +1,58 @@
+"""Compare the memory footprint of the dict-of-lists and columnar CustomerDB stores.
+
+Usage: python bench_memory.py [num_customers] [orders_per_customer]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from rich import print
+
+from customer_db import FakeDatabase
+from columnar_db import ColumnarDatabase, STATUSES
+
+PRODUCTS = ["Wireless Headphones", "Smartphone Case", "Bluetooth Speaker", "Fitness Tracker",
+            "Laptop Sleeve", "Wireless Mouse", "Gaming Keyboard", "Portable Charger"]
+
+
+def make_customers(n: int):
+    for i in range(n):
+        yield {"id": str(1000000 + i), "name": f"Customer {i}", "email": f"user{i}@example.com",
+               "phone": f"{i % 1000:03d}-{i % 997:03d}-{i % 10000:04d}", "username": f"user{i}"}
+
+
+def make_orders(n: int, per_customer: int):
+    for i in range(n * per_customer):
+        yield {"id": str(10000000 + i), "customer_id": str(1000000 + i // per_customer),
+               "product": PRODUCTS[i % len(PRODUCTS)], "quantity": 1 + i % 3,
+               "price": 9.99 + (i % 50), "status": STATUSES[i % 3]}
+
+
+def measure(factory, n: int, per_customer: int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = factory(make_customers(n), make_orders(n, per_customer))
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, current, peak, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_customer = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{n} customers, {n * per_customer} orders")
+    results = {}
+    for name, factory in [("dict-of-lists", FakeDatabase), ("columnar", ColumnarDatabase)]:
+        store, current, peak, elapsed = measure(factory, n, per_customer)
+        results[name] = current
+        print(f"{name:>14}: retained {current / 2**20:8.1f} MiB, "
+              f"peak {peak / 2**20:8.1f} MiB, load {elapsed:.2f}s")
+        del store
+    print(f"columnar uses {results['columnar'] / results['dict-of-lists']:.0%} of the dict layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Payload size and encode/decode cost of text versus JSON tool output.
+
+    python bench_output.py 1 10 100 1000 --repeat 200
+
+For a customer with N orders, renders get_customer_orders both ways, then
+turns each payload back into records the way a downstream consumer would:
+scraping the prose with a regex, or a single JSON decode. Encoding uses
+orjson when it is installed and the stdlib json module otherwise.
+"""
+import argparse
+import re
+import timeit
+
+from rich import print
+
+from bench_memory import make_orders
+from tool_output import CUSTOMER_ORDER_FIELDS, dumps, format_customer_orders, loads, orjson, records, table
+
+_ORDER_TEXT = re.compile(
+    r"Order ID: (?P<id>.*)\nProduct: (?P<product>.*)\nQuantity: (?P<quantity>\d+)\n"
+    r"Price: \$(?P<price>[\d.]+)\nStatus: (?P<status>.*)"
+)
+
+
+def parse_orders_text(text: str, customer_id: str) -> list:
+    """What clients had to do to get fields back out of the prose"""
+    return [
+        dict(m.groupdict(), customer_id=customer_id, quantity=int(m["quantity"]), price=float(m["price"]))
+        for m in _ORDER_TEXT.finditer(text)
+    ]
+
+
+def run(n: int, repeat: int) -> dict:
+    orders = [dict(order, customer_id="1000000") for order in make_orders(n, 1)]
+    customer_id = "1000000"
+    encoders = {
+        "text": lambda: format_customer_orders(customer_id, orders),
+        "json": lambda: dumps(dict(customer_id=customer_id, **table(orders, CUSTOMER_ORDER_FIELDS))),
+    }
+    decoders = {
+        "text": lambda payload: parse_orders_text(payload, customer_id),
+        "json": lambda payload: records(loads(payload)),
+    }
+    report = {"orders": n}
+    for mode in ("text", "json"):
+        payload = encoders[mode]()
+        decoded = decoders[mode](payload)
+        assert len(decoded) == n and decoded[0]["price"] == orders[0]["price"], mode
+        report[f"{mode}_bytes"] = len(payload.encode())
+        report[f"{mode}_encode_us"] = timeit.timeit(encoders[mode], number=repeat) / repeat * 1e6
+        report[f"{mode}_decode_us"] = timeit.timeit(lambda: decoders[mode](payload), number=repeat) / repeat * 1e6
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sizes", nargs="*", type=int, default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'orders':>8}{'text B':>10}{'json B':>10}{'text enc us':>13}{'json enc us':>13}"
+          f"{'text dec us':>13}{'json dec us':>13}")
+    for n in args.sizes:
+        r = run(n, args.repeat)
+        print(f"{r['orders']:>8}{r['text_bytes']:>10}{r['json_bytes']:>10}"
+              f"{r['text_encode_us']:>13.1f}{r['json_encode_us']:>13.1f}"
+              f"{r['text_decode_us']:>13.1f}{r['json_decode_us']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Cold-start benchmark for the stdio servers.
+
+    python bench_startup.py multi_tools_server.py --runs 5
+    python bench_startup.py server.py --top 15
+
+Reports, per server script:
+  * the slowest imports from `python -X importtime` (cumulative microseconds);
+  * cold start: spawn -> initialize result -> first tool call, with the
+    CustomerDB data loaded up front (CUSTOMERDB_DEFER_LOAD=0) and deferred;
+  * warm spare: the same, with the process taken from a WarmSpawner.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from rich import print
+
+from bench_load import PROFILES, SERVER_PROFILES
+from warm_stdio import WarmSpawner
+
+
+def import_times(script: str) -> Tuple[int, List[Tuple[int, str]]]:
+    """Total import time of `script`'s module and its slowest imports, in microseconds"""
+    module = os.path.splitext(os.path.basename(script))[0]
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=os.path.dirname(os.path.abspath(script)), capture_output=True, text=True)
+    rows, total = [], 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative), name.strip()))
+        # The name column is indented by nesting depth; " name" is top level
+        if not name[1:].startswith(" "):
+            # Top-level entries cover everything imported beneath them
+            total += int(cumulative)
+    return total, sorted(rows, reverse=True)
+
+
+async def first_call(session: ClientSession, script: str) -> None:
+    kind, target, arguments, _ = next(iter(PROFILES[SERVER_PROFILES.get(os.path.basename(script), "echo")].values()))
+    await session.call_tool(target, arguments)
+
+
+async def timed_session(transport, script: str) -> Tuple[float, float]:
+    start = time.perf_counter()
+    async with transport() as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter()
+            await first_call(session, script)
+            return initialized - start, time.perf_counter() - start
+
+
+async def measure(script: str, runs: int) -> Dict[str, List[Tuple[float, float]]]:
+    results = {}
+    for label, defer in (("cold, eager load", "0"), ("cold, deferred load", "1")):
+        params = StdioServerParameters(command=sys.executable, args=[script],
+                                       env=dict(os.environ, CUSTOMERDB_DEFER_LOAD=defer))
+        results[label] = [await timed_session(lambda: stdio_client(params), script) for _ in range(runs)]
+
+    params = StdioServerParameters(command=sys.executable, args=[script], env=dict(os.environ))
+    spawner = WarmSpawner(params, spares=1)
+    try:
+        results["warm spare"] = []
+        for _ in range(runs):
+            # Sessions arrive after the replacement spare has had time to warm up
+            await spawner.ready()
+            results["warm spare"].append(await timed_session(spawner.client, script))
+    finally:
+        await spawner.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("servers", nargs="*", default=["multi_tools_server.py", "server.py"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    for script in args.servers:
+        total, rows = import_times(script)
+        print(f"\n[bold]{script}[/bold]: imports take {total / 1000:.1f} ms")
+        for cumulative, name in rows[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+        results = asyncio.run(measure(script, args.runs))
+        print(f"{'median of runs':<22}{'initialize ms':>15}{'first call ms':>15}")
+        for label, samples in results.items():
+            init = sorted(s[0] for s in samples)[len(samples) // 2] * 1000
+            call = sorted(s[1] for s in samples)[len(samples) // 2] * 1000
+            print(f"{label:<22}{init:>15.1f}{call:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
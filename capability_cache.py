@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mcp import ClientSession, types
+
+# Server notification -> the capability list it invalidates
+LIST_CHANGED = {
+    types.ToolListChangedNotification: "tools",
+    types.ResourceListChangedNotification: "resources",
+    types.PromptListChangedNotification: "prompts",
+}
+
+
+class CapabilityCache:
+    """Tools, resources and prompts of one session, listed once and reused
+
+    A list is fetched again only after the server sends the matching
+    list_changed notification, or once it is older than `ttl` seconds
+    (None keeps it until invalidated). The Anthropic tool schemas are
+    converted once per tools fetch rather than once per query.
+    """
+
+    def __init__(self, session: ClientSession, ttl: Optional[float] = 300.0):
+        self.session = session
+        self.ttl = ttl
+        self.fetches = 0
+        self._entries: Dict[str, Tuple[float, List[Any]]] = {}
+        self._anthropic_tools: Optional[List[Dict[str, Any]]] = None
+        self._locks = {kind: asyncio.Lock() for kind in LIST_CHANGED.values()}
+
+    def _fresh(self, kind: str) -> Optional[List[Any]]:
+        entry = self._entries.get(kind)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            return None
+        return entry[1]
+
+    async def _get(self, kind: str) -> List[Any]:
+        items = self._fresh(kind)
+        if items is not None:
+            return items
+        async with self._locks[kind]:
+            # Another caller may have fetched it while we waited
+            items = self._fresh(kind)
+            if items is None:
+                if kind == "tools":
+                    items = (await self.session.list_tools()).tools
+                    self._anthropic_tools = None
+                elif kind == "resources":
+                    items = (await self.session.list_resources()).resources
+                else:
+                    items = (await self.session.list_prompts()).prompts
+                self._entries[kind] = (time.monotonic(), items)
+                self.fetches += 1
+            return items
+
+    async def tools(self) -> List[types.Tool]:
+        return await self._get("tools")
+
+    async def resources(self) -> List[types.Resource]:
+        return await self._get("resources")
+
+    async def prompts(self) -> List[types.Prompt]:
+        return await self._get("prompts")
+
+    async def anthropic_tools(self) -> List[Dict[str, Any]]:
+        """Tool definitions in the shape messages.create expects"""
+        tools = await self.tools()
+        if self._anthropic_tools is None:
+            self._anthropic_tools = [{
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema
+            } for tool in tools]
+        return self._anthropic_tools
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """Drop one cached list, or all of them"""
+        for name in [kind] if kind else list(self._entries):
+            self._entries.pop(name, None)
+
+    def handle_notification(self, notification: types.ServerNotification) -> None:
+        kind = LIST_CHANGED.get(type(notification.root))
+        if kind is not None:
+            self.invalidate(kind)
+
+
+class CachingClientSession(ClientSession):
+    """ClientSession with a CapabilityCache kept current by server notifications
+
+    Pass `capabilities` to share one cache between several sessions to the
+    same server, e.g. the members of a SessionPool. When the transport
+    closes, `closed` is set, requests still waiting for a reply fail with
+    anyio.EndOfStream instead of hanging, and `on_close` is called.
+    """
+
+    def __init__(self, *args, ttl: Optional[float] = 300.0, capabilities: Optional[CapabilityCache] = None,
+                 on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capabilities = capabilities or CapabilityCache(self, ttl)
+        self.on_close = on_close
+        self.closed = False
+
+    async def __aenter__(self):
+        await super().__aenter__()
+        # Notifications are also queued on incoming_messages, which has no
+        # buffer; drain it so an unread notification cannot stall the session.
+        self._task_group.start_soon(self._drain_incoming)
+        return self
+
+    async def _drain_incoming(self) -> None:
+        async for _ in self.incoming_messages:
+            pass
+        # The receive loop has ended, so no reply can arrive; mcp would leave
+        # its waiters blocked forever
+        self.closed = True
+        for stream in self._response_streams.values():
+            stream.close()
+        self._response_streams.clear()
+        if self.on_close is not None:
+            self.on_close()
+
+    async def _received_notification(self, notification: types.ServerNotification) -> None:
+        self.capabilities.handle_notification(notification)
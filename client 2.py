@@ -1,11 +1,14 @@
 import asyncio
-from typing import Optional
+import os
+from typing import Optional, Any, Callable, List, Set, Tuple
 from contextlib import AsyncExitStack
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
+from completion import COMPLETION_MODES, detect_completion
+from history import ConversationHistory
+from session_pool import SessionPool
 from dotenv import load_dotenv
 from loguru import logger
 load_dotenv()  # load environment variables from .env
@@ -16,13 +19,65 @@ logger.configure(handlers=[{"sink": RichHandler(markup=True),
 logger.add('multi_tools.log')
 COT_INSTRUCTION="""Answer the user's request using relevant tools (if they are available). Before calling a tool, do some analysis within \<thinking>\</thinking> tags. First, think about which of the provided tools is the relevant tool to answer the user's request. Second, go through each of the required parameters of the relevant tool and determine if the user has directly provided or given enough information to infer a value. For example, find coordiantes of the popular cities yourself. When deciding if the parameter can be inferred, carefully consider all the context to see if it supports a specific value. If all of the required parameters are present or can be reasonably inferred, close the thinking tag and proceed with the tool call. BUT, if one of the values for a required parameter is missing, DO NOT invoke the function (not even with fillers for the missing params) and instead, ask the user to provide the missing parameters. DO NOT ask for more information on optional parameters if it is not provided.
 """
+CONTINUE_PROMPT = "Please continue and finish answering my last question."
+# Tools that change server state; they never overlap with other calls from the same turn
+MUTATING_TOOLS = {"cancel_order", "cancel_orders"}
+
+class ToolCallScheduler:
+    """Start tool calls as they are submitted while keeping sequential semantics
+
+    Read-only calls run concurrently, at most max_concurrent at a time. A
+    mutating call waits for every call submitted before it, and later calls
+    wait for it, so the outcome matches running the calls one by one.
+    """
+
+    def __init__(self, session: ClientSession, max_concurrent: int, mutating_tools: Set[str]):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.mutating_tools = mutating_tools
+        self.tasks: List[asyncio.Task] = []
+        self.barrier: Optional[asyncio.Task] = None
+
+    def submit(self, block: Any) -> None:
+        """Schedule one tool_use block"""
+        if block.name in self.mutating_tools:
+            waits_for = list(self.tasks)
+        else:
+            waits_for = [self.barrier] if self.barrier else []
+        task = asyncio.create_task(self._call(block, waits_for))
+        self.tasks.append(task)
+        if block.name in self.mutating_tools:
+            self.barrier = task
+
+    async def _call(self, block: Any, waits_for: List[asyncio.Task]):
+        # Earlier failures surface from results(); ordering is all that matters here
+        await asyncio.gather(*waits_for, return_exceptions=True)
+        async with self.semaphore:
+            logger.info(f"\n[Tool Call] {block.name} with args {block.input}")
+            return await self.session.call_tool(block.name, block.input)
+
+    async def results(self) -> List[Any]:
+        """Wait for every submitted call, returning results in submission order"""
+        return await asyncio.gather(*self.tasks)
+
 class MCPClient:
-    def __init__(self):
+    def __init__(self, max_concurrent_tools: int = 4, mutating_tools: Optional[Set[str]] = None,
+                 capability_ttl: Optional[float] = 300.0, pool_size: int = 1, history_tokens: int = 50_000,
+                 completion_mode: str = "auto", warm_spares: int = 0):
+        if completion_mode not in COMPLETION_MODES:
+            raise ValueError(f"Unknown completion mode: {completion_mode}")
         # Initialize session and client objects
-        self.session: Optional[ClientSession] = None
+        self.session: Optional[SessionPool] = None
         self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+        self.anthropic = AsyncAnthropic()
         self.available_tools=[]
+        self.max_concurrent_tools = max_concurrent_tools
+        self.mutating_tools = MUTATING_TOOLS if mutating_tools is None else mutating_tools
+        self.capability_ttl = capability_ttl
+        self.pool_size = pool_size
+        self.history_tokens = history_tokens
+        self.completion_mode = completion_mode
+        self.warm_spares = warm_spares
 
     async def connect_to_server(self, server_script_path: str):
         """Connect to an MCP server
@@ -35,28 +90,46 @@ class MCPClient:
         if not (is_python or is_js):
             raise ValueError("Server script must be a .py or .js file")
             
-        command = "python" if is_python else "node"
-        server_params = StdioServerParameters(
-            command=command,
-            args=[server_script_path],
-            env=None
-        )
-        
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+        # pool_size server sessions; calls go to the one with the fewest in flight.
+        # warm_spares keeps started servers ready so reconnects skip the cold start
+        self.session = await self.exit_stack.enter_async_context(
+            SessionPool.stdio(server_script_path, size=self.pool_size, capability_ttl=self.capability_ttl,
+                              warm_spares=self.warm_spares, mutating_tools=self.mutating_tools))
         
-        await self.session.initialize()
-        
-        # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
+        # List available tools once; later queries reuse the cached catalogue
+        tools = await self.session.capabilities.tools()
         logger.info(f"\nConnected to server with tools: {[tool.name for tool in tools]}")
-        self.available_tools = [{ 
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema
-                    } for tool in response.tools]
+        self.available_tools = await self.session.capabilities.anthropic_tools()
+
+    def tool_scheduler(self) -> ToolCallScheduler:
+        return ToolCallScheduler(self.session, self.max_concurrent_tools, self.mutating_tools)
+
+    async def call_tools(self, tool_uses: List[Any]) -> List[Any]:
+        """Run the tool_use blocks of one assistant turn, returning results in the same order"""
+        scheduler = self.tool_scheduler()
+        for block in tool_uses:
+            scheduler.submit(block)
+        return await scheduler.results()
+
+    async def stream_message(self, **kwargs) -> Tuple[Any, List[Any]]:
+        """Stream a Claude response, starting each tool call as soon as its tool_use block is complete
+
+        Returns the final message and the results of its tool calls, in block order.
+        """
+        scheduler = self.tool_scheduler()
+        try:
+            async with self.anthropic.messages.stream(**kwargs) as stream:
+                async for event in stream:
+                    if event.type == "content_block_stop":
+                        block = stream.current_message_snapshot.content[event.index]
+                        if block.type == "tool_use":
+                            scheduler.submit(block)
+                response = await stream.get_final_message()
+        except BaseException:
+            for task in scheduler.tasks:
+                task.cancel()
+            raise
+        return response, await scheduler.results()
 
     async def process_query(self, query: str) -> str:
         """Process a query using Claude and available tools"""
@@ -67,15 +140,11 @@ class MCPClient:
             }
         ]
 
-        response = await self.session.list_tools()
-        available_tools = [{ 
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in response.tools]
+        # Served from the capability cache; only re-listed after list_changed or the TTL
+        available_tools = await self.session.capabilities.anthropic_tools()
 
-        # Initial Claude API call
-        response = self.anthropic.messages.create(
+        # Initial Claude API call; tool calls start while the response streams
+        response, results = await self.stream_message(
             model="claude-3-5-sonnet-20241022",
             max_tokens=1000,
             messages=messages,
@@ -85,6 +154,7 @@ class MCPClient:
         # Process response and handle tool calls
         tool_results = []
         final_text = []
+        results = iter(results)
 
         for content in response.content:
             if content.type == 'text':
@@ -93,8 +163,8 @@ class MCPClient:
                 tool_name = content.name
                 tool_args = content.input
                 
-                # Execute tool call
-                result = await self.session.call_tool(tool_name, tool_args)
+                # Tool calls of this turn already ran while the response streamed
+                result = next(results)
                 tool_results.append({"call": tool_name, "result": result})
                 final_text.append(f"[Calling tool {tool_name} with args {tool_args}]")
 
@@ -111,7 +181,7 @@ class MCPClient:
 
                 logger.info(f"{messages=}")
                 # Get next response from Claude
-                response = self.anthropic.messages.create(
+                response = await self.anthropic.messages.create(
                     model="claude-3-5-sonnet-20241022",
                     max_tokens=1000,
                     messages=messages,
@@ -121,7 +191,7 @@ class MCPClient:
 
         return "\n".join(final_text)
 
-    async def chat_loop(self):
+    async def chat_loop(self, read_input: Callable[[str], str] = input):
         """Run an interactive chat loop that maintains conversation context"""
         logger.info("\nMCP Client Started!")
         logger.info("Type your queries or 'quit' to exit.")
@@ -146,8 +216,12 @@ class MCPClient:
         Focus only on the most recent user query and subsequent responses.
         """
             
-        user_message = input("\nUser: ")
-        messages = [{"role": "user", "content": user_message}]
+        system = ConversationHistory.system_blocks(system_prompt)
+        user_message = await asyncio.to_thread(read_input, "\nUser: ")
+        # Old tool outputs are compacted to keep every request under the token budget
+        history = ConversationHistory(max_tokens=self.history_tokens)
+        history.append("user", user_message)
+        last_response = None
         loop_counter = 0  # Initialize counter
         max_loops = 20    # Maximum number of loops before forcing user input
         
@@ -156,93 +230,81 @@ class MCPClient:
                 # Check if we should force user input due to max loops
                 if loop_counter >= max_loops:
                     logger.info("\nReached maximum number of consecutive responses. Requesting user input.")
-                    query = input("\nUser: ").strip()
+                    query = (await asyncio.to_thread(read_input, "\nUser: ")).strip()
                     if query.lower() == 'quit':
                         break
-                    messages.append({
-                        "role": "user",
-                        "content": query
-                    })
+                    history.append("user", query)
                     loop_counter = 0  # Reset counter after user input
                     continue
 
                 # Modified condition to check completion when assistant responds
-                if messages and messages[-1]["role"] == "assistant":
-                    # Check if the response is complete
-                    logger.info("running competition check")
-                    completion_check = self.anthropic.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        system=system_prompt,
-                        max_tokens=1000,
-                        messages=messages + [{
-                            "role": "user",
-                            "content": completion_check_prompt
-                        }]
-                    )
-                    
-                    completion_response = completion_check.content[0].text
-                    logger.info(f"completion response: {completion_response}")
-                    if "INCOMPLETE" in completion_response:
+                if history.messages and history.messages[-1]["role"] == "assistant":
+                    # Decide locally when possible; the LLM check is the fallback
+                    complete = detect_completion(last_response, self.completion_mode) if last_response else None
+                    if complete is None:
+                        logger.info("running competition check")
+                        completion_check = await self.anthropic.messages.create(
+                            model="claude-3-5-sonnet-20241022",
+                            system=system,
+                            max_tokens=1000,
+                            messages=history.request_messages([{
+                                "role": "user",
+                                "content": completion_check_prompt
+                            }])
+                        )
+                        
+                        completion_response = completion_check.content[0].text
+                        logger.info(f"completion response: {completion_response}")
+                        complete = "INCOMPLETE" not in completion_response
+                        if not complete:
+                            logger.info("\nFollow-up:" + completion_response.split("INCOMPLETE")[1].strip())
+                    else:
+                        logger.info(f"completion ({self.completion_mode}): {'COMPLETE' if complete else 'INCOMPLETE'}")
+                    last_response = None
+                    if not complete:
                         # Continue the conversation if incomplete
-                        logger.info("\nFollow-up:" + completion_response.split("INCOMPLETE")[1].strip())
+                        history.append("user", CONTINUE_PROMPT)
                         loop_counter += 1  # Increment counter
                         continue
                     
                     # If complete, get next user input
-                    query = input("\nUser: ").strip()
+                    query = (await asyncio.to_thread(read_input, "\nUser: ")).strip()
                     if query.lower() == 'quit':
                         break
-                    messages.append({
-                        "role": "user",
-                        "content": query
-                    })
+                    history.append("user", query)
                     loop_counter = 0  # Reset counter after user input
                 else:
-                    # Get response from Claude
-                    response = self.anthropic.messages.create(
+                    # Get response from Claude; its tool calls start while it streams
+                    self.available_tools = await self.session.capabilities.anthropic_tools()
+                    response, results = await self.stream_message(
                         model="claude-3-5-sonnet-20241022",
-                        system=system_prompt,
+                        system=system,
                         max_tokens=1000,
-                        messages=messages,
+                        messages=history.request_messages(),
                         tools=self.available_tools
                     )
 
-                    # Handle response content
+                    # Handle content in order with the already-collected tool results
+                    last_response = response
+                    results = iter(results)
                     for content in response.content:
                         if content.type == 'text':
                             reply = content.text
                             logger.info("\nAssistant: " + reply)
-                            messages.append({
-                                "role": "assistant",
-                                "content": content.text
-                            })
+                            history.append("assistant", content.text)
                         elif content.type == 'tool_use':
-                            tool_name = content.name
-                            tool_args = content.input
-                            
-                            # Execute tool call
-                            logger.info(f"\n[Tool Call] {tool_name} with args {tool_args}")
-                            result = await self.session.call_tool(tool_name, tool_args)
+                            result = next(results)
                             
                             # Add tool result to conversation
                             if hasattr(content, 'text') and content.text:
-                                messages.append({
-                                    "role": "assistant",
-                                    "content": content.text
-                                })
-                            messages.append({
-                                "role": "user",
-                                "content": result.content
-                            })
+                                history.append("assistant", content.text)
+                            history.append("user", result.content, tool_output=True)
                     
                     loop_counter += 1  # Increment counter after processing response
 
             except Exception as e:
                 logger.error(f"\nError: {str(e)}")
-                messages.append({
-                    "role": "system",
-                    "content": f"Error occurred: {str(e)}. Please try again."
-                })
+                history.append("system", f"Error occurred: {str(e)}. Please try again.")
                 loop_counter = max_loops  # Force user input after error
 
         await self.cleanup()
@@ -256,7 +318,9 @@ async def main():
         logger.info("Usage: python client.py <path_to_server_script>")
         sys.exit(1)
         
-    client = MCPClient()
+    client = MCPClient(pool_size=int(os.environ.get("MCP_CLIENT_SESSIONS", 1)),
+                       completion_mode=os.environ.get("MCP_COMPLETION_MODE", "auto"),
+                       warm_spares=int(os.environ.get("MCP_WARM_SPARES", 0)))
     try:
         await client.connect_to_server(sys.argv[1])
         await client.chat_loop()
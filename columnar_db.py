@@ -0,0 +1,158 @@
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Optional, List, Dict, Any, Union, Iterable, Iterator
+
+from customer_db import (
+    SEED_CUSTOMERS, SEED_ORDERS, USER_KEYS, StorageBackend, StripedLock,
+)
+
+CUSTOMER_FIELDS = ("id", "name", "email", "phone", "username")
+ORDER_FIELDS = ("id", "customer_id", "product", "quantity", "price", "status")
+STATUSES = ("Processing", "Shipped", "Delivered", "Cancelled")
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+class CustomerRow(Mapping):
+    """Read-only view of one customer row in a ColumnarDatabase"""
+
+    __slots__ = ("_db", "_i")
+
+    def __init__(self, db: "ColumnarDatabase", i: int):
+        self._db = db
+        self._i = i
+
+    def __getitem__(self, key: str) -> str:
+        if key not in CUSTOMER_FIELDS:
+            raise KeyError(key)
+        return self._db._customer_columns[key][self._i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CUSTOMER_FIELDS)
+
+    def __len__(self) -> int:
+        return len(CUSTOMER_FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class OrderRow(Mapping):
+    """Read-only view of one order row in a ColumnarDatabase"""
+
+    __slots__ = ("_db", "_i")
+
+    def __init__(self, db: "ColumnarDatabase", i: int):
+        self._db = db
+        self._i = i
+
+    def __getitem__(self, key: str) -> Any:
+        db, i = self._db, self._i
+        if key == "price":
+            return db._prices[i]
+        if key == "quantity":
+            return db._quantities[i]
+        if key == "status":
+            return STATUSES[db._statuses[i]]
+        if key in ORDER_FIELDS:
+            return db._order_columns[key][i]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(ORDER_FIELDS)
+
+    def __len__(self) -> int:
+        return len(ORDER_FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ColumnarDatabase(StorageBackend):
+    """Compact in-memory backend that stores each field as a column
+
+    Repeated string values (customer ids and product names on orders) are
+    interned so they share one object, price and quantity live in typed
+    arrays and status is a one-byte code. Lookups return __slots__ row views that
+    behave like the dicts FakeDatabase returns.
+    """
+
+    USER_KEYS = USER_KEYS
+
+    def __init__(self, customers: Optional[Iterable[Dict[str, Any]]] = None,
+                 orders: Optional[Iterable[Dict[str, Any]]] = None):
+        super().__init__()
+        self._order_locks = StripedLock()
+        self._customer_columns: Dict[str, List[str]] = {field: [] for field in CUSTOMER_FIELDS}
+        self._order_columns: Dict[str, List[str]] = {field: [] for field in ("id", "customer_id", "product")}
+        self._prices = array("d")
+        self._quantities = array("i")
+        self._statuses = array("b")
+        self._customers_by: Dict[str, Dict[str, int]] = {key: {} for key in self.USER_KEYS}
+        self._orders_by_id: Dict[str, int] = {}
+        self._orders_by_customer: Dict[str, array] = {}
+        for customer in SEED_CUSTOMERS if customers is None else customers:
+            self.add_customer(customer)
+        for order in SEED_ORDERS if orders is None else orders:
+            self.add_order(order)
+
+    def add_customer(self, customer: Dict[str, str]) -> None:
+        i = len(self._customer_columns["id"])
+        for field in CUSTOMER_FIELDS:
+            self._customer_columns[field].append(customer[field])
+        for key, index in self._customers_by.items():
+            index.setdefault(customer[key], i)
+
+    def add_order(self, order: Dict[str, Any]) -> None:
+        i = len(self._prices)
+        self._order_columns["id"].append(order["id"])
+        # customer ids and product names repeat across orders, so share one object each
+        self._order_columns["customer_id"].append(sys.intern(order["customer_id"]))
+        self._order_columns["product"].append(sys.intern(order["product"]))
+        self._quantities.append(order["quantity"])
+        self._prices.append(order["price"])
+        self._statuses.append(_STATUS_CODES[order["status"]])
+        self._orders_by_id.setdefault(order["id"], i)
+        self._orders_by_customer.setdefault(self._order_columns["customer_id"][i], array("l")).append(i)
+        self._aggregates.add(order)
+
+    def get_user(self, key: str, value: str) -> Union[CustomerRow, str]:
+        if key in self.USER_KEYS:
+            i = self._customers_by[key].get(value)
+            if i is not None:
+                return CustomerRow(self, i)
+            return f"Couldn't find a user with {key} of {value}"
+        else:
+            raise ValueError(f"Invalid key: {key}")
+
+    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[OrderRow]:
+        i = self._orders_by_id.get(str(order_id))
+        return OrderRow(self, i) if i is not None else None
+
+    def get_customer_orders(self, customer_id: str) -> List[OrderRow]:
+        return [OrderRow(self, i) for i in self._orders_by_customer.get(customer_id, ())]
+
+    def compare_and_set_status(self, order_id: Union[str,int], expected: str, status: str) -> bool:
+        order_id = str(order_id)
+        i = self._orders_by_id[order_id]
+        with self._order_locks.for_key(order_id):
+            if self._statuses[i] != _STATUS_CODES[expected]:
+                return False
+            self._statuses[i] = _STATUS_CODES[status]
+            self._aggregates.change_status(OrderRow(self, i), expected, status)
+        self._bump_version()
+        return True
+
+    def set_order_status(self, order_id: Union[str,int], status: str) -> None:
+        order_id = str(order_id)
+        i = self._orders_by_id[order_id]
+        with self._order_locks.for_key(order_id):
+            old, self._statuses[i] = STATUSES[self._statuses[i]], _STATUS_CODES[status]
+            self._aggregates.change_status(OrderRow(self, i), old, status)
+        self._bump_version()
+
+    def iter_customers(self, start: int = 0) -> Iterator[CustomerRow]:
+        return (CustomerRow(self, i) for i in range(start, len(self._customer_columns["id"])))
+
+    def iter_orders(self, start: int = 0) -> Iterator[OrderRow]:
+        return (OrderRow(self, i) for i in range(start, len(self._prices)))
@@ -0,0 +1,56 @@
+import re
+from typing import Any, Optional
+
+# How chat_loop decides that an assistant turn has answered the user:
+#   llm         ask the model with a second request (the original behaviour)
+#   stop_reason trust the API's stop_reason
+#   tags        a closed <reply></reply> block means the turn is user-facing
+#   heuristic   local checks on the reply text
+#   auto        local checks first; the LLM only when they disagree or are unsure
+COMPLETION_MODES = ("llm", "stop_reason", "tags", "heuristic", "auto")
+
+REPLY = re.compile(r"<reply>.*?</reply>", re.DOTALL)
+# Endings that promise more work in the same turn
+UNFINISHED = re.compile(r"(:|\.\.\.|\b(let me|i will|i'll|next,? i)\b[^.?!]*)\s*$", re.IGNORECASE)
+
+
+def _text(response: Any) -> str:
+    return "".join(block.text for block in response.content if block.type == "text").strip()
+
+
+def by_stop_reason(response: Any) -> Optional[bool]:
+    if response.stop_reason in ("tool_use", "max_tokens"):
+        return False
+    if response.stop_reason == "end_turn" and not any(block.type == "tool_use" for block in response.content):
+        return True
+    return None
+
+
+def by_tags(response: Any) -> Optional[bool]:
+    return True if REPLY.search(_text(response)) else None
+
+
+def by_heuristic(response: Any) -> Optional[bool]:
+    text = REPLY.sub("", _text(response)).strip() or _text(response)
+    if not text:
+        return False
+    if text.endswith("?"):
+        # Waiting on the user is as complete as the turn can get
+        return True
+    return False if UNFINISHED.search(text) else True
+
+
+def detect_completion(response: Any, mode: str) -> Optional[bool]:
+    """Whether `response` completes the turn without another LLM call; None means ask the LLM"""
+    if mode == "llm":
+        return None
+    if mode != "auto":
+        return {"stop_reason": by_stop_reason, "tags": by_tags, "heuristic": by_heuristic}[mode](response)
+    stopped = by_stop_reason(response)
+    if stopped is False:
+        return False
+    if by_tags(response):
+        return True
+    if stopped and by_heuristic(response):
+        return True
+    return None
@@ -0,0 +1,721 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Union, Iterator, Callable, Tuple
+
+from customer_search import CustomerSearchIndex
+from order_aggregates import OrderAggregates, ranking_column
+
+SEED_CUSTOMERS = [
+    {"id": "1213210", "name": "John Doe", "email": "john@gmail.com", "phone": "123-456-7890", "username": "johndoe"},
+    {"id": "2837622", "name": "Priya Patel", "email": "priya@candy.com", "phone": "987-654-3210", "username": "priya123"},
+    {"id": "3924156", "name": "Liam Nguyen", "email": "lnguyen@yahoo.com", "phone": "555-123-4567", "username": "liamn"},
+    {"id": "4782901", "name": "Aaliyah Davis", "email": "aaliyahd@hotmail.com", "phone": "111-222-3333", "username": "adavis"},
+    {"id": "5190753", "name": "Hiroshi Nakamura", "email": "hiroshi@gmail.com", "phone": "444-555-6666", "username": "hiroshin"},
+    {"id": "6824095", "name": "Fatima Ahmed", "email": "fatimaa@outlook.com", "phone": "777-888-9999", "username": "fatimaahmed"},
+    {"id": "7135680", "name": "Alejandro Rodriguez", "email": "arodriguez@protonmail.com", "phone": "222-333-4444", "username": "alexr"},
+    {"id": "8259147", "name": "Megan Anderson", "email": "megana@gmail.com", "phone": "666-777-8888", "username": "manderson"},
+    {"id": "9603481", "name": "Kwame Osei", "email": "kwameo@yahoo.com", "phone": "999-000-1111", "username": "kwameo"},
+    {"id": "1057426", "name": "Mei Lin", "email": "meilin@gmail.com", "phone": "333-444-5555", "username": "mlin"}
+]
+
+SEED_ORDERS = [
+    {"id": "24601", "customer_id": "1213210", "product": "Wireless Headphones", "quantity": 1, "price": 79.99, "status": "Shipped"},
+    {"id": "13579", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 2, "price": 19.99, "status": "Processing"},
+    {"id": "97531", "customer_id": "2837622", "product": "Bluetooth Speaker", "quantity": 1, "price": 49.99, "status": "Shipped"},
+    {"id": "86420", "customer_id": "3924156", "product": "Fitness Tracker", "quantity": 1, "price": 129.99, "status": "Delivered"},
+    {"id": "54321", "customer_id": "4782901", "product": "Laptop Sleeve", "quantity": 3, "price": 24.99, "status": "Shipped"},
+    {"id": "19283", "customer_id": "5190753", "product": "Wireless Mouse", "quantity": 1, "price": 34.99, "status": "Processing"},
+    {"id": "74651", "customer_id": "6824095", "product": "Gaming Keyboard", "quantity": 1, "price": 89.99, "status": "Delivered"},
+    {"id": "30298", "customer_id": "7135680", "product": "Portable Charger", "quantity": 2, "price": 29.99, "status": "Shipped"},
+    {"id": "47652", "customer_id": "8259147", "product": "Smartwatch", "quantity": 1, "price": 199.99, "status": "Processing"},
+    {"id": "61984", "customer_id": "9603481", "product": "Noise-Cancelling Headphones", "quantity": 1, "price": 149.99, "status": "Shipped"},
+    {"id": "58243", "customer_id": "1057426", "product": "Wireless Earbuds", "quantity": 2, "price": 99.99, "status": "Delivered"},
+    {"id": "90357", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 1, "price": 19.99, "status": "Shipped"},
+    {"id": "28164", "customer_id": "2837622", "product": "Wireless Headphones", "quantity": 2, "price": 79.99, "status": "Processing"}
+]
+
+USER_KEYS = ("email", "phone", "username")
+
+CANCELLED = "Successfully cancelled the order"
+NOT_CANCELLABLE = "Order has already shipped. Cannot cancel it."
+NOT_FOUND = "Order not found"
+
+
+def shard_of(customer_id: Union[str, int], shards: int) -> int:
+    """The shard that owns a customer and all its orders
+
+    crc32 rather than hash(), which is salted per process and would place
+    the same customer differently in every server.
+    """
+    return zlib.crc32(str(customer_id).encode()) % shards
+
+
+def parse_shard(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse a CUSTOMERDB_SHARD value, 'index/count', into (index, count)"""
+    if not spec:
+        return None
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard: {spec}; expected index/count, e.g. 0/4")
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard: {spec}; index must be in 0..{count - 1}")
+    return index, count
+
+
+def shard_seed(index: int, count: int) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    """The seed customers and orders that belong to shard `index` of `count`"""
+    return ([c for c in SEED_CUSTOMERS if shard_of(c["id"], count) == index],
+            [o for o in SEED_ORDERS if shard_of(o["customer_id"], count) == index])
+
+
+class StripedLock:
+    """A fixed set of locks shared out by key hash, giving per-key locking in O(1) memory"""
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def for_key(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+
+class StorageBackend(ABC):
+    """Storage interface behind the CustomerDB tools and resources
+
+    `version` is a data version counter that every mutation bumps, so
+    renderings cached against an older version are never served.
+
+    Concurrency model: reads never take a lock. Writes to an order are
+    compare-and-set operations serialised per order, so two cancels, or a
+    cancel and a status update, on the same order cannot interleave, and
+    writes to different orders do not contend.
+    """
+
+    # Whether calls may block on I/O and so belong on a worker thread
+    blocking = False
+
+    def __init__(self):
+        self.version = 0
+        self._version_lock = threading.Lock()
+        self._search_index = CustomerSearchIndex()
+        self._aggregates = OrderAggregates()
+
+    def _bump_version(self) -> None:
+        with self._version_lock:
+            self.version += 1
+
+    @abstractmethod
+    def get_user(self, key: str, value: str) -> Union[Dict[str, str], str]:
+        """Return the first customer whose `key` equals `value`, or a not-found message"""
+
+    @abstractmethod
+    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[Dict[str, Any]]:
+        """Return the order with the given id, or None"""
+
+    @abstractmethod
+    def get_customer_orders(self, customer_id: str) -> List[Dict[str, Any]]:
+        """Return every order placed by the customer, in insertion order"""
+
+    @abstractmethod
+    def compare_and_set_status(self, order_id: Union[str,int], expected: str, status: str) -> bool:
+        """Atomically set an order's status if it currently equals `expected`"""
+
+    @abstractmethod
+    def set_order_status(self, order_id: Union[str,int], status: str) -> None:
+        """Unconditionally set an order's status"""
+
+    def cancel_order(self, order_id: Union[str,int]) -> str:
+        """Cancel a Processing order and return a human readable outcome"""
+        if self.get_order_by_id(order_id) is None:
+            return NOT_FOUND
+        if self.compare_and_set_status(order_id, "Processing", "Cancelled"):
+            return CANCELLED
+        return NOT_CANCELLABLE
+
+    @abstractmethod
+    def iter_customers(self, start: int = 0) -> Iterator[Dict[str, str]]:
+        """Lazily yield customers in insertion order, skipping the first `start`"""
+
+    @abstractmethod
+    def iter_orders(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        """Lazily yield orders in insertion order, skipping the first `start`"""
+
+    # Row ids are positive, stable and increase in insertion order, so a page
+    # can resume after the last one it served even if rows were removed since.
+    # Rows are only ever appended to the in-process backends, where a row's id
+    # is its position plus one; SQLite uses its rowid.
+    def iter_customer_rows(self, after: int = 0) -> Iterator[Tuple[int, Dict[str, str]]]:
+        """Lazily yield (row id, customer) in insertion order for the rows after row id `after`"""
+        return enumerate(self.iter_customers(after), after + 1)
+
+    def iter_order_rows(self, after: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Lazily yield (row id, order) in insertion order for the rows after row id `after`"""
+        return enumerate(self.iter_orders(after), after + 1)
+
+    # Batch variants; backends override these when they can resolve a whole
+    # batch in one pass instead of one lookup per key.
+    def get_users(self, key: str, values: List[str]) -> List[Union[Dict[str, str], str]]:
+        """Return get_user(key, value) for every value, in order"""
+        return [self.get_user(key, value) for value in values]
+
+    def get_orders_by_ids(self, order_ids: List[Union[str,int]]) -> List[Optional[Dict[str, Any]]]:
+        """Return get_order_by_id for every id, in order"""
+        return [self.get_order_by_id(order_id) for order_id in order_ids]
+
+    def cancel_orders(self, order_ids: List[Union[str,int]]) -> List[str]:
+        """Cancel every order and return one outcome per id, in order"""
+        return [self.cancel_order(order_id) for order_id in order_ids]
+
+    def get_customers_by_rows(self, rows: List[int]) -> List[Dict[str, str]]:
+        """Return the customer with each row id (see iter_customer_rows), in order"""
+        return [next(self.iter_customers(row - 1)) for row in rows]
+
+    def search_customers(self, query: str, limit: int = 10) -> List[Tuple[Dict[str, str], float]]:
+        """Ranked prefix and typo-tolerant search over name, email and username
+
+        The index is built on first use and then only fed the customers
+        appended since the previous search. It holds row ids, so only the
+        matches are read back from the backend.
+        """
+        self._search_index.catch_up(self.iter_customer_rows)
+        matches = self._search_index.search(query, limit)
+        customers = self.get_customers_by_rows([row for row, _ in matches])
+        return [(customer, score) for customer, (_, score) in zip(customers, matches)]
+
+    # Aggregates are running totals that every status change updates, so
+    # these answer without scanning the orders.
+    def order_aggregates(self) -> OrderAggregates:
+        """The running aggregates; backends that build them lazily override this"""
+        return self._aggregates
+
+    def customer_totals(self, customer_id: str) -> Dict[str, Any]:
+        """Order count, cancelled count, units and spend (excluding cancelled orders) of one customer"""
+        return self.order_aggregates().customer_totals(customer_id)
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of orders in each status"""
+        return self.order_aggregates().status_counts()
+
+    def top_products(self, limit: int = 5, by: str = "revenue") -> List[Dict[str, Any]]:
+        """Best-selling products ranked by revenue, units or orders"""
+        return self.order_aggregates().top_products(limit, by)
+
+    def close(self) -> None:
+        """Release any resources held by the backend"""
+
+
+class FakeDatabase(StorageBackend):
+    """In-memory backend over lists of dicts with hash indexes"""
+
+    USER_KEYS = USER_KEYS
+
+    def __init__(self, customers: Optional[List[Dict[str, str]]] = None,
+                 orders: Optional[List[Dict[str, Any]]] = None):
+        super().__init__()
+        self._order_locks = StripedLock()
+        self.customers = [dict(c) for c in (SEED_CUSTOMERS if customers is None else customers)]
+        self.orders = [dict(o) for o in (SEED_ORDERS if orders is None else orders)]
+        self._build_indexes()
+
+    def _build_indexes(self) -> None:
+        """Build the secondary lookup indexes over customers and orders"""
+        self._customers_by: Dict[str, Dict[str, Dict[str, str]]] = {
+            key: {} for key in self.USER_KEYS
+        }
+        self._orders_by_id: Dict[str, Dict[str, Any]] = {}
+        self._orders_by_customer: Dict[str, List[Dict[str, Any]]] = {}
+        for customer in self.customers:
+            self._index_customer(customer)
+        for order in self.orders:
+            self._index_order(order)
+
+    def _index_customer(self, customer: Dict[str, str]) -> None:
+        # setdefault keeps the first match, like the linear scan did
+        for key, index in self._customers_by.items():
+            index.setdefault(customer[key], customer)
+
+    def _index_order(self, order: Dict[str, Any]) -> None:
+        self._orders_by_id.setdefault(order["id"], order)
+        self._orders_by_customer.setdefault(order["customer_id"], []).append(order)
+        self._aggregates.add(order)
+
+    def get_user(self, key: str, value: str) -> Union[Dict[str, str], str]:
+        if key in self.USER_KEYS:
+            customer = self._customers_by[key].get(value)
+            if customer is not None:
+                return customer
+            return f"Couldn't find a user with {key} of {value}"
+        else:
+            raise ValueError(f"Invalid key: {key}")
+
+    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[Dict[str, Any]]:
+        return self._orders_by_id.get(str(order_id))
+
+    def get_customer_orders(self, customer_id: str) -> List[Dict[str, Any]]:
+        return list(self._orders_by_customer.get(customer_id, []))
+
+    def compare_and_set_status(self, order_id: Union[str,int], expected: str, status: str) -> bool:
+        # The indexes hold the same dict, so updating it in place updates every view
+        order_id = str(order_id)
+        order = self._orders_by_id[order_id]
+        with self._order_locks.for_key(order_id):
+            if order["status"] != expected:
+                return False
+            order["status"] = status
+            self._aggregates.change_status(order, expected, status)
+        self._bump_version()
+        return True
+
+    def set_order_status(self, order_id: Union[str,int], status: str) -> None:
+        order_id = str(order_id)
+        order = self._orders_by_id[order_id]
+        with self._order_locks.for_key(order_id):
+            old, order["status"] = order["status"], status
+            self._aggregates.change_status(order, old, status)
+        self._bump_version()
+
+    def iter_customers(self, start: int = 0) -> Iterator[Dict[str, str]]:
+        return (self.customers[i] for i in range(start, len(self.customers)))
+
+    def iter_orders(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        return (self.orders[i] for i in range(start, len(self.orders)))
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections that can be shared across threads"""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               isolation_level=None, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+# Statements are kept as constants so every connection's statement cache
+# reuses the same prepared query.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    username TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS customers_email ON customers(email);
+CREATE INDEX IF NOT EXISTS customers_phone ON customers(phone);
+CREATE INDEX IF NOT EXISTS customers_username ON customers(username);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    product TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_id ON orders(id);
+CREATE INDEX IF NOT EXISTS orders_customer_id ON orders(customer_id);
+CREATE TABLE IF NOT EXISTS meta (version INTEGER NOT NULL);
+INSERT INTO meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta);
+CREATE TRIGGER IF NOT EXISTS orders_version_on_update AFTER UPDATE ON orders
+BEGIN UPDATE meta SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS orders_version_on_insert AFTER INSERT ON orders
+BEGIN UPDATE meta SET version = version + 1; END;
+CREATE TABLE IF NOT EXISTS status_counts (status TEXT PRIMARY KEY, orders INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS customer_totals (
+    customer_id TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    cents INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS product_totals (
+    product TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    cents INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS orders_aggregates_on_insert AFTER INSERT ON orders
+BEGIN
+    INSERT INTO status_counts VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET orders = orders + 1;
+    INSERT INTO customer_totals VALUES (
+        NEW.customer_id, 1, NEW.status = 'Cancelled',
+        (NEW.status <> 'Cancelled') * NEW.quantity,
+        (NEW.status <> 'Cancelled') * CAST(ROUND(NEW.price * 100) AS INTEGER) * NEW.quantity)
+        ON CONFLICT(customer_id) DO UPDATE SET orders = orders + 1, cancelled = cancelled + excluded.cancelled,
+            units = units + excluded.units, cents = cents + excluded.cents;
+    INSERT INTO product_totals VALUES (
+        NEW.product, 1,
+        (NEW.status <> 'Cancelled') * NEW.quantity,
+        (NEW.status <> 'Cancelled') * CAST(ROUND(NEW.price * 100) AS INTEGER) * NEW.quantity)
+        ON CONFLICT(product) DO UPDATE SET orders = orders + 1,
+            units = units + excluded.units, cents = cents + excluded.cents;
+END;
+CREATE TRIGGER IF NOT EXISTS orders_aggregates_on_status AFTER UPDATE OF status ON orders
+WHEN OLD.status <> NEW.status
+BEGIN
+    UPDATE status_counts SET orders = orders - 1 WHERE status = OLD.status;
+    INSERT INTO status_counts VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET orders = orders + 1;
+    -- +1 when an order is un-cancelled, -1 when it is cancelled, 0 otherwise
+    UPDATE customer_totals SET
+        cancelled = cancelled + (NEW.status = 'Cancelled') - (OLD.status = 'Cancelled'),
+        units = units + ((OLD.status = 'Cancelled') - (NEW.status = 'Cancelled')) * NEW.quantity,
+        cents = cents + ((OLD.status = 'Cancelled') - (NEW.status = 'Cancelled'))
+            * CAST(ROUND(NEW.price * 100) AS INTEGER) * NEW.quantity
+        WHERE customer_id = NEW.customer_id;
+    UPDATE product_totals SET
+        units = units + ((OLD.status = 'Cancelled') - (NEW.status = 'Cancelled')) * NEW.quantity,
+        cents = cents + ((OLD.status = 'Cancelled') - (NEW.status = 'Cancelled'))
+            * CAST(ROUND(NEW.price * 100) AS INTEGER) * NEW.quantity
+        WHERE product = NEW.product;
+END;
+"""
+# Fills the aggregate tables for a database created before they existed
+_BACKFILL_AGGREGATES = """
+INSERT INTO status_counts SELECT status, COUNT(*) FROM orders GROUP BY status;
+INSERT INTO customer_totals
+    SELECT customer_id, COUNT(*), SUM(status = 'Cancelled'), SUM((status <> 'Cancelled') * quantity),
+           SUM((status <> 'Cancelled') * CAST(ROUND(price * 100) AS INTEGER) * quantity)
+    FROM orders GROUP BY customer_id ORDER BY MIN(rowid);
+INSERT INTO product_totals
+    SELECT product, COUNT(*), SUM((status <> 'Cancelled') * quantity),
+           SUM((status <> 'Cancelled') * CAST(ROUND(price * 100) AS INTEGER) * quantity)
+    FROM orders GROUP BY product ORDER BY MIN(rowid);
+"""
+_SELECT_VERSION = "SELECT version FROM meta"
+_CUSTOMER_COLUMNS = "id, name, email, phone, username"
+_ORDER_COLUMNS = "id, customer_id, product, quantity, price, status"
+_SELECT_USER = {
+    key: f"SELECT {_CUSTOMER_COLUMNS} FROM customers WHERE {key} = ? ORDER BY rowid LIMIT 1"
+    for key in USER_KEYS
+}
+_SELECT_ORDER = f"SELECT {_ORDER_COLUMNS} FROM orders WHERE id = ? ORDER BY rowid LIMIT 1"
+_SELECT_CUSTOMER_ORDERS = f"SELECT {_ORDER_COLUMNS} FROM orders WHERE customer_id = ? ORDER BY rowid"
+_SELECT_ALL_CUSTOMERS = f"SELECT {_CUSTOMER_COLUMNS} FROM customers ORDER BY rowid LIMIT -1 OFFSET ?"
+_SELECT_ALL_ORDERS = f"SELECT {_ORDER_COLUMNS} FROM orders ORDER BY rowid LIMIT -1 OFFSET ?"
+# Pages resume after the last rowid served, seeking straight to it instead
+# of stepping over every earlier row as OFFSET would
+_SELECT_CUSTOMER_ROWS = f"SELECT rowid AS row_id, {_CUSTOMER_COLUMNS} FROM customers WHERE rowid > ? ORDER BY rowid"
+_SELECT_ORDER_ROWS = f"SELECT rowid AS row_id, {_ORDER_COLUMNS} FROM orders WHERE rowid > ? ORDER BY rowid"
+_SELECT_CUSTOMERS_BY_ROWS = f"SELECT rowid AS row_id, {_CUSTOMER_COLUMNS} FROM customers WHERE rowid IN (SELECT value FROM json_each(?))"
+# Batch lookups pass the keys as one JSON array so a single prepared
+# statement serves every batch size.
+_SELECT_USERS = {
+    key: f"SELECT {_CUSTOMER_COLUMNS} FROM customers WHERE {key} IN (SELECT value FROM json_each(?)) ORDER BY rowid"
+    for key in USER_KEYS
+}
+_SELECT_ORDERS = f"SELECT {_ORDER_COLUMNS} FROM orders WHERE id IN (SELECT value FROM json_each(?)) ORDER BY rowid"
+_INSERT_CUSTOMER = "INSERT INTO customers (id, name, email, phone, username) VALUES (:id, :name, :email, :phone, :username)"
+_INSERT_ORDER = "INSERT INTO orders (id, customer_id, product, quantity, price, status) VALUES (:id, :customer_id, :product, :quantity, :price, :status)"
+_UPDATE_STATUS = "UPDATE orders SET status = ? WHERE rowid = (SELECT rowid FROM orders WHERE id = ? ORDER BY rowid LIMIT 1)"
+_COMPARE_AND_SET_STATUS = "UPDATE orders SET status = ? WHERE rowid = (SELECT rowid FROM orders WHERE id = ? ORDER BY rowid LIMIT 1) AND status = ?"
+_SELECT_CUSTOMER_TOTALS = "SELECT orders, cancelled, units, cents FROM customer_totals WHERE customer_id = ?"
+_SELECT_STATUS_COUNTS = "SELECT status, orders FROM status_counts WHERE orders > 0 ORDER BY rowid"
+# Ties keep first-seen order, like the in-memory aggregates
+_SELECT_TOP_PRODUCTS = {
+    by: f"SELECT product, orders, units, cents FROM product_totals ORDER BY {column} DESC, rowid LIMIT ?"
+    for by, column in {"revenue": "cents", "units": "units", "orders": "orders"}.items()
+}
+_CANCEL_ORDER = "UPDATE orders SET status = 'Cancelled' WHERE rowid = (SELECT rowid FROM orders WHERE id = ? ORDER BY rowid LIMIT 1) AND status = 'Processing'"
+
+
+class SQLiteDatabase(StorageBackend):
+    """SQLite backend with indexed lookups, WAL journaling and a connection pool
+
+    The dataset lives on disk, so one server process can serve tables far larger
+    than RAM; lookups go through the secondary indexes created in the schema.
+
+    With shared=True several processes may serve the same file: `version`
+    is then read from a table that triggers bump on every order write, so
+    each process sees the others' mutations instead of its own counter.
+    """
+
+    USER_KEYS = USER_KEYS
+    blocking = True
+
+    def __init__(self, path: str = "customerdb.sqlite3", pool_size: int = 4, seed: bool = True,
+                 shared: bool = False, customers: Optional[List[Dict[str, str]]] = None,
+                 orders: Optional[List[Dict[str, Any]]] = None):
+        super().__init__()
+        self.shared = shared
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+            self._backfill_aggregates(conn)
+            if seed:
+                self._load(conn, SEED_CUSTOMERS if customers is None else customers,
+                           SEED_ORDERS if orders is None else orders, only_if_empty=True)
+
+    @property
+    def version(self) -> int:
+        if not self.shared:
+            return self._version
+        with self.pool.connection() as conn:
+            return conn.execute(_SELECT_VERSION).fetchone()[0]
+
+    @version.setter
+    def version(self, value: int) -> None:
+        self._version = value
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, customers, orders, only_if_empty: bool = False) -> None:
+        # IMMEDIATE takes the write lock up front, so processes starting
+        # together cannot both see an empty table and seed it twice
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if only_if_empty and conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone() is not None:
+                conn.execute("ROLLBACK")
+                return
+            conn.executemany(_INSERT_CUSTOMER, customers)
+            conn.executemany(_INSERT_ORDER, orders)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _backfill_aggregates(conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM status_counts LIMIT 1").fetchone() is None:
+                for statement in filter(str.strip, _BACKFILL_AGGREGATES.split(";")):
+                    conn.execute(statement)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load(self, customers, orders) -> None:
+        """Bulk-insert customers and orders in a single transaction"""
+        with self.pool.connection() as conn:
+            self._load(conn, customers, orders)
+
+    def _fetchone(self, sql: str, params) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def _iter(self, sql: str, params) -> Iterator[Dict[str, Any]]:
+        # Rows stream from the cursor instead of being materialised up front
+        with self.pool.connection() as conn:
+            for row in conn.execute(sql, params):
+                yield dict(row)
+
+    def get_user(self, key: str, value: str) -> Union[Dict[str, str], str]:
+        if key in self.USER_KEYS:
+            customer = self._fetchone(_SELECT_USER[key], (value,))
+            if customer is not None:
+                return customer
+            return f"Couldn't find a user with {key} of {value}"
+        else:
+            raise ValueError(f"Invalid key: {key}")
+
+    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[Dict[str, Any]]:
+        return self._fetchone(_SELECT_ORDER, (str(order_id),))
+
+    def get_customer_orders(self, customer_id: str) -> List[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            return [dict(row) for row in conn.execute(_SELECT_CUSTOMER_ORDERS, (customer_id,))]
+
+    def compare_and_set_status(self, order_id: Union[str,int], expected: str, status: str) -> bool:
+        with self.pool.connection() as conn:
+            updated = conn.execute(_COMPARE_AND_SET_STATUS, (status, str(order_id), expected)).rowcount
+        if updated:
+            self._bump_version()
+        return bool(updated)
+
+    def set_order_status(self, order_id: Union[str,int], status: str) -> None:
+        with self.pool.connection() as conn:
+            if not conn.execute(_UPDATE_STATUS, (status, str(order_id))).rowcount:
+                raise KeyError(str(order_id))
+        self._bump_version()
+
+    def cancel_order(self, order_id: Union[str,int]) -> str:
+        order_id = str(order_id)
+        with self.pool.connection() as conn:
+            # The conditional UPDATE is atomic, so there is no read-check-write window
+            if conn.execute(_CANCEL_ORDER, (order_id,)).rowcount:
+                self._bump_version()
+                return CANCELLED
+            found = conn.execute(_SELECT_ORDER, (order_id,)).fetchone()
+        return NOT_CANCELLABLE if found is not None else NOT_FOUND
+
+    def get_users(self, key: str, values: List[str]) -> List[Union[Dict[str, str], str]]:
+        if key not in self.USER_KEYS:
+            raise ValueError(f"Invalid key: {key}")
+        found: Dict[str, Dict[str, str]] = {}
+        with self.pool.connection() as conn:
+            for row in conn.execute(_SELECT_USERS[key], (json.dumps(list(values)),)):
+                found.setdefault(row[key], dict(row))
+        return [found.get(value, f"Couldn't find a user with {key} of {value}") for value in values]
+
+    def get_orders_by_ids(self, order_ids: List[Union[str,int]]) -> List[Optional[Dict[str, Any]]]:
+        order_ids = [str(order_id) for order_id in order_ids]
+        found: Dict[str, Dict[str, Any]] = {}
+        with self.pool.connection() as conn:
+            for row in conn.execute(_SELECT_ORDERS, (json.dumps(order_ids),)):
+                found.setdefault(row["id"], dict(row))
+        return [found.get(order_id) for order_id in order_ids]
+
+    def cancel_orders(self, order_ids: List[Union[str,int]]) -> List[str]:
+        outcomes = []
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for order_id in map(str, order_ids):
+                    if conn.execute(_CANCEL_ORDER, (order_id,)).rowcount:
+                        outcomes.append(CANCELLED)
+                    elif conn.execute(_SELECT_ORDER, (order_id,)).fetchone() is not None:
+                        outcomes.append(NOT_CANCELLABLE)
+                    else:
+                        outcomes.append(NOT_FOUND)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if CANCELLED in outcomes:
+            self._bump_version()
+        return outcomes
+
+    # Aggregates are kept in tables that triggers update on every insert and
+    # status change, so they hold across processes sharing the file.
+    def customer_totals(self, customer_id: str) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_CUSTOMER_TOTALS, (customer_id,)).fetchone()
+        orders, cancelled, units, cents = row if row is not None else (0, 0, 0, 0)
+        return {"customer_id": customer_id, "orders": orders, "cancelled": cancelled,
+                "units": units, "spent": cents / 100}
+
+    def status_counts(self) -> Dict[str, int]:
+        with self.pool.connection() as conn:
+            return {status: count for status, count in conn.execute(_SELECT_STATUS_COUNTS)}
+
+    def top_products(self, limit: int = 5, by: str = "revenue") -> List[Dict[str, Any]]:
+        ranking_column(by)
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_TOP_PRODUCTS[by], (limit,)).fetchall()
+        return [{"product": product, "orders": orders, "units": units, "revenue": cents / 100}
+                for product, orders, units, cents in rows]
+
+    def iter_customers(self, start: int = 0) -> Iterator[Dict[str, str]]:
+        return self._iter(_SELECT_ALL_CUSTOMERS, (start,))
+
+    def iter_orders(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        return self._iter(_SELECT_ALL_ORDERS, (start,))
+
+    def _iter_rows(self, sql: str, params) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for row in self._iter(sql, params):
+            yield row.pop("row_id"), row
+
+    def iter_customer_rows(self, after: int = 0) -> Iterator[Tuple[int, Dict[str, str]]]:
+        return self._iter_rows(_SELECT_CUSTOMER_ROWS, (after,))
+
+    def get_customers_by_rows(self, rows: List[int]) -> List[Dict[str, str]]:
+        found = dict(self._iter_rows(_SELECT_CUSTOMERS_BY_ROWS, (json.dumps(list(rows)),)))
+        return [found[row] for row in rows]
+
+    def iter_order_rows(self, after: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        return self._iter_rows(_SELECT_ORDER_ROWS, (after,))
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+BACKENDS = ("memory", "columnar", "sqlite", "snapshot")
+
+
+class DeferredDatabase:
+    """Stands in for a backend and builds it on first use
+
+    Lets a server answer `initialize` before its data is loaded; the first
+    tool call or resource read pays for the load instead. Attribute access
+    is forwarded to the real backend once it exists.
+    """
+
+    def __init__(self, factory: Callable[[], StorageBackend], blocking: bool):
+        self.blocking = blocking
+        self._factory = factory
+        self._db: Optional[StorageBackend] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> StorageBackend:
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._factory()
+        return self._db
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+
+
+def create_database(backend: Optional[str] = None, deferred: Optional[bool] = None) -> StorageBackend:
+    """Create the storage backend selected by CUSTOMERDB_BACKEND (memory, columnar, sqlite or snapshot)
+
+    With `deferred` (default: CUSTOMERDB_DEFER_LOAD=1) the backend is built
+    on first use rather than here. CUSTOMERDB_SHARD=index/count seeds it with
+    only that shard's customers and their orders (see shard_router.py).
+    """
+    backend = (backend or os.environ.get("CUSTOMERDB_BACKEND", "memory")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if deferred is None:
+        deferred = os.environ.get("CUSTOMERDB_DEFER_LOAD", "1") == "1"
+    if deferred:
+        return DeferredDatabase(lambda: create_database(backend, deferred=False), blocking=backend in ("sqlite", "snapshot"))
+    shard = parse_shard(os.environ.get("CUSTOMERDB_SHARD"))
+    customers, orders = shard_seed(*shard) if shard else (None, None)
+    if backend == "memory":
+        return FakeDatabase(customers, orders)
+    if backend == "columnar":
+        from columnar_db import ColumnarDatabase
+        return ColumnarDatabase(customers, orders)
+    if backend == "sqlite":
+        return SQLiteDatabase(
+            path=os.environ.get("CUSTOMERDB_SQLITE_PATH", "customerdb.sqlite3"),
+            pool_size=int(os.environ.get("CUSTOMERDB_SQLITE_POOL_SIZE", "4")),
+            shared=os.environ.get("CUSTOMERDB_SQLITE_SHARED", "0") == "1",
+            customers=customers,
+            orders=orders,
+        )
+    if backend == "snapshot":
+        from snapshot_db import SnapshotDatabase
+        return SnapshotDatabase(
+            directory=os.environ.get("CUSTOMERDB_DATA_DIR", "customerdb_data"),
+            customers=customers,
+            orders=orders,
+            snapshot_every=int(os.environ.get("CUSTOMERDB_SNAPSHOT_EVERY", "10000")),
+            sync=os.environ.get("CUSTOMERDB_WAL_SYNC", "1") == "1",
+        )
@@ -0,0 +1,140 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from collections.abc import Mapping
+from typing import Optional, List, Dict, Tuple, Iterable, Callable
+
+# Fuzzy matches sharing less than this fraction of trigrams with a term are dropped
+MIN_SIMILARITY = 0.3
+# Per-term scores: an exact token beats any prefix, a prefix beats any fuzzy match
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+
+_WORD = re.compile(r"[^\W_]+|\S+@\S+")
+
+
+def _tokens(customer: Mapping) -> List[str]:
+    """Searchable tokens of a customer: name words, the email and its local part, the username"""
+    tokens = _WORD.findall(customer["name"].lower())
+    email = customer["email"].lower()
+    tokens += [email, email.split("@", 1)[0], customer["username"].lower()]
+    return list(dict.fromkeys(tokens))
+
+
+def _trigrams(token: str) -> List[str]:
+    # Anchored so short tokens and shared prefixes still produce grams
+    padded = f"^{token}$"
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class CustomerSearchIndex:
+    """Prefix and typo-tolerant search over customer name, email and username
+
+    Tokens are kept in a sorted list, so a prefix is a bisect plus a scan of
+    its run, and in a trigram index, so a misspelt term still reaches the
+    tokens it shares most trigrams with. Both are maintained incrementally:
+    add() indexes one customer, and catch_up() indexes whatever a backend has
+    appended since the last call. Only tokens and row ids are kept, not the
+    customers themselves, so search() returns row ids for the backend to
+    fetch and a disk-backed store stays on disk.
+    """
+
+    def __init__(self):
+        self.last_row = 0
+        self._count = 0
+        self._rows_by_token: Dict[str, List[int]] = {}
+        self._sorted_tokens: List[str] = []
+        self._tokens_by_gram: Dict[str, List[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _add_token(self, token: str, row: int, batch: Optional[List[str]]) -> None:
+        rows = self._rows_by_token.get(token)
+        if rows is not None:
+            rows.append(row)
+            return
+        self._rows_by_token[token] = [row]
+        grams = _trigrams(token)
+        self._gram_counts[token] = len(grams)
+        for gram in grams:
+            self._tokens_by_gram.setdefault(gram, []).append(token)
+        if batch is None:
+            insort(self._sorted_tokens, token)
+        else:
+            batch.append(token)
+
+    def _add(self, row: int, customer: Mapping, batch: Optional[List[str]] = None) -> None:
+        for token in _tokens(customer):
+            self._add_token(token, row, batch)
+        self.last_row = row
+        self._count += 1
+
+    def add(self, row: int, customer: Mapping) -> None:
+        """Index one more customer under `row`, which must be above every row indexed so far"""
+        with self._lock:
+            self._add(row, customer)
+
+    def catch_up(self, iter_rows: Callable[[int], Iterable[Tuple[int, Mapping]]]) -> int:
+        """Index the customers appended since the last call, e.g. catch_up(backend.iter_customer_rows)"""
+        with self._lock:
+            batch: List[str] = []
+            before = self._count
+            for row, customer in iter_rows(self.last_row):
+                self._add(row, customer, batch)
+            if batch:
+                # One sort for a bulk load instead of an O(n) insort per token
+                self._sorted_tokens.extend(batch)
+                self._sorted_tokens.sort()
+            return self._count - before
+
+    def _prefixed(self, term: str) -> Iterable[str]:
+        i = bisect_left(self._sorted_tokens, term)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(term):
+            yield self._sorted_tokens[i]
+            i += 1
+
+    def _similar(self, term: str) -> Iterable[Tuple[str, float]]:
+        grams = _trigrams(term)
+        shared = Counter(token for gram in grams for token in self._tokens_by_gram.get(gram, ()))
+        for token, count in shared.items():
+            similarity = count / (len(grams) + self._gram_counts[token] - count)
+            if similarity >= MIN_SIMILARITY:
+                yield token, similarity
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        """Best score of `term` against each matching customer's tokens"""
+        scores: Dict[int, float] = {}
+
+        def offer(token: str, score: float) -> None:
+            for row in self._rows_by_token[token]:
+                if score > scores.get(row, 0.0):
+                    scores[row] = score
+
+        for token in self._prefixed(term):
+            offer(token, EXACT_SCORE if token == term else PREFIX_SCORE + len(term) / len(token))
+        for token, similarity in self._similar(term):
+            offer(token, similarity)
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """Return up to `limit` (row, score) pairs, best first
+
+        Every whitespace-separated term of the query is scored separately
+        and the scores summed, so "jon do" ranks John Doe above other Johns.
+        Ties keep insertion order.
+        """
+        terms = [term for term in query.lower().split() if term]
+        if not terms or limit < 1:
+            return []
+        with self._lock:
+            totals: Dict[int, float] = {}
+            for term in terms:
+                for row, score in self._term_scores(term).items():
+                    totals[row] = totals.get(row, 0.0) + score
+            best = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], item[0]))
+            return [(row, round(score, 3)) for row, score in best]
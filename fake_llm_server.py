@@ -0,0 +1,140 @@
+"""A local stand-in for the Anthropic Messages API, for exercising MCP clients offline.
+
+    python fake_llm_server.py --port 8765 --token-delay 0.02
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=fake python "client 2.py" multi_tools_server.py
+
+Responses are scripted from the last user message:
+  * the completion-check prompt gets "COMPLETE";
+  * text mentioning 5-digit order ids or email addresses gets one tool_use
+    block per id (get_order_by_id, or cancel_order when asked to cancel) and
+    per email (get_user), if those tools were offered;
+  * tool results (user messages following a <thinking> turn or another user
+    message), or anything else, get a short <reply> text.
+Both plain JSON and streamed (SSE) responses are supported. --first-token-delay
+and --token-delay emulate model latency so streaming behaviour can be measured.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ORDER_ID = re.compile(r"\b\d{5}\b")
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_ids = itertools.count(1)
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def plan_response(body: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+    """Return the content blocks and stop_reason for a request"""
+    messages = body.get("messages", [])
+    last = messages[-1] if messages else {"content": ""}
+    text = _text_of(last.get("content", ""))
+    tools = {tool["name"] for tool in body.get("tools", [])}
+
+    if "COMPLETE" in text and "INCOMPLETE" in text:
+        return [{"type": "text", "text": "COMPLETE\nThe user's question has been answered."}], "end_turn"
+
+    # Tool output follows a tool-using assistant turn or another user message
+    previous = messages[-2] if len(messages) > 1 else None
+    follow_up = previous is not None and (previous["role"] == "user" or "<thinking>" in _text_of(previous["content"]))
+    if not follow_up:
+        calls = []
+        order_tool = "cancel_order" if "cancel" in text.lower() else "get_order_by_id"
+        if order_tool in tools:
+            calls += [(order_tool, {"order_id": order_id}) for order_id in ORDER_ID.findall(text)]
+        if "get_user" in tools:
+            calls += [("get_user", {"key": "email", "value": email}) for email in EMAIL.findall(text)]
+        if calls:
+            blocks = [{"type": "text", "text": f"<thinking>I need {len(calls)} tool call(s).</thinking>"}]
+            blocks += [{"type": "tool_use", "id": f"toolu_{next(_ids):06d}", "name": name, "input": args}
+                       for name, args in calls]
+            return blocks, "tool_use"
+
+    summary = text.strip().splitlines()[0][:80] if text.strip() else "nothing"
+    return [{"type": "text", "text": f"<reply>Here is what I found: {summary}</reply>"}], "end_turn"
+
+
+def _message(body: Dict[str, Any], blocks: List[Dict[str, Any]], stop_reason: str) -> Dict[str, Any]:
+    return {
+        "id": f"msg_{next(_ids):06d}", "type": "message", "role": "assistant",
+        "model": body.get("model", "fake"), "content": blocks,
+        "stop_reason": stop_reason, "stop_sequence": None,
+        "usage": {"input_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                  "output_tokens": sum(len(json.dumps(b)) for b in blocks) // 4},
+    }
+
+
+def _chunks(text: str, size: int = 8) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_message(message: Dict[str, Any], first_token_delay: float, token_delay: float):
+    start = dict(message, content=[], stop_reason=None, usage=dict(message["usage"], output_tokens=1))
+    yield _sse("message_start", {"type": "message_start", "message": start})
+    await asyncio.sleep(first_token_delay)
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "text":
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": {"type": "text", "text": ""}})
+            deltas = [{"type": "text_delta", "text": chunk} for chunk in _chunks(block["text"])]
+        else:
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": dict(block, input={})})
+            deltas = [{"type": "input_json_delta", "partial_json": chunk}
+                      for chunk in _chunks(json.dumps(block["input"]))]
+        for delta in deltas:
+            await asyncio.sleep(token_delay)
+            yield _sse("content_block_delta", {"type": "content_block_delta", "index": index, "delta": delta})
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+    yield _sse("message_delta", {"type": "message_delta",
+                                 "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                 "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+def create_app(first_token_delay: float = 0.0, token_delay: float = 0.0) -> Starlette:
+    async def messages(request: Request):
+        body = await request.json()
+        blocks, stop_reason = plan_response(body)
+        message = _message(body, blocks, stop_reason)
+        if body.get("stream"):
+            return StreamingResponse(stream_message(message, first_token_delay, token_delay),
+                                     media_type="text/event-stream")
+        # Without streaming the whole response arrives after every token is generated
+        await asyncio.sleep(first_token_delay + token_delay * sum(
+            len(_chunks(b.get("text") or json.dumps(b.get("input")))) for b in blocks))
+        return JSONResponse(message)
+
+    return Starlette(routes=[Route("/v1/messages", endpoint=messages, methods=["POST"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.first_token_delay, args.token_delay), host=args.host, port=args.port,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from typing import Any, Dict, List, Optional
+
+# Rough size of a token in characters; good enough to keep requests under a budget
+CHARS_PER_TOKEN = 4
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def estimate_tokens(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN + 1
+    return sum(len(block.get("text", "")) // CHARS_PER_TOKEN + 1 for block in content)
+
+
+def _blocks(content: Any) -> Any:
+    """Plain strings stay as they are; tool result content becomes a list of text block dicts"""
+    if isinstance(content, str):
+        return content
+    return [{"type": "text", "text": getattr(part, "text", None) or str(part)} for part in content]
+
+
+class ConversationHistory:
+    """Messages of a chat session kept under a token budget
+
+    Token counts are estimated once per message and kept as a running
+    total, so checking the budget costs nothing per request. When the
+    total passes `max_tokens`, tool outputs older than the newest
+    `keep_tool_outputs` are cut down to `tool_output_chars`, then the oldest
+    messages are dropped, until the total is back under `low_watermark` of
+    the budget. Compacting well below the limit means the history only
+    changes at its start every so often; between compactions it only grows
+    at the end, so the prompt cache prefix stays valid.
+    """
+
+    def __init__(self, max_tokens: int = 50_000, keep_tool_outputs: int = 2, tool_output_chars: int = 500,
+                 low_watermark: float = 0.6):
+        self.max_tokens = max_tokens
+        self.keep_tool_outputs = keep_tool_outputs
+        self.tool_output_chars = tool_output_chars
+        self.low_watermark = low_watermark
+        self.messages: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+        self._tool_output: List[bool] = []
+        self.total_tokens = 0
+        self.compactions = 0
+
+    def append(self, role: str, content: Any, tool_output: bool = False) -> None:
+        content = _blocks(content)
+        tokens = estimate_tokens(content)
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self._tool_output.append(tool_output)
+        self.total_tokens += tokens
+        if self.total_tokens > self.max_tokens:
+            self.compact()
+
+    def _replace(self, index: int, content: Any) -> None:
+        tokens = estimate_tokens(content)
+        self.messages[index] = {"role": self.messages[index]["role"], "content": content}
+        self.total_tokens += tokens - self._tokens[index]
+        self._tokens[index] = tokens
+
+    def _truncate(self, content: Any) -> Any:
+        text = content if isinstance(content, str) else "\n".join(block["text"] for block in content)
+        if len(text) <= self.tool_output_chars:
+            return content
+        text = f"{text[:self.tool_output_chars]}\n[... {len(text) - self.tool_output_chars} characters of old tool output omitted]"
+        return text if isinstance(content, str) else [{"type": "text", "text": text}]
+
+    def _drop_first(self) -> None:
+        del self.messages[0], self._tool_output[0]
+        self.total_tokens -= self._tokens.pop(0)
+
+    def compact(self) -> None:
+        """Shrink old tool outputs, then drop the oldest messages, until under the low watermark"""
+        target = int(self.max_tokens * self.low_watermark)
+        tool_indexes = [i for i, is_tool in enumerate(self._tool_output) if is_tool]
+        for index in tool_indexes[:max(0, len(tool_indexes) - self.keep_tool_outputs)]:
+            if self.total_tokens <= target:
+                break
+            self._replace(index, self._truncate(self.messages[index]["content"]))
+        # Keep at least the newest message; the history must still start with a user turn
+        while len(self.messages) > 1 and (self.total_tokens > target or self.messages[0]["role"] != "user"):
+            self._drop_first()
+        self.compactions += 1
+
+    def request_messages(self, extra: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Messages to send, with a prompt cache breakpoint after the last history message"""
+        messages = list(self.messages)
+        if messages:
+            last = messages[-1]
+            content = last["content"]
+            blocks = [{"type": "text", "text": content}] if isinstance(content, str) else [dict(b) for b in content]
+            blocks[-1]["cache_control"] = CACHE_CONTROL
+            messages[-1] = {"role": last["role"], "content": blocks}
+        return messages + (extra or [])
+
+    @staticmethod
+    def system_blocks(system_prompt: str) -> List[Dict[str, Any]]:
+        """The system prompt as a cacheable block; it never changes within a session"""
+        return [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
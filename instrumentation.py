@@ -0,0 +1,282 @@
+import io
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mcp import types
+from mcp.server.fastmcp import FastMCP
+
+from request_log import record_requests
+
+# Upper bounds of the latency (seconds) and payload (bytes) histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus-style cumulative export"""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        buckets, total = [], 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            buckets.append((repr(bound), total))
+        buckets.append(("+Inf", self.count))
+        return buckets
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.payload = Histogram(PAYLOAD_BUCKETS)
+
+
+class Metrics:
+    """Per-operation call counts, error counts, latency and payload size histograms"""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], OperationStats] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        # Extra gauges, e.g. render cache counters, merged into every export
+        self.collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def record(self, kind: str, name: str, seconds: float, payload_bytes: int, error: bool) -> None:
+        with self._lock:
+            stats = self._stats.get((kind, name))
+            if stats is None:
+                stats = self._stats[(kind, name)] = OperationStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.latency.observe(seconds)
+            stats.payload.observe(payload_bytes)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            operations = {
+                f"{kind}:{name}": {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "latency_ms": {
+                        "mean": s.latency.sum / s.latency.count * 1000 if s.latency.count else 0.0,
+                        "p50": s.latency.quantile(0.5) * 1000,
+                        "p95": s.latency.quantile(0.95) * 1000,
+                        "p99": s.latency.quantile(0.99) * 1000,
+                    },
+                    "payload_bytes": {
+                        "total": int(s.payload.sum),
+                        "mean": s.payload.sum / s.payload.count if s.payload.count else 0.0,
+                    },
+                }
+                for (kind, name), s in sorted(self._stats.items())
+            }
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "operations": operations,
+            **{name: collect() for name, collect in self.collectors.items()},
+        }
+
+    def prometheus_text(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            "# TYPE mcp_requests_total counter",
+            "# TYPE mcp_request_errors_total counter",
+            "# TYPE mcp_request_duration_seconds histogram",
+            "# TYPE mcp_response_bytes histogram",
+        ]
+        with self._lock:
+            for (kind, name), s in sorted(self._stats.items()):
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                lines.append(f"mcp_requests_total{{{labels}}} {s.calls}")
+                lines.append(f"mcp_request_errors_total{{{labels}}} {s.errors}")
+                for metric, histogram in (("mcp_request_duration_seconds", s.latency),
+                                          ("mcp_response_bytes", s.payload)):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        for collector, collect in self.collectors.items():
+            for key, value in collect().items():
+                lines.append(f"mcp_{collector}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Profiler:
+    """Switchable cProfile / tracemalloc profiler with on-demand reports
+
+    cProfile only sees the thread that enabled it (the event loop); work
+    offloaded to the tool thread pool shows up as time waiting on futures.
+    """
+
+    MODES = ("cprofile", "tracemalloc")
+
+    # cProfile, pstats and tracemalloc are imported on first use; most servers never profile
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self._profile = None
+        self._baseline = None
+
+    def start(self, mode: str) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.stop()
+        self.mode = mode
+        if mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            import tracemalloc
+            tracemalloc.start(10)
+            self._baseline = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile = None
+        if self.mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.stop()
+            self._baseline = None
+        self.mode = None
+
+    def report(self, limit: int = 30, reset: bool = True) -> str:
+        """Return the hottest functions or allocation sites since the last report"""
+        if self.mode == "cprofile":
+            import cProfile
+            import pstats
+            self._profile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("tottime").print_stats(limit)
+            if reset:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+            return out.getvalue()
+        if self.mode == "tracemalloc":
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            stats = snapshot.compare_to(self._baseline, "lineno")[:limit]
+            if reset:
+                self._baseline = snapshot
+            return "\n".join(str(stat) for stat in stats)
+        return "Profiler is off; set MCP_PROFILER=cprofile|tracemalloc or call Profiler.start()"
+
+
+def _payload_bytes(result) -> int:
+    """Size of the text carried by a tool, resource or prompt result"""
+    root = getattr(result, "root", result)
+    if isinstance(root, types.CallToolResult):
+        parts = root.content
+    elif isinstance(root, types.ReadResourceResult):
+        parts = root.contents
+    elif isinstance(root, types.GetPromptResult):
+        parts = [message.content for message in root.messages]
+    else:
+        return 0
+    return sum(len((getattr(part, "text", None) or getattr(part, "blob", None) or "").encode()) for part in parts)
+
+
+def _resource_label(mcp: FastMCP, uri: str) -> str:
+    # Label templated reads by their template so metrics don't grow per cursor
+    for template in mcp._resource_manager._templates.values():
+        if template.matches(uri):
+            return template.uri_template
+    return uri
+
+
+def instrument(mcp: FastMCP, metrics: Optional[Metrics] = None) -> Metrics:
+    """Wrap every tool, resource and prompt request handler of `mcp` with metrics
+
+    Works at the low-level request handler, so tools, resources and prompts
+    registered before or after this call are all covered without editing them.
+    """
+    metrics = metrics or Metrics()
+    handlers = mcp._mcp_server.request_handlers
+    labelers = {
+        types.CallToolRequest: ("tool", lambda req: req.params.name),
+        types.ReadResourceRequest: ("resource", lambda req: _resource_label(mcp, str(req.params.uri))),
+        types.GetPromptRequest: ("prompt", lambda req: req.params.name),
+    }
+    for request_type, (kind, label) in labelers.items():
+        handler = handlers.get(request_type)
+        if handler is None:
+            continue
+
+        def wrapped(req, handler=handler, kind=kind, label=label):
+            return _timed(metrics, kind, label(req), handler, req)
+
+        handlers[request_type] = wrapped
+    return metrics
+
+
+async def _timed(metrics: Metrics, kind: str, name: str, handler, req):
+    start = time.perf_counter()
+    try:
+        result = await handler(req)
+    except Exception:
+        metrics.record(kind, name, time.perf_counter() - start, 0, True)
+        raise
+    error = bool(getattr(getattr(result, "root", result), "isError", False))
+    metrics.record(kind, name, time.perf_counter() - start, _payload_bytes(result), error)
+    return result
+
+
+def add_metrics_resources(mcp: FastMCP, metrics: Metrics, profiler: Profiler) -> None:
+    """Expose metrics://server (JSON) and metrics://profile (hot-path report) resources"""
+
+    @mcp.resource("metrics://server")
+    def server_metrics() -> str:
+        """Per-operation latency, call, error and payload-size metrics as JSON"""
+        return json.dumps(metrics.snapshot(), indent=2)
+
+    @mcp.resource("metrics://profile")
+    def profile_report() -> str:
+        """Hot-path report from the running profiler since the previous read"""
+        return profiler.report()
+
+
+def setup_observability(mcp: FastMCP) -> Tuple[Metrics, Profiler]:
+    """Instrument `mcp`, register the metrics resources and start the profiler from MCP_PROFILER
+
+    With MCP_RECORD_REQUESTS=path every request is also appended to a
+    request log that replay_requests.py can re-issue.
+    """
+    metrics = instrument(mcp)
+    record_requests(mcp)
+    profiler = Profiler()
+    mode = os.environ.get("MCP_PROFILER")
+    if mode:
+        profiler.start(mode)
+    add_metrics_resources(mcp, metrics, profiler)
+    return metrics, profiler
@@ -1,160 +1,139 @@
 from mcp.server.fastmcp import FastMCP
-from typing import Optional, List, Dict, Any, Union
+import os
+from itertools import islice
+from typing import Optional, List, Union, Iterator
 
-# Initialize the FastMCP server
+from customer_db import create_database
+from instrumentation import setup_observability
+from render_cache import RenderCache
+from tool_executor import ToolExecutor
+from tool_output import (
+    CUSTOMER_ORDER_FIELDS, MAX_SEARCH_RESULTS, NEXT_PAGE_PREFIX, ORDER_FIELDS, cancellation_records, customer_record,
+    decode_cursor, dumps, encode_cursor, format_cancellations, format_customer, format_customer_orders,
+    format_customer_totals, format_order, format_order_line, format_orders, format_search, format_status_counts,
+    format_top_products, format_user, order_record, page_limit, resolve_format, table, user_record,
+)
+
+# Initialize the FastMCP server; every tool, resource and prompt is timed
 mcp = FastMCP("CustomerDB")
+metrics, profiler = setup_observability(mcp)
+
+# Create database instance; CUSTOMERDB_BACKEND selects the storage engine
+db = create_database()
+
+# Tools run through a bounded thread pool when the backend does blocking I/O;
+# CUSTOMERDB_TOOL_WORKERS sizes it and CUSTOMERDB_TOOL_LIMITS caps each tool
+executor = ToolExecutor.from_env(default_workers=8 if db.blocking else 0)
 
-# Database class definition (your existing FakeDatabase implementation)
-class FakeDatabase:
-    def __init__(self):
-        self.customers = [
-            {"id": "1213210", "name": "John Doe", "email": "john@gmail.com", "phone": "123-456-7890", "username": "johndoe"},
-            {"id": "2837622", "name": "Priya Patel", "email": "priya@candy.com", "phone": "987-654-3210", "username": "priya123"},
-            {"id": "3924156", "name": "Liam Nguyen", "email": "lnguyen@yahoo.com", "phone": "555-123-4567", "username": "liamn"},
-            {"id": "4782901", "name": "Aaliyah Davis", "email": "aaliyahd@hotmail.com", "phone": "111-222-3333", "username": "adavis"},
-            {"id": "5190753", "name": "Hiroshi Nakamura", "email": "hiroshi@gmail.com", "phone": "444-555-6666", "username": "hiroshin"},
-            {"id": "6824095", "name": "Fatima Ahmed", "email": "fatimaa@outlook.com", "phone": "777-888-9999", "username": "fatimaahmed"},
-            {"id": "7135680", "name": "Alejandro Rodriguez", "email": "arodriguez@protonmail.com", "phone": "222-333-4444", "username": "alexr"},
-            {"id": "8259147", "name": "Megan Anderson", "email": "megana@gmail.com", "phone": "666-777-8888", "username": "manderson"},
-            {"id": "9603481", "name": "Kwame Osei", "email": "kwameo@yahoo.com", "phone": "999-000-1111", "username": "kwameo"},
-            {"id": "1057426", "name": "Mei Lin", "email": "meilin@gmail.com", "phone": "333-444-5555", "username": "mlin"}
-        ]
-
-        self.orders = [
-            {"id": "24601", "customer_id": "1213210", "product": "Wireless Headphones", "quantity": 1, "price": 79.99, "status": "Shipped"},
-            {"id": "13579", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 2, "price": 19.99, "status": "Processing"},
-            {"id": "97531", "customer_id": "2837622", "product": "Bluetooth Speaker", "quantity": 1, "price": 49.99, "status": "Shipped"},
-            {"id": "86420", "customer_id": "3924156", "product": "Fitness Tracker", "quantity": 1, "price": 129.99, "status": "Delivered"},
-            {"id": "54321", "customer_id": "4782901", "product": "Laptop Sleeve", "quantity": 3, "price": 24.99, "status": "Shipped"},
-            {"id": "19283", "customer_id": "5190753", "product": "Wireless Mouse", "quantity": 1, "price": 34.99, "status": "Processing"},
-            {"id": "74651", "customer_id": "6824095", "product": "Gaming Keyboard", "quantity": 1, "price": 89.99, "status": "Delivered"},
-            {"id": "30298", "customer_id": "7135680", "product": "Portable Charger", "quantity": 2, "price": 29.99, "status": "Shipped"},
-            {"id": "47652", "customer_id": "8259147", "product": "Smartwatch", "quantity": 1, "price": 199.99, "status": "Processing"},
-            {"id": "61984", "customer_id": "9603481", "product": "Noise-Cancelling Headphones", "quantity": 1, "price": 149.99, "status": "Shipped"},
-            {"id": "58243", "customer_id": "1057426", "product": "Wireless Earbuds", "quantity": 2, "price": 99.99, "status": "Delivered"},
-            {"id": "90357", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 1, "price": 19.99, "status": "Shipped"},
-            {"id": "28164", "customer_id": "2837622", "product": "Wireless Headphones", "quantity": 2, "price": 79.99, "status": "Processing"}
-        ]
-
-    def get_user(self, key: str, value: str) -> Dict[str, str]:
-        if key in {"email", "phone", "username"}:
-            for customer in self.customers:
-                if customer[key] == value:
-                    return customer
-            return f"Couldn't find a user with {key} of {value}"
-        else:
-            raise ValueError(f"Invalid key: {key}")
-
-    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[Dict[str, Any]]:
-        for order in self.orders:
-            if order["id"] == str(order_id):
-                return order
-        return None
-
-    def get_customer_orders(self, customer_id: str) -> List[Dict[str, Any]]:
-        return [order for order in self.orders if order["customer_id"] == customer_id]
-
-    def cancel_order(self, order_id: str) -> str:
-        order = self.get_order_by_id(order_id)
-        if order:
-            if order["status"] == "Processing":
-                order["status"] = "Cancelled"
-                return "Successfully cancelled the order"
-            else:
-                return "Order has already shipped. Cannot cancel it."
-        return "Order not found"
-
-# Create database instance
-db = FakeDatabase()
+# Rendered text keyed by db.version; CUSTOMERDB_RENDER_CACHE_BYTES bounds its size
+render_cache = RenderCache(int(os.environ.get("CUSTOMERDB_RENDER_CACHE_BYTES", 64 * 2**20)))
+metrics.collectors["render_cache"] = render_cache.stats
+
+def _render_page(base_uri: str, rows: Iterator, formatter, limit: int) -> str:
+    """Render at most `limit` (row id, row) pairs pulled lazily from `rows`, plus a link to the next page"""
+    page = list(islice(rows, limit + 1))
+    lines = [formatter(row) for _, row in page[:limit]]
+    if len(page) > limit:
+        lines.append(f"{NEXT_PAGE_PREFIX}{base_uri}/{encode_cursor(page[limit - 1][0])}/{limit}")
+    return "\n".join(lines)
 
 # Define resources
 @mcp.resource("customers://all")
 def list_customers() -> str:
     """Return a list of all customers"""
-    return "\n".join([
-        f"Customer {c['id']}: {c['name']} ({c['email']})"
-        for c in db.customers
-    ])
+    return render_cache.get_or_render(("customers://all",), db.version,
+                                      lambda: "\n".join(format_customer(c) for c in db.iter_customers()))
 
 @mcp.resource("orders://all")
 def list_orders() -> str:
     """Return a list of all orders"""
-    return "\n".join([
-        f"Order {o['id']}: {o['product']} (Status: {o['status']})"
-        for o in db.orders
-    ])
+    return render_cache.get_or_render(("orders://all",), db.version,
+                                      lambda: "\n".join(format_order_line(o) for o in db.iter_orders()))
+
+@mcp.resource("customers://all/{cursor}/{limit}")
+def list_customers_page(cursor: str, limit: str) -> str:
+    """Return one page of customers; use cursor 'start' for the first page"""
+    after, limit = decode_cursor(cursor), page_limit(limit)
+    return render_cache.get_or_render(("customers://all", after, limit), db.version,
+                                      lambda: _render_page("customers://all", db.iter_customer_rows(after),
+                                                           format_customer, limit))
+
+@mcp.resource("orders://all/{cursor}/{limit}")
+def list_orders_page(cursor: str, limit: str) -> str:
+    """Return one page of orders; use cursor 'start' for the first page"""
+    after, limit = decode_cursor(cursor), page_limit(limit)
+    return render_cache.get_or_render(("orders://all", after, limit), db.version,
+                                      lambda: _render_page("orders://all", db.iter_order_rows(after),
+                                                           format_order_line, limit))
+
+# Renderers for the read-only tools; their output is cached per data version.
+# Each renders prose for "text" and compact JSON records for "json", so
+# callers that parse the result never have to scrape the prose.
+def _render_user(key: str, value: str, fmt: str = "text") -> str:
+    try:
+        result = db.get_user(key, value)
+    except ValueError as e:
+        result = str(e)
+    return dumps(user_record(result)) if fmt == "json" else format_user(result)
+
+def _render_order(order_id: str, fmt: str = "text") -> str:
+    order = db.get_order_by_id(order_id)
+    if fmt == "json":
+        return dumps(order_record(order) if order else None)
+    return format_order(order)
+
+def _render_customer_orders(customer_id: str, fmt: str = "text") -> str:
+    orders = db.get_customer_orders(customer_id)
+    if fmt == "json":
+        return dumps(dict(customer_id=customer_id, **table(orders, CUSTOMER_ORDER_FIELDS)))
+    return format_customer_orders(customer_id, orders)
 
 # Define tools
 @mcp.tool()
-def get_user(key: str, value: str) -> str:
+@executor.offload
+def get_user(key: str, value: str, output_format: Optional[str] = None) -> str:
     """
     Look up a user by email, phone, or username.
     
     Args:
         key: The attribute to search by (email, phone, or username)
         value: The value to search for
+        output_format: "text" (default) for a readable summary, "json" for compact records
     """
-    try:
-        result = db.get_user(key, value)
-        if isinstance(result, dict):
-            return (
-                f"Found user:\n"
-                f"Name: {result['name']}\n"
-                f"Email: {result['email']}\n"
-                f"Phone: {result['phone']}\n"
-                f"Username: {result['username']}\n"
-                f"Customer ID: {result['id']}"
-            )
-        return str(result)
-    except ValueError as e:
-        return str(e)
+    fmt = resolve_format(output_format)
+    return render_cache.get_or_render(("get_user", key, value, fmt), db.version,
+                                      lambda: _render_user(key, value, fmt))
 
 @mcp.tool()
-def get_order_by_id(order_id: Union[int,str]) -> str:
+@executor.offload
+def get_order_by_id(order_id: Union[int,str], output_format: Optional[str] = None) -> str:
     """
     Retrieve details of a specific order.
     
     Args:
         order_id: The unique identifier for the order
+        output_format: "text" (default) for a readable summary, "json" for compact records
     """
-    order = db.get_order_by_id(order_id)
-    if order:
-        return (
-            f"Order details:\n"
-            f"ID: {order['id']}\n"
-            f"Product: {order['product']}\n"
-            f"Quantity: {order['quantity']}\n"
-            f"Price: ${order['price']}\n"
-            f"Status: {order['status']}\n"
-            f"Customer ID: {order['customer_id']}"
-        )
-    return "Order not found"
+    order_id, fmt = str(order_id), resolve_format(output_format)
+    return render_cache.get_or_render(("get_order_by_id", order_id, fmt), db.version,
+                                      lambda: _render_order(order_id, fmt))
 
 @mcp.tool()
-def get_customer_orders(customer_id: Union[int,str]) -> str:
+@executor.offload
+def get_customer_orders(customer_id: Union[int,str], output_format: Optional[str] = None) -> str:
     """
     List all orders for a specific customer.
     
     Args:
         customer_id: The customer's unique identifier
+        output_format: "text" (default) for a readable summary, "json" for compact records
     """
-    customer_id = str(customer_id)
-    orders = db.get_customer_orders(customer_id)
-    if not orders:
-        return f"No orders found for customer {customer_id}"
-    
-    order_list = "\n\n".join([
-        f"Order ID: {order['id']}\n"
-        f"Product: {order['product']}\n"
-        f"Quantity: {order['quantity']}\n"
-        f"Price: ${order['price']}\n"
-        f"Status: {order['status']}"
-        for order in orders
-    ])
-    
-    return f"Orders for customer {customer_id}:\n\n{order_list}"
+    customer_id, fmt = str(customer_id), resolve_format(output_format)
+    return render_cache.get_or_render(("get_customer_orders", customer_id, fmt), db.version,
+                                      lambda: _render_customer_orders(customer_id, fmt))
 
 @mcp.tool()
+@executor.offload
 def cancel_order(order_id: Union[int,str]) -> str:
     """
     Cancel a processing order.
@@ -164,6 +143,132 @@ def cancel_order(order_id: Union[int,str]) -> str:
     """
     return db.cancel_order(order_id)
 
+# Ranked fuzzy lookup, so a partial or misspelt guess takes one call instead of many get_user retries
+def _render_search(query: str, limit: int, fmt: str = "text") -> str:
+    matches = db.search_customers(query, limit)
+    if fmt == "json":
+        return dumps([dict(customer_record(c), score=score) for c, score in matches])
+    return format_search(query, matches)
+
+@mcp.tool()
+@executor.offload
+def search_customers(query: str, limit: int = 5, output_format: Optional[str] = None) -> str:
+    """
+    Search customers by name, email or username, tolerating partial values and typos.
+    Returns the best matches first.
+    
+    Args:
+        query: Whole or partial name, email or username; several words narrow the match
+        limit: Maximum number of matches to return (default 5)
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    limit, fmt = max(1, min(int(limit), MAX_SEARCH_RESULTS)), resolve_format(output_format)
+    return render_cache.get_or_render(("search_customers", query, limit, fmt), db.version,
+                                      lambda: _render_search(query, limit, fmt))
+
+# Aggregates are running totals kept current by every status change,
+# so these answer without fetching and parsing each customer's orders
+
+@mcp.tool()
+@executor.offload
+def get_customer_totals(customer_id: Union[int,str], output_format: Optional[str] = None) -> str:
+    """
+    Summarise a customer's orders: how many, how many cancelled, units bought and total spent.
+    Cancelled orders are excluded from units and spend.
+    
+    Args:
+        customer_id: The customer's unique identifier
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    totals = db.customer_totals(str(customer_id))
+    return dumps(totals) if resolve_format(output_format) == "json" else format_customer_totals(totals)
+
+@mcp.tool()
+@executor.offload
+def get_order_status_counts(output_format: Optional[str] = None) -> str:
+    """
+    Count the orders in each status (Processing, Shipped, Delivered, Cancelled).
+    
+    Args:
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    counts = db.status_counts()
+    if resolve_format(output_format) == "json":
+        return dumps(counts)
+    return format_status_counts(counts)
+
+@mcp.tool()
+@executor.offload
+def get_top_products(limit: int = 5, by: str = "revenue", output_format: Optional[str] = None) -> str:
+    """
+    List the best-selling products, excluding cancelled orders from units and revenue.
+    
+    Args:
+        limit: Number of products to return (default 5)
+        by: Ranking: revenue (default), units or orders
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    try:
+        products = db.top_products(max(1, int(limit)), by)
+    except ValueError as e:
+        return str(e)
+    if resolve_format(output_format) == "json":
+        return dumps(products)
+    return format_top_products(products)
+
+# Batch variants resolve every key in one call, saving a round trip per key
+@mcp.tool()
+@executor.offload
+def get_users(key: str, values: List[str], output_format: Optional[str] = None) -> str:
+    """
+    Look up several users by email, phone, or username in one call.
+    
+    Args:
+        key: The attribute to search by (email, phone, or username)
+        values: The values to search for
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    try:
+        results = db.get_users(key, values)
+    except ValueError as e:
+        return dumps({"error": str(e)}) if fmt == "json" else str(e)
+    if fmt == "json":
+        return dumps([user_record(result) for result in results])
+    return "\n\n".join(format_user(result) for result in results)
+
+@mcp.tool()
+@executor.offload
+def get_orders_by_ids(order_ids: List[Union[int,str]], output_format: Optional[str] = None) -> str:
+    """
+    Retrieve details of several orders in one call.
+    
+    Args:
+        order_ids: The unique identifiers of the orders
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    orders = db.get_orders_by_ids(order_ids)
+    if fmt == "json":
+        return dumps(table(orders, ORDER_FIELDS))
+    return format_orders(order_ids, orders)
+
+@mcp.tool()
+@executor.offload
+def cancel_orders(order_ids: List[Union[int,str]], output_format: Optional[str] = None) -> str:
+    """
+    Cancel several processing orders, reporting the outcome for each.
+    
+    Args:
+        order_ids: The unique identifiers of the orders to cancel
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    outcomes = db.cancel_orders(order_ids)
+    if fmt == "json":
+        return dumps(cancellation_records(order_ids, outcomes))
+    return format_cancellations(order_ids, outcomes)
+
 # Add some helpful prompts
 @mcp.prompt()
 def search_customer(search_type: str, value: str) -> str:
@@ -0,0 +1,91 @@
+import heapq
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from typing import List, Dict, Any
+
+CANCELLED_STATUS = "Cancelled"
+# Column of the per-product totals each ranking sorts on
+TOP_PRODUCTS_BY = {"orders": 0, "units": 1, "revenue": 2}
+
+
+def ranking_column(by: str) -> int:
+    if by not in TOP_PRODUCTS_BY:
+        raise ValueError(f"Invalid ranking: {by}; expected one of {', '.join(TOP_PRODUCTS_BY)}")
+    return TOP_PRODUCTS_BY[by]
+
+
+def _cents(order: Mapping) -> int:
+    # Money is summed in integer cents so repeated add/subtract never drifts
+    return round(order["price"] * 100) * order["quantity"]
+
+
+class OrderAggregates:
+    """Running totals over an order store, kept current on every status change
+
+    Spend, units and revenue count every order that is not Cancelled; order
+    counts include them. add() folds in a new order and change_status()
+    moves one between statuses, each in O(1), so a customer's totals and the
+    per-status counts are dictionary reads. top_products() ranks the
+    distinct products, a catalogue far smaller than the order table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status_counts: Counter = Counter()
+        # customer_id -> [orders, cancelled, units, cents]
+        self._customers: Dict[str, List[int]] = {}
+        # product -> [orders, units, cents]
+        self._products: Dict[str, List[int]] = {}
+
+    def add(self, order: Mapping) -> None:
+        with self._lock:
+            customer = self._customers.setdefault(order["customer_id"], [0, 0, 0, 0])
+            product = self._products.setdefault(order["product"], [0, 0, 0])
+            customer[0] += 1
+            product[0] += 1
+            self._status_counts[order["status"]] += 1
+            if order["status"] == CANCELLED_STATUS:
+                customer[1] += 1
+            else:
+                self._count(order, customer, product, 1)
+
+    @staticmethod
+    def _count(order: Mapping, customer: List[int], product: List[int], sign: int) -> None:
+        units, cents = sign * order["quantity"], sign * _cents(order)
+        customer[2] += units
+        customer[3] += cents
+        product[1] += units
+        product[2] += cents
+
+    def change_status(self, order: Mapping, old: str, new: str) -> None:
+        """Record that `order` moved from status `old` to `new`"""
+        if old == new:
+            return
+        with self._lock:
+            self._status_counts[old] -= 1
+            self._status_counts[new] += 1
+            if CANCELLED_STATUS not in (old, new):
+                return
+            sign = -1 if new == CANCELLED_STATUS else 1
+            customer = self._customers[order["customer_id"]]
+            customer[1] -= sign
+            self._count(order, customer, self._products[order["product"]], sign)
+
+    def customer_totals(self, customer_id: str) -> Dict[str, Any]:
+        with self._lock:
+            orders, cancelled, units, cents = self._customers.get(customer_id, (0, 0, 0, 0))
+        return {"customer_id": customer_id, "orders": orders, "cancelled": cancelled,
+                "units": units, "spent": cents / 100}
+
+    def status_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {status: count for status, count in self._status_counts.items() if count}
+
+    def top_products(self, limit: int = 5, by: str = "revenue") -> List[Dict[str, Any]]:
+        column = ranking_column(by)
+        with self._lock:
+            items = [(product, tuple(totals)) for product, totals in self._products.items()]
+        best = heapq.nlargest(limit, items, key=lambda item: item[1][column])
+        return [{"product": product, "orders": orders, "units": units, "revenue": cents / 100}
+                for product, (orders, units, cents) in best]
@@ -0,0 +1,67 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class RenderCache:
+    """LRU cache of rendered resource and tool text, bounded by total size in bytes
+
+    Entries are keyed by (key, data_version). Any mutation of the backing
+    store bumps its version, so later lookups miss and old renderings are
+    never served; they simply age out of the LRU.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Hashable, int], Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_render(self, key: Hashable, version: int, render: Callable[[], str]) -> str:
+        """Return the cached text for `key` at `version`, rendering it on a miss"""
+        cache_key = (key, version)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        text = render()
+        self._store(cache_key, text)
+        return text
+
+    def _store(self, cache_key: Tuple[Hashable, int], text: str) -> None:
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[cache_key] = (text, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
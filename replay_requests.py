@@ -0,0 +1,183 @@
+"""Replay a recorded request log against a server and compare with the recording.
+
+    MCP_RECORD_REQUESTS=requests.jsonl python bench_load.py --sessions 1 --duration 5   # record
+    python replay_requests.py requests.jsonl multi_tools_server.py
+    python replay_requests.py requests.jsonl --transport sse --rate 4 --json after.json --compare before.json
+    python replay_requests.py requests.jsonl --url http://localhost:8000/sse --rate 0
+
+Opens one session per recorded session and issues each request at its
+recorded arrival time divided by --rate (1 is the original pace, 0 sends
+as fast as each session allows). Reports round-trip latency per operation
+next to the handler time that was recorded, counts responses that differ
+from the recording, and with --compare diffs latency against an earlier
+replay report, e.g. of another build. Responses only match when the server
+starts from the same data the recording did.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from mcp import ClientSession, types
+from mcp.shared.exceptions import McpError
+from rich import print
+
+from bench_load import open_session, percentile, print_report, start_sse_server, stop_process, summarize
+from request_log import RESULT_TYPES, digest, read_log
+
+
+def op_label(entry: dict) -> str:
+    """Group requests by method plus tool or prompt name, or resource URI without its cursor"""
+    params = entry.get("p") or {}
+    if "name" in params:
+        return f"{entry['m']}:{params['name']}"
+    if "uri" in params:
+        return f"{entry['m']}:{'/'.join(params['uri'].split('/')[:3])}"
+    return entry["m"]
+
+
+async def replay_session(session: ClientSession, entries: List[dict], start: float, rate: float,
+                         latencies: Dict[str, List[float]], errors: Dict[str, int], mismatches: List[dict]) -> None:
+    for entry in entries:
+        if rate > 0:
+            delay = start + entry["t"] / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        label = op_label(entry)
+        request = types.ClientRequest.model_validate({"method": entry["m"], "params": entry.get("p")})
+        sent = time.perf_counter()
+        try:
+            result = await session.send_request(request, RESULT_TYPES[entry["m"]])
+            got, error = digest(result), None
+        except McpError as e:
+            got, error = digest(error=e.error.message), e.error.message
+        latencies.setdefault(label, []).append(time.perf_counter() - sent)
+        errors.setdefault(label, 0)
+        if error is not None:
+            errors[label] += 1
+        if got != entry["r"]:
+            mismatches.append({"t": entry["t"], "op": label, "params": entry.get("p"),
+                               "recorded": entry.get("e", entry["r"]), "replayed": error or got})
+
+
+async def replay(args) -> dict:
+    header, entries = read_log(args.log)
+    sessions: Dict[int, List[dict]] = {}
+    skipped = 0
+    for entry in entries:
+        if entry["m"] not in RESULT_TYPES:
+            skipped += 1
+            continue
+        key = entry["s"] % args.max_sessions if args.max_sessions else entry["s"]
+        sessions.setdefault(key, []).append(entry)
+    for queue in sessions.values():
+        queue.sort(key=lambda entry: entry["t"])
+
+    server, url = None, args.url
+    if not url and args.transport == "sse":
+        server, url = await start_sse_server(args.server)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    mismatches: List[dict] = []
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    timing = {}
+    # The clock starts at the first recorded request, not when recording began
+    first = min((queue[0]["t"] for queue in sessions.values()), default=0.0)
+
+    async def session_task(queue: List[dict]) -> None:
+        # Each session lives in its own task: anyio scopes must exit in the task that entered them
+        released = False
+        try:
+            async with open_session(args, url) as session:
+                ready.release()
+                released = True
+                await go.wait()
+                await replay_session(session, queue, timing["start"], args.rate, latencies, errors, mismatches)
+        except BaseException:
+            # Unblock the coordinator so the failure surfaces from gather()
+            if not released:
+                ready.release()
+            raise
+
+    try:
+        tasks = [asyncio.create_task(session_task(queue)) for queue in sessions.values()]
+        # Every session connects before the clock starts, as in the recording
+        for _ in tasks:
+            await ready.acquire()
+        start = time.perf_counter()
+        timing["start"] = start - (first / args.rate if args.rate > 0 else 0.0)
+        go.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            stop_process(server)
+
+    recorded: Dict[str, List[float]] = {}
+    for queue in sessions.values():
+        for entry in queue:
+            recorded.setdefault(op_label(entry), []).append(entry["d"] / 1000)
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "config": {"server": args.server, "url": args.url, "transport": "sse" if url else "stdio",
+                   "sessions": len(sessions), "duration": round(elapsed, 3), "log": args.log,
+                   "recorded_pid": header.get("pid"), "rate": args.rate, "skipped": skipped},
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "operations": {name: summarize(values, errors[name], elapsed) for name, values in sorted(latencies.items())},
+        "recorded": {name: {"p50_ms": percentile(sorted(values), 50) * 1000,
+                            "p95_ms": percentile(sorted(values), 95) * 1000}
+                     for name, values in sorted(recorded.items())},
+        "mismatches": mismatches,
+    }
+
+
+def print_replay(report: dict, baseline: Optional[dict], show: int) -> None:
+    print_report(report, baseline)
+    print(f"\n{'operation':<40}{'recorded p50':>13}{'replay p50':>12}{'recorded p95':>14}{'replay p95':>12}")
+    for name, stats in report["operations"].items():
+        old = report["recorded"].get(name, {})
+        print(f"{name:<40}{old.get('p50_ms', 0):>13.2f}{stats['p50_ms']:>12.2f}"
+              f"{old.get('p95_ms', 0):>14.2f}{stats['p95_ms']:>12.2f}")
+    print("(recorded: server handler time; replay: client round trip)")
+    mismatches = report["mismatches"]
+    print(f"\n{report['total']['count']} requests replayed, {len(mismatches)} responses differ from the recording"
+          + (f", {report['config']['skipped']} skipped" if report["config"]["skipped"] else ""))
+    for mismatch in mismatches[:show]:
+        print(f"  t={mismatch['t']:.3f}s {mismatch['op']} {json.dumps(mismatch['params'])}: "
+              f"recorded {mismatch['recorded']}, replayed {mismatch['replayed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="request log written with MCP_RECORD_REQUESTS")
+    parser.add_argument("server", nargs="?", default="multi_tools_server.py", help="server script to start")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--url", help="replay against an already running SSE server instead of starting one")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="speed-up over the recorded pace; 0 sends without waiting")
+    parser.add_argument("--max-sessions", type=int, default=0,
+                        help="fold the recorded sessions onto at most this many (0: one per recorded session)")
+    parser.add_argument("--show", type=int, default=5, help="number of differing responses to print")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier replay report to compare latency against")
+    args = parser.parse_args()
+
+    # Servers started for the replay must not overwrite the log being replayed
+    os.environ.pop("MCP_RECORD_REQUESTS", None)
+    report = asyncio.run(replay(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_replay(report, baseline, args.show)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    raise SystemExit(1 if report["mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
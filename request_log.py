@@ -0,0 +1,143 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from mcp import types
+from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel.server import request_ctx
+from mcp.shared.exceptions import McpError
+
+LOG_VERSION = 1
+
+
+def digest(result: Any = None, error: Optional[str] = None) -> str:
+    """Short stable hash of a result model or error message, for checking replays"""
+    if error is not None:
+        value = {"error": error}
+    else:
+        value = getattr(result, "root", result).model_dump(mode="json", by_alias=True, exclude_none=True)
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(encoded.encode()).hexdigest()[:16]
+
+
+class RequestRecorder:
+    """Writes every JSON-RPC request a server handles to a compact JSON-lines log
+
+    The first line is a header; each following line is one request:
+
+        {"t": 0.0132, "s": 1, "m": "tools/call", "p": {...}, "d": 0.41, "r": "9f2c..."}
+
+    t is arrival time in seconds since recording started, s numbers the
+    client session, m and p are the method and params as sent, d is the
+    handler time in milliseconds and r a digest of the response (with
+    "e" holding the message when the request failed). replay_requests.py
+    re-issues the log and compares.
+    """
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._file = open(self.path, "w", buffering=1, encoding="utf-8")
+        self._lock = threading.Lock()
+        self._sessions: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self.start = time.perf_counter()
+        self.records = 0
+        self._write({"v": LOG_VERSION, "started": time.time(), "pid": os.getpid()})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def _session_number(self) -> int:
+        try:
+            session = request_ctx.get().session
+        except LookupError:
+            return 0
+        number = self._sessions.get(session)
+        if number is None:
+            number = self._sessions[session] = len(self._sessions) + 1
+        return number
+
+    def install(self, mcp: FastMCP) -> "RequestRecorder":
+        """Wrap every request handler registered on `mcp` so far"""
+        handlers = mcp._mcp_server.request_handlers
+        for request_type, handler in list(handlers.items()):
+            def wrapped(req, handler=handler):
+                return self._recorded(handler, req)
+
+            handlers[request_type] = wrapped
+        return self
+
+    async def _recorded(self, handler, req):
+        arrived = time.perf_counter()
+        entry = {"t": round(arrived - self.start, 6), "s": self._session_number(), "m": req.method}
+        if req.params is not None:
+            entry["p"] = req.params.model_dump(mode="json", by_alias=True, exclude_none=True)
+        try:
+            result = await handler(req)
+        except McpError as e:
+            entry.update(d=round((time.perf_counter() - arrived) * 1000, 3), e=e.error.message,
+                         r=digest(error=e.error.message))
+            raise
+        except Exception as e:
+            entry.update(d=round((time.perf_counter() - arrived) * 1000, 3), e=str(e), r=digest(error=str(e)))
+            raise
+        else:
+            entry.update(d=round((time.perf_counter() - arrived) * 1000, 3), r=digest(result))
+            return result
+        finally:
+            self._write(entry)
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def record_requests(mcp: FastMCP, path: Optional[str] = None) -> Optional[RequestRecorder]:
+    """Start recording from MCP_RECORD_REQUESTS (a path; {pid} is replaced, for multi-worker servers)"""
+    path = path or os.environ.get("MCP_RECORD_REQUESTS")
+    if not path:
+        return None
+    recorder = RequestRecorder(path).install(mcp)
+    atexit.register(recorder.close)
+    return recorder
+
+
+def read_log(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """Return the header and an iterator over the request entries of a recorded log"""
+    f = open(path, encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("v") != LOG_VERSION:
+        f.close()
+        raise ValueError(f"{path}: unsupported request log version {header.get('v')!r}")
+
+    def entries() -> Iterator[Dict[str, Any]]:
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, entries()
+
+
+# Result type the client should parse each replayed method's response into
+RESULT_TYPES = {
+    "ping": types.EmptyResult,
+    "tools/list": types.ListToolsResult,
+    "tools/call": types.CallToolResult,
+    "resources/list": types.ListResourcesResult,
+    "resources/templates/list": types.ListResourceTemplatesResult,
+    "resources/read": types.ReadResourceResult,
+    "prompts/list": types.ListPromptsResult,
+    "prompts/get": types.GetPromptResult,
+    "completion/complete": types.CompleteResult,
+    "logging/setLevel": types.EmptyResult,
+    "resources/subscribe": types.EmptyResult,
+    "resources/unsubscribe": types.EmptyResult,
+}
@@ -1,6 +1,9 @@
 from mcp.server.fastmcp import FastMCP
 
+from instrumentation import setup_observability
+
 mcp = FastMCP("Echo")
+metrics, profiler = setup_observability(mcp)
 
 @mcp.resource("echo://{message}")
 def echo_resource(message: str) -> str:
@@ -1,6 +1,11 @@
+import os
+
 from mcp.server.fastmcp import FastMCP
 
+from instrumentation import setup_observability
+
 mcp = FastMCP("Echo")
+metrics, profiler = setup_observability(mcp)
 
 @mcp.resource("echo://{message}")
 def echo_resource(message: str) -> str:
@@ -18,4 +23,14 @@ def echo_prompt(message: str) -> str:
     return f"Please process this message: {message}"
 
 if __name__ == "__main__":
-    mcp.run(transport='sse')
+    import uvicorn
+    from sse_app import create_sse_app
+
+    # Single process, with /metrics next to the SSE endpoints; use
+    # `python sse_cluster.py server_sse:mcp --workers N` to use every core.
+    # Anyone reaching /debug/profile can switch a slow profiler on, so it is
+    # only served with MCP_DEBUG_PROFILE=1 (the cluster keeps it on loopback)
+    debug_profiler = profiler if os.environ.get("MCP_DEBUG_PROFILE") == "1" else None
+    uvicorn.run(create_sse_app(mcp, metrics=metrics, profiler=debug_profiler),
+                host=mcp.settings.host, port=mcp.settings.port,
+                log_level=mcp.settings.log_level.lower())
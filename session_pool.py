@@ -0,0 +1,230 @@
+import asyncio
+import random
+import sys
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional
+
+import anyio
+from loguru import logger
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+
+from capability_cache import CachingClientSession, CapabilityCache
+from warm_stdio import WarmSpawner
+
+
+class PoolMember:
+    """One pooled session and the bookkeeping used to route calls to it"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.healthy = False
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.connects = 0
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SessionPool:
+    """N ClientSessions to one server, with health checks, reconnects and least-outstanding routing
+
+    `transport` is called once per connection attempt and must return an
+    async context manager yielding (read, write) streams, e.g.
+    `lambda: stdio_client(params)` or `lambda: sse_client(url)`. Each
+    member runs in its own task, so its transport is entered and exited in
+    the same task as anyio requires.
+
+    Over stdio every member is a separate server process with its own data;
+    point the CustomerDB servers at a shared SQLite file if writes made
+    through one member must be visible through the others.
+
+    A call that fails because its member's transport closed, or that gets
+    no reply within `call_timeout` seconds, takes that member out of
+    rotation to reconnect and is retried up to `retries` times on another
+    member. Such a call may already have run on the server, so calls to
+    `mutating_tools` are never retried: their failure is raised instead.
+
+        async with SessionPool.stdio("multi_tools_server.py", size=4) as pool:
+            result = await pool.call_tool("get_user", {"key": "email", "value": "john@gmail.com"})
+    """
+
+    def __init__(self, transport: Callable[[], Any], size: int = 4, health_interval: float = 15.0,
+                 health_timeout: float = 5.0, connect_timeout: float = 30.0, backoff_initial: float = 0.1,
+                 backoff_max: float = 10.0, capability_ttl: Optional[float] = 300.0,
+                 call_timeout: Optional[float] = 60.0, retries: int = 1, close_timeout: float = 5.0,
+                 mutating_tools: Collection[str] = ()):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.transport = transport
+        self.call_timeout = call_timeout
+        self.retries = retries
+        self.mutating_tools = mutating_tools
+        self.close_timeout = close_timeout
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.connect_timeout = connect_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.members = [PoolMember(i) for i in range(size)]
+        # One catalogue for the whole pool, invalidated by any member's notifications
+        self.capabilities = CapabilityCache(self, capability_ttl)
+        self._available = asyncio.Condition()
+        self._closing = False
+        self.spawner: Optional[WarmSpawner] = None
+
+    @classmethod
+    def stdio(cls, server_script_path: str, size: int = 4, env: Optional[Dict[str, str]] = None,
+              warm_spares: int = 0, **kwargs) -> "SessionPool":
+        """Pool of server subprocesses; `warm_spares` keeps that many started ahead for reconnects"""
+        command = sys.executable if server_script_path.endswith(".py") else "node"
+        params = StdioServerParameters(command=command, args=[server_script_path], env=env)
+        if not warm_spares:
+            return cls(lambda: stdio_client(params), size, **kwargs)
+        spawner = WarmSpawner(params, warm_spares)
+        pool = cls(spawner.client, size, **kwargs)
+        pool.spawner = spawner
+        return pool
+
+    @classmethod
+    def sse(cls, url: str, size: int = 4, **kwargs) -> "SessionPool":
+        return cls(lambda: sse_client(url), size, **kwargs)
+
+    async def __aenter__(self) -> "SessionPool":
+        for member in self.members:
+            member.task = asyncio.create_task(self._run_member(member))
+        await self.wait_ready()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> None:
+        """Wait until at least one member is connected"""
+        async with self._available:
+            await asyncio.wait_for(self._available.wait_for(self._has_healthy), timeout or self.connect_timeout)
+
+    def _has_healthy(self) -> bool:
+        return any(member.healthy for member in self.members)
+
+    async def _set_health(self, member: PoolMember, healthy: bool) -> None:
+        member.healthy = healthy
+        async with self._available:
+            self._available.notify_all()
+
+    async def _run_member(self, member: PoolMember) -> None:
+        delay = self.backoff_initial
+        while not self._closing:
+            try:
+                with anyio.CancelScope() as scope:
+                    async with self.transport() as (read, write):
+                        async with CachingClientSession(read, write, capabilities=self.capabilities,
+                                                        on_close=lambda: self._lost(member)) as session:
+                            await asyncio.wait_for(session.initialize(), self.connect_timeout)
+                            member.session = session
+                            member.connects += 1
+                            delay = self.backoff_initial
+                            await self._set_health(member, True)
+                            await self._monitor(member)
+                            # stdio_client waits for its server to exit, which a server
+                            # stuck in a call never does; cancelling the wait kills it
+                            scope.deadline = anyio.current_time() + self.close_timeout
+            except Exception as e:
+                if not self._closing:
+                    logger.warning(f"pool session {member.index} failed: {e!r}")
+            finally:
+                member.session = None
+                await self._set_health(member, False)
+            if self._closing:
+                break
+            # Exponential backoff with jitter so members don't reconnect in lockstep
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.backoff_max)
+
+    def _lost(self, member: PoolMember) -> None:
+        """Take a member out of rotation and wake its task to reconnect"""
+        member.healthy = False
+        member.wake.set()
+
+    async def _monitor(self, member: PoolMember) -> None:
+        """Ping the member while it is idle; returns when it should reconnect or the pool closes"""
+        while member.healthy and not member.session.closed and not self._closing:
+            try:
+                await asyncio.wait_for(member.wake.wait(), self.health_interval)
+                member.wake.clear()
+                continue
+            except asyncio.TimeoutError:
+                pass
+            if member.outstanding:
+                continue
+            try:
+                await asyncio.wait_for(member.session.send_ping(), self.health_timeout)
+            except Exception as e:
+                logger.warning(f"pool session {member.index} failed its health check: {e!r}")
+                return
+
+    async def _acquire(self) -> PoolMember:
+        async with self._available:
+            await asyncio.wait_for(self._available.wait_for(self._has_healthy), self.connect_timeout)
+            member = min((m for m in self.members if m.healthy), key=lambda m: m.outstanding)
+            member.outstanding += 1
+            return member
+
+    async def run(self, operation: Callable[[ClientSession], Awaitable[Any]], retries: Optional[int] = None) -> Any:
+        """Run `operation(session)` on the healthy member with the fewest outstanding requests
+
+        `retries` overrides the pool's; pass 0 for operations that must not run twice.
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            member = await self._acquire()
+            try:
+                result = await asyncio.wait_for(operation(member.session), self.call_timeout)
+            except McpError:
+                # A protocol-level error reply; the session itself is fine
+                raise
+            except Exception as e:
+                member.failures += 1
+                self._lost(member)
+                if attempt == retries:
+                    raise
+                logger.warning(f"pool session {member.index} failed a call, retrying: {e!r}")
+                continue
+            finally:
+                member.outstanding -= 1
+            member.completed += 1
+            return result
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None):
+        retries = 0 if name in self.mutating_tools else None
+        return await self.run(lambda session: session.call_tool(name, arguments), retries)
+
+    async def read_resource(self, uri):
+        return await self.run(lambda session: session.read_resource(uri))
+
+    async def get_prompt(self, name: str, arguments: Optional[dict] = None):
+        return await self.run(lambda session: session.get_prompt(name, arguments))
+
+    async def list_tools(self):
+        return await self.run(lambda session: session.list_tools())
+
+    async def list_resources(self):
+        return await self.run(lambda session: session.list_resources())
+
+    async def list_prompts(self):
+        return await self.run(lambda session: session.list_prompts())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{"index": m.index, "healthy": m.healthy, "outstanding": m.outstanding, "completed": m.completed,
+                 "failures": m.failures, "connects": m.connects} for m in self.members]
+
+    async def close(self) -> None:
+        self._closing = True
+        for member in self.members:
+            member.wake.set()
+        await asyncio.gather(*(m.task for m in self.members if m.task), return_exceptions=True)
+        if self.spawner is not None:
+            await self.spawner.aclose()
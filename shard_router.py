@@ -0,0 +1,461 @@
+"""CustomerDB hash-partitioned across several server processes, behind one MCP server.
+
+    CUSTOMERDB_SHARDS=4 python shard_router.py
+    CUSTOMERDB_SHARDS=4 python sse_cluster.py shard_router:mcp --workers 1
+
+Each shard is a multi_tools_server.py process started with
+CUSTOMERDB_SHARD=i/N, holding only the customers whose crc32(customer_id)
+% N == i and all of their orders, so data size and throughput grow with
+the number of processes. This server exposes the same tools and resources
+and, per call:
+
+- routes calls that name a customer (get_customer_orders,
+  get_customer_totals) to the shard that owns it;
+- scatters every other call to all shards in parallel and gathers: the
+  first shard that finds a user or order answers a lookup or cancellation
+  (orders live with their customer, so an order id alone does not name a
+  shard), counts and product totals are summed, search matches are merged
+  by score, and customers://all and orders://all are concatenated in
+  shard order, with page cursors that carry the shard they stopped in.
+
+The router keeps no per-key state, so its memory does not grow with the data.
+
+Shards are started on the first call and talk to the router over stdio.
+Every shard has its own data, so run one router process; with several
+sse_cluster workers each would start, and write to, its own set of shards.
+"""
+import asyncio
+import base64
+import heapq
+import os
+from typing import Optional, List, Dict, Any, Union, Tuple, Callable, Awaitable
+
+from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.resources import Resource
+
+from customer_db import NOT_FOUND, shard_of
+from instrumentation import setup_observability
+from order_aggregates import ranking_column
+from session_pool import SessionPool
+from tool_output import (
+    MAX_SEARCH_RESULTS, NEXT_PAGE_PREFIX, ORDER_FIELDS, cancellation_records, decode_cursor, dumps, encode_cursor,
+    format_cancellations, format_order, format_orders, format_search, format_status_counts, format_top_products,
+    format_user, loads, page_limit, records, resolve_format, table,
+)
+
+
+# Shard tools that change data
+MUTATING_TOOLS = {"cancel_order", "cancel_orders"}
+
+
+def shard_env(base: Dict[str, str], index: int, count: int) -> Dict[str, str]:
+    """Environment for shard `index` of `count`"""
+    env = dict(base, CUSTOMERDB_SHARD=f"{index}/{count}")
+    # The router records its own requests; shards writing the same log would truncate it
+    env.pop("MCP_RECORD_REQUESTS", None)
+    # Durable backends get a file or directory per shard
+    suffix = f"shard{index}of{count}"
+    env["CUSTOMERDB_SQLITE_PATH"] = f"{env.get('CUSTOMERDB_SQLITE_PATH', 'customerdb.sqlite3')}.{suffix}"
+    env["CUSTOMERDB_DATA_DIR"] = os.path.join(env.get("CUSTOMERDB_DATA_DIR", "customerdb_data"), suffix)
+    return env
+
+
+class ShardRouter:
+    """One stdio session per shard server, started on first use"""
+
+    def __init__(self, server_script: str, count: int, env: Optional[Dict[str, str]] = None):
+        if count < 1:
+            raise ValueError("At least one shard is required")
+        self.count = count
+        env = dict(os.environ) if env is None else env
+        # One session per shard: a second process would hold a diverging copy of its data.
+        # A cancel that timed out may have been applied, so it is never retried
+        self.pools = [SessionPool.stdio(server_script, size=1, env=shard_env(env, i, count),
+                                        mutating_tools=MUTATING_TOOLS)
+                      for i in range(count)]
+        self._start_lock = asyncio.Lock()
+        self._started = False
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if not self._started:
+                await asyncio.gather(*(pool.__aenter__() for pool in self.pools))
+                self._started = True
+
+    async def close(self) -> None:
+        await asyncio.gather(*(pool.close() for pool in self.pools))
+
+    def owner(self, customer_id: Union[int, str]) -> int:
+        return shard_of(customer_id, self.count)
+
+    async def call(self, shard: int, name: str, arguments: Dict[str, Any]) -> str:
+        await self.start()
+        result = await self.pools[shard].call_tool(name, arguments)
+        text = "".join(content.text for content in result.content if content.type == "text")
+        if result.isError:
+            raise RuntimeError(f"shard {shard}: {text}")
+        return text
+
+    async def scatter(self, name: str, arguments: Dict[str, Any]) -> List[str]:
+        return await asyncio.gather(*(self.call(i, name, arguments) for i in range(self.count)))
+
+    async def lookup(self, fetch: Callable[[int], Awaitable[List[Any]]], found: Callable[[Any], bool]) -> List[Any]:
+        """Per key, the first of every shard's `fetch(shard)` results that `found` accepts, else shard 0's"""
+        answers = await asyncio.gather(*(fetch(i) for i in range(self.count)))
+        return [next((c for c in candidates if found(c)), candidates[0]) for candidates in zip(*answers)]
+
+    async def read(self, shard: int, uri: str) -> str:
+        await self.start()
+        result = await self.pools[shard].read_resource(uri)
+        return "".join(getattr(content, "text", "") for content in result.contents)
+
+    async def read_all(self, uri: str) -> str:
+        texts = await asyncio.gather(*(self.read(i, uri) for i in range(self.count)))
+        return "\n".join(text for text in texts if text)
+
+    def stats(self) -> Dict[str, float]:
+        stats = {"shards": self.count}
+        for i, pool in enumerate(self.pools):
+            for member in pool.stats():
+                stats[f"shard{i}_healthy"] = int(member["healthy"])
+                stats[f"shard{i}_outstanding"] = member["outstanding"]
+                stats[f"shard{i}_completed"] = member["completed"]
+        return stats
+
+
+mcp = FastMCP("CustomerDB")
+metrics, profiler = setup_observability(mcp)
+
+# CUSTOMERDB_SHARDS sets the number of shard processes, CUSTOMERDB_SHARD_SERVER the script they run
+router = ShardRouter(
+    os.environ.get("CUSTOMERDB_SHARD_SERVER", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "multi_tools_server.py")),
+    int(os.environ.get("CUSTOMERDB_SHARDS", os.cpu_count() or 1)),
+)
+metrics.collectors["router"] = router.stats
+
+# Page cursors name the shard and the shard's own row id to resume after
+def _shard_cursor(shard: int, row: int) -> str:
+    return base64.urlsafe_b64encode(f"s:{shard}:{row}".encode()).decode().rstrip("=")
+
+def _parse_shard_cursor(cursor: str) -> Tuple[int, int]:
+    if cursor == "start":
+        return 0, 0
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, shard, row = decoded.split(":")
+        if prefix != "s" or not 0 <= int(shard) < router.count or int(row) < 0:
+            raise ValueError
+        return int(shard), int(row)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+async def _read_page(base_uri: str, cursor: str, limit: str) -> str:
+    """Fill one page from consecutive shards, starting where `cursor` left off"""
+    shard, row = _parse_shard_cursor(cursor)
+    limit = page_limit(limit)
+    lines: List[str] = []
+    while shard < router.count and len(lines) < limit:
+        want = limit - len(lines)
+        page = await router.read(shard, f"{base_uri}/{encode_cursor(row)}/{want}")
+        rows = page.split("\n") if page else []
+        if rows and rows[-1].startswith(NEXT_PAGE_PREFIX):
+            # The shard has more than we asked for; resume inside it, after the row its own cursor names
+            row = decode_cursor(rows.pop()[len(NEXT_PAGE_PREFIX) + len(base_uri) + 1:].split("/")[0])
+        else:
+            shard, row = shard + 1, 0
+        lines.extend(rows)
+    if shard < router.count:
+        lines.append(f"{NEXT_PAGE_PREFIX}{base_uri}/{_shard_cursor(shard, row)}/{limit}")
+    return "\n".join(lines)
+
+# Resources gather every shard's rows, in shard order
+class GatheredResource(Resource):
+    """A resource read from every shard and concatenated
+
+    A resource class rather than @mcp.resource, whose plain (non-template)
+    resources call their function without awaiting it.
+    """
+
+    async def read(self) -> str:
+        return await router.read_all(str(self.uri))
+
+mcp.add_resource(GatheredResource(uri="customers://all", name="list_customers",
+                                  description="Return a list of all customers"))
+mcp.add_resource(GatheredResource(uri="orders://all", name="list_orders",
+                                  description="Return a list of all orders"))
+
+@mcp.resource("customers://all/{cursor}/{limit}")
+async def list_customers_page(cursor: str, limit: str) -> str:
+    """Return one page of customers; use cursor 'start' for the first page"""
+    return await _read_page("customers://all", cursor, limit)
+
+@mcp.resource("orders://all/{cursor}/{limit}")
+async def list_orders_page(cursor: str, limit: str) -> str:
+    """Return one page of orders; use cursor 'start' for the first page"""
+    return await _read_page("orders://all", cursor, limit)
+
+# Lookups by user attribute or order id can land on any shard: ask all of
+# them in JSON and keep the first hit, so a miss reports shard 0's error
+async def _find_users(key: str, values: List[str]) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+    answers = [loads(text) for text in await router.scatter("get_users", {
+        "key": key, "values": values, "output_format": "json"})]
+    if isinstance(answers[0], dict):
+        # An invalid key fails the whole batch on every shard alike
+        return answers[0]
+    return [next((record for record in found if "error" not in record), found[0])
+            for found in zip(*answers)]
+
+async def _find_orders(order_ids: List[Union[int,str]]) -> List[Optional[Dict[str, Any]]]:
+    async def fetch(shard: int) -> List[Optional[Dict[str, Any]]]:
+        return records(loads(await router.call(shard, "get_orders_by_ids", {
+            "order_ids": order_ids, "output_format": "json"})))
+
+    return await router.lookup(fetch, bool)
+
+async def _cancel(order_ids: List[Union[int,str]]) -> List[str]:
+    async def fetch(shard: int) -> List[str]:
+        answer = loads(await router.call(shard, "cancel_orders", {"order_ids": order_ids, "output_format": "json"}))
+        return [record["outcome"] for record in answer]
+
+    # A shard that does not hold an order answers NOT_FOUND without writing
+    return await router.lookup(fetch, lambda outcome: outcome != NOT_FOUND)
+
+def _user_text(record: Dict[str, Any]) -> str:
+    return format_user(record.get("error", record))
+
+# Define tools
+@mcp.tool()
+async def get_user(key: str, value: str, output_format: Optional[str] = None) -> str:
+    """
+    Look up a user by email, phone, or username.
+    
+    Args:
+        key: The attribute to search by (email, phone, or username)
+        value: The value to search for
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    found = await _find_users(key, [value])
+    record = found if isinstance(found, dict) else found[0]
+    return dumps(record) if fmt == "json" else _user_text(record)
+
+@mcp.tool()
+async def get_order_by_id(order_id: Union[int,str], output_format: Optional[str] = None) -> str:
+    """
+    Retrieve details of a specific order.
+    
+    Args:
+        order_id: The unique identifier for the order
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    (order,) = await _find_orders([str(order_id)])
+    return dumps(order) if fmt == "json" else format_order(order)
+
+@mcp.tool()
+async def get_customer_orders(customer_id: Union[int,str], output_format: Optional[str] = None) -> str:
+    """
+    List all orders for a specific customer.
+    
+    Args:
+        customer_id: The customer's unique identifier
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    customer_id, fmt = str(customer_id), resolve_format(output_format)
+    return await router.call(router.owner(customer_id), "get_customer_orders", {
+        "customer_id": customer_id, "output_format": fmt})
+
+@mcp.tool()
+async def cancel_order(order_id: Union[int,str]) -> str:
+    """
+    Cancel a processing order.
+    
+    Args:
+        order_id: The unique identifier for the order to cancel
+    """
+    (outcome,) = await _cancel([order_id])
+    return outcome
+
+@mcp.tool()
+async def search_customers(query: str, limit: int = 5, output_format: Optional[str] = None) -> str:
+    """
+    Search customers by name, email or username, tolerating partial values and typos.
+    Returns the best matches first.
+    
+    Args:
+        query: Whole or partial name, email or username; several words narrow the match
+        limit: Maximum number of matches to return (default 5)
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    limit, fmt = max(1, min(int(limit), MAX_SEARCH_RESULTS)), resolve_format(output_format)
+    answers = await router.scatter("search_customers", {"query": query, "limit": limit, "output_format": "json"})
+    # Each shard returns its own best `limit`; the global best are among them
+    matches = heapq.nlargest(limit, (match for text in answers for match in loads(text)),
+                             key=lambda match: match["score"])
+    if fmt == "json":
+        return dumps(matches)
+    return format_search(query, [(match, match["score"]) for match in matches])
+
+@mcp.tool()
+async def get_customer_totals(customer_id: Union[int,str], output_format: Optional[str] = None) -> str:
+    """
+    Summarise a customer's orders: how many, how many cancelled, units bought and total spent.
+    Cancelled orders are excluded from units and spend.
+    
+    Args:
+        customer_id: The customer's unique identifier
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    customer_id, fmt = str(customer_id), resolve_format(output_format)
+    return await router.call(router.owner(customer_id), "get_customer_totals", {
+        "customer_id": customer_id, "output_format": fmt})
+
+@mcp.tool()
+async def get_order_status_counts(output_format: Optional[str] = None) -> str:
+    """
+    Count the orders in each status (Processing, Shipped, Delivered, Cancelled).
+    
+    Args:
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    counts: Dict[str, int] = {}
+    for text in await router.scatter("get_order_status_counts", {"output_format": "json"}):
+        for status, count in loads(text).items():
+            counts[status] = counts.get(status, 0) + count
+    return dumps(counts) if fmt == "json" else format_status_counts(counts)
+
+@mcp.tool()
+async def get_top_products(limit: int = 5, by: str = "revenue", output_format: Optional[str] = None) -> str:
+    """
+    List the best-selling products, excluding cancelled orders from units and revenue.
+    
+    Args:
+        limit: Number of products to return (default 5)
+        by: Ranking: revenue (default), units or orders
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    try:
+        column = ranking_column(by)
+    except ValueError as e:
+        return str(e)
+    # A product sells on several shards, so the merged top N need not be each
+    # shard's top N: widen the per-shard lists until the merge is provably exact
+    limit = max(1, int(limit))
+    want = limit
+    while True:
+        answers = await router.scatter("get_top_products", {"limit": want, "by": by, "output_format": "json"})
+        best, exact = _merge_top_products([loads(text) for text in answers], limit, want, column)
+        if exact:
+            break
+        want *= 2
+    products = [{"product": product, "orders": orders, "units": units, "revenue": cents / 100}
+                for product, (orders, units, cents) in best]
+    return dumps(products) if fmt == "json" else format_top_products(products)
+
+def _merge_top_products(answers: List[List[Dict[str, Any]]], limit: int, want: int,
+                        column: int) -> Tuple[List[Tuple[str, List[int]]], bool]:
+    """The top `limit` of every shard's top `want` products summed (in cents), and whether it is exact
+
+    A shard that filled its `want` may hold more products, none ranking above
+    its last one, so that value bounds what any product it left out adds.
+    """
+    totals: Dict[str, List[int]] = {}
+    listed: Dict[str, List[int]] = {}
+    floors = []
+    for shard, rows in enumerate(answers):
+        for p in rows:
+            total = totals.setdefault(p["product"], [0, 0, 0])
+            total[0] += p["orders"]
+            total[1] += p["units"]
+            total[2] += round(p["revenue"] * 100)
+            listed.setdefault(p["product"], []).append(shard)
+        last = rows[-1] if len(rows) == want else None
+        floors.append((last["orders"], last["units"], round(last["revenue"] * 100))[column] if last else 0)
+    best = heapq.nlargest(limit, totals.items(), key=lambda item: item[1][column])
+    if not any(floors):
+        # Every shard sent all it has
+        return best, True
+
+    def unlisted(product: str) -> int:
+        return sum(floor for shard, floor in enumerate(floors) if shard not in listed.get(product, ()))
+
+    if len(best) < limit or any(unlisted(product) for product, _ in best):
+        return best, False
+    chosen = {product for product, _ in best}
+    # Strictly above anything else could reach, so ties are settled by the full lists
+    bound = max([totals[product][column] + unlisted(product) for product in totals if product not in chosen]
+                + [sum(floors)])
+    return best, best[-1][1][column] > bound
+
+# Batch variants send each shard its part of the batch in one call
+@mcp.tool()
+async def get_users(key: str, values: List[str], output_format: Optional[str] = None) -> str:
+    """
+    Look up several users by email, phone, or username in one call.
+    
+    Args:
+        key: The attribute to search by (email, phone, or username)
+        values: The values to search for
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    found = await _find_users(key, values)
+    if isinstance(found, dict):
+        return dumps(found) if fmt == "json" else found["error"]
+    if fmt == "json":
+        return dumps(found)
+    return "\n\n".join(_user_text(record) for record in found)
+
+@mcp.tool()
+async def get_orders_by_ids(order_ids: List[Union[int,str]], output_format: Optional[str] = None) -> str:
+    """
+    Retrieve details of several orders in one call.
+    
+    Args:
+        order_ids: The unique identifiers of the orders
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    orders = await _find_orders(order_ids)
+    if fmt == "json":
+        return dumps(table(orders, ORDER_FIELDS))
+    return format_orders(order_ids, orders)
+
+@mcp.tool()
+async def cancel_orders(order_ids: List[Union[int,str]], output_format: Optional[str] = None) -> str:
+    """
+    Cancel several processing orders, reporting the outcome for each.
+    
+    Args:
+        order_ids: The unique identifiers of the orders to cancel
+        output_format: "text" (default) for a readable summary, "json" for compact records
+    """
+    fmt = resolve_format(output_format)
+    outcomes = await _cancel(order_ids)
+    if fmt == "json":
+        return dumps(cancellation_records(order_ids, outcomes))
+    return format_cancellations(order_ids, outcomes)
+
+# Add some helpful prompts
+@mcp.prompt()
+def search_customer(search_type: str, value: str) -> str:
+    """Create a prompt for searching customers"""
+    return f"Please find the customer with {search_type} matching '{value}'"
+
+@mcp.prompt()
+def track_order(order_id: Union[int,str]) -> str:
+    """Create a prompt for tracking an order"""
+    return f"What's the status of order {order_id}?"
+
+async def main() -> None:
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        # Shut the shard sessions down in order; left to loop teardown they hang the exit
+        await router.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,18 @@
+"""server_sse.py's echo server plus a tool that waits before answering, for
+bench_admission.py --handler-delay; a benchmark fixture, not for deployment.
+
+    python sse_cluster.py slow_echo_server:mcp --workers 1
+"""
+import asyncio
+
+from server_sse import mcp
+
+# Longest wait a caller may ask for, so the fixture cannot be told to hold a handler indefinitely
+MAX_DELAY = 10.0
+
+
+@mcp.tool()
+async def slow_echo_tool(message: str, seconds: float) -> str:
+    """Echo a message as a tool after waiting up to 10 seconds, like a handler blocked on I/O"""
+    await asyncio.sleep(min(max(seconds, 0.0), MAX_DELAY))
+    return f"Tool echo: {message}"
@@ -0,0 +1,438 @@
+import fcntl
+import glob
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional, List, Dict, Any, Union, Iterable, Iterator, Tuple
+
+from columnar_db import CUSTOMER_FIELDS, STATUSES, _STATUS_CODES
+from customer_db import SEED_CUSTOMERS, SEED_ORDERS, USER_KEYS, StorageBackend, StripedLock
+from order_aggregates import OrderAggregates
+
+SNAPSHOT_MAGIC = b"CDBSNAP1"
+# magic, wal generation, customers, orders, sections
+_HEADER = struct.Struct("<8sQIII")
+# The wal generation field alone, rewritten in place when changes are folded in
+_GENERATION = struct.Struct("<Q")
+# name, offset, length
+_SECTION = struct.Struct("<24sQQ")
+# order row, status code, crc32 of the first five bytes
+_WAL_RECORD = struct.Struct("<IBI")
+_ORDER_STRINGS = ("id", "customer_id", "product")
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class StringColumn:
+    """Strings stored as one UTF-8 blob plus an offsets array, decoded on access"""
+
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __getitem__(self, i: int) -> str:
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+def _encode_strings(values: List[str]) -> Tuple[bytes, bytes]:
+    encoded = [value.encode() for value in values]
+    offsets = array("I", [0])
+    total = 0
+    for item in encoded:
+        total += len(item)
+        offsets.append(total)
+    if total >= 2**32:
+        raise ValueError("String column too large for a snapshot")
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _sorted_rows(column: List[str]) -> bytes:
+    # Stable sort: equal keys keep row order, so the first match is the lowest row
+    return array("I", sorted(range(len(column)), key=column.__getitem__)).tobytes()
+
+
+def _write_sections(path: str, generation: int, n_customers: int, n_orders: int,
+                    sections: List[Tuple[str, bytes]]) -> None:
+    """Write a snapshot to path.tmp, fsync it and atomically rename it into place"""
+    offset = _align(_HEADER.size + _SECTION.size * len(sections))
+    directory = []
+    for name, data in sections:
+        directory.append(_SECTION.pack(name.encode(), offset, len(data)))
+        offset = _align(offset + len(data))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, generation, n_customers, n_orders, len(sections)))
+        f.write(b"".join(directory))
+        for (name, data), entry in zip(sections, directory):
+            f.seek(_SECTION.unpack(entry)[1])
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def build_snapshot(path: str, customers: Iterable[Dict[str, Any]], orders: Iterable[Dict[str, Any]],
+                   generation: int = 1) -> None:
+    """Write customers and orders as a snapshot, with sorted-row indexes for every lookup key"""
+    customers, orders = list(customers), list(orders)
+    sections = []
+    for field in CUSTOMER_FIELDS:
+        column = [c[field] for c in customers]
+        sections += zip((f"c.{field}.off", f"c.{field}.blob"), _encode_strings(column))
+        if field in USER_KEYS:
+            sections.append((f"ix.c.{field}", _sorted_rows(column)))
+    for field in _ORDER_STRINGS:
+        column = [o[field] for o in orders]
+        sections += zip((f"o.{field}.off", f"o.{field}.blob"), _encode_strings(column))
+        if field in ("id", "customer_id"):
+            sections.append((f"ix.o.{field}", _sorted_rows(column)))
+    sections.append(("o.quantity", array("i", (o["quantity"] for o in orders)).tobytes()))
+    sections.append(("o.price", array("d", (o["price"] for o in orders)).tobytes()))
+    sections.append(("o.status", bytes(_STATUS_CODES[o["status"]] for o in orders)))
+    _write_sections(path, generation, len(customers), len(orders), sections)
+
+
+class Snapshot:
+    """A snapshot file mapped into memory; nothing is decoded or indexed up front"""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("Snapshots are stored little-endian")
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, self.generation, self.n_customers, self.n_orders, count = _HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a CustomerDB snapshot")
+        self.raw: Dict[str, memoryview] = {}
+        self.offsets: Dict[str, int] = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+            name = name.rstrip(b"\0").decode()
+            self.raw[name] = view[offset:offset + length]
+            self.offsets[name] = offset
+        self.customers = {field: self._strings(f"c.{field}") for field in CUSTOMER_FIELDS}
+        self.orders = {field: self._strings(f"o.{field}") for field in _ORDER_STRINGS}
+        self.customer_index = {key: self.raw[f"ix.c.{key}"].cast("I") for key in USER_KEYS}
+        self.order_index = {key: self.raw[f"ix.o.{key}"].cast("I") for key in ("id", "customer_id")}
+        self.quantities = self.raw["o.quantity"].cast("i")
+        self.prices = self.raw["o.price"].cast("d")
+        self.statuses = self.raw["o.status"]
+
+    def _strings(self, prefix: str) -> StringColumn:
+        return StringColumn(self.raw[f"{prefix}.off"].cast("I"), self.raw[f"{prefix}.blob"])
+
+    def first_row(self, index: memoryview, column: StringColumn, value: str) -> Optional[int]:
+        i = bisect_left(index, value, key=column.__getitem__)
+        if i < len(index) and column[index[i]] == value:
+            return index[i]
+        return None
+
+    def rows(self, index: memoryview, column: StringColumn, value: str) -> memoryview:
+        return index[bisect_left(index, value, key=column.__getitem__):
+                     bisect_right(index, value, key=column.__getitem__)]
+
+    def patch_statuses(self, path: str, generation: int, changes: Dict[int, int]) -> None:
+        """Write changed statuses into the file in place, then advance its wal generation
+
+        Costs one byte per change however large the file is. The statuses are
+        on disk before the header names the new generation, so a crash in
+        between leaves the old generation, whose log sets the same statuses
+        again on replay. The mapping is shared, so readers see the new bytes.
+        """
+        start = self.offsets["o.status"]
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            for i in sorted(changes):
+                os.pwrite(fd, bytes((changes[i],)), start + i)
+            os.fsync(fd)
+            os.pwrite(fd, _GENERATION.pack(generation), len(SNAPSHOT_MAGIC))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.generation = generation
+
+
+def _wal_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"wal.{generation:08d}.log")
+
+
+def wal_generations(directory: str) -> List[int]:
+    paths = glob.glob(os.path.join(directory, "wal.*.log"))
+    return sorted(int(os.path.basename(path).split(".")[1]) for path in paths)
+
+
+def replay_wal(directory: str, since: int) -> Iterator[Tuple[int, int]]:
+    """Yield (order row, status code) from generation `since` on, cutting off any torn tail"""
+    for generation in wal_generations(directory):
+        if generation < since:
+            continue
+        with open(_wal_path(directory, generation), "r+b") as f:
+            data = f.read()
+            end = 0
+            while end + _WAL_RECORD.size <= len(data):
+                row, status, crc = _WAL_RECORD.unpack_from(data, end)
+                if zlib.crc32(data[end:end + 5]) != crc:
+                    break
+                yield row, status
+                end += _WAL_RECORD.size
+            if end != len(data):
+                f.truncate(end)
+
+
+class WriteAheadLog:
+    """Append-only log of order status changes, split into numbered generations
+
+    A snapshot records the first generation it does not contain; recovery
+    loads the snapshot and replays only that generation and later ones.
+    """
+
+    def __init__(self, directory: str, generation: int, sync: bool = True):
+        self.directory = directory
+        self.sync = sync
+        self.generation = generation
+        self.records = 0
+        self._file = open(_wal_path(directory, generation), "ab")
+        # Records appended and records known durable, counted across generations
+        self._appended = 0
+        self._synced = 0
+        self._sync_lock = threading.Lock()
+
+    def append(self, row: int, status: int) -> int:
+        """Hand a record to the OS and return its sequence number for sync_to"""
+        head = struct.pack("<IB", row, status)
+        self._file.write(head + struct.pack("<I", zlib.crc32(head)))
+        self._file.flush()
+        self.records += 1
+        self._appended += 1
+        return self._appended
+
+    def sync_to(self, seq: int) -> None:
+        """Wait until record `seq` is on disk; one fsync covers every record appended before it"""
+        if not self.sync or self._synced >= seq:
+            return
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            appended = self._appended
+            os.fsync(self._file.fileno())
+            self._synced = appended
+
+    def rotate(self) -> int:
+        """Start the next generation and return its number"""
+        with self._sync_lock:
+            if self.sync:
+                os.fsync(self._file.fileno())
+            self._synced = self._appended
+            self._file.close()
+            self.generation += 1
+            self.records = 0
+            self._file = open(_wal_path(self.directory, self.generation), "ab")
+        return self.generation
+
+    def discard_before(self, generation: int) -> None:
+        for old in wal_generations(self.directory):
+            if old < generation:
+                os.remove(_wal_path(self.directory, old))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SnapshotDatabase(StorageBackend):
+    """Durable backend: a memory-mapped snapshot plus a write-ahead log of status changes
+
+    Startup maps the snapshot and replays the log written since it, so it
+    costs about the same for ten rows or ten million. Reads are served from
+    the mapped file through sorted-row indexes; status changes are logged,
+    then kept in an overlay until the next snapshot folds them in. Every
+    `snapshot_every` changes a background thread writes them into the
+    snapshot file in place, so a snapshot costs the changes it folds in,
+    not the size of the tables.
+
+    One process owns the directory at a time: it is locked with flock on
+    open, and a second open fails instead of sharing (and pruning) the log.
+    """
+
+    USER_KEYS = USER_KEYS
+    # Log appends fsync, which should not stall the event loop
+    blocking = True
+
+    def __init__(self, directory: str, customers: Optional[Iterable[Dict[str, Any]]] = None,
+                 orders: Optional[Iterable[Dict[str, Any]]] = None, snapshot_every: int = 10_000,
+                 sync: bool = True):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "LOCK"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"{directory} is already open in another process or backend")
+        self.directory = directory
+        self.path = os.path.join(directory, "snapshot.bin")
+        self.snapshot_every = snapshot_every
+        if not os.path.exists(self.path):
+            build_snapshot(self.path, SEED_CUSTOMERS if customers is None else customers,
+                           SEED_ORDERS if orders is None else orders)
+        self._base = Snapshot(self.path)
+        self._order_locks = StripedLock()
+        # Guards the log and the overlays; held only for an append or a swap
+        self._state_lock = threading.Lock()
+        self._overlay: Dict[int, int] = {}
+        self._frozen: Dict[int, int] = {}
+        self._snapshot_lock = threading.Lock()
+        self._snapshotting: Optional[threading.Thread] = None
+        # Aggregates are summed from the mapped columns on first use, so they cost nothing at startup
+        self._aggregates_ready = False
+        # Recovery: only the log written since the snapshot is replayed
+        self.recovered = 0
+        for row, status in replay_wal(directory, self._base.generation):
+            self._overlay[row] = status
+            self.recovered += 1
+        generation = max(wal_generations(directory) + [self._base.generation])
+        self._wal = WriteAheadLog(directory, generation, sync)
+
+    def _status(self, i: int) -> int:
+        # Newest first: live changes, then changes being snapshotted, then the file
+        status = self._overlay.get(i)
+        if status is None:
+            status = self._frozen.get(i)
+            if status is None:
+                status = self._base.statuses[i]
+        return status
+
+    def _customer(self, i: int) -> Dict[str, str]:
+        return {field: column[i] for field, column in self._base.customers.items()}
+
+    def _order(self, i: int) -> Dict[str, Any]:
+        base = self._base
+        return {"id": base.orders["id"][i], "customer_id": base.orders["customer_id"][i],
+                "product": base.orders["product"][i], "quantity": base.quantities[i],
+                "price": base.prices[i], "status": STATUSES[self._status(i)]}
+
+    def _order_row(self, order_id: Union[str,int]) -> Optional[int]:
+        base = self._base
+        return base.first_row(base.order_index["id"], base.orders["id"], str(order_id))
+
+    def get_user(self, key: str, value: str) -> Union[Dict[str, str], str]:
+        if key in self.USER_KEYS:
+            base = self._base
+            i = base.first_row(base.customer_index[key], base.customers[key], value)
+            if i is not None:
+                return self._customer(i)
+            return f"Couldn't find a user with {key} of {value}"
+        else:
+            raise ValueError(f"Invalid key: {key}")
+
+    def get_order_by_id(self, order_id: Union[str,int]) -> Optional[Dict[str, Any]]:
+        i = self._order_row(order_id)
+        return self._order(i) if i is not None else None
+
+    def get_customer_orders(self, customer_id: str) -> List[Dict[str, Any]]:
+        base = self._base
+        return [self._order(i) for i in base.rows(base.order_index["customer_id"], base.orders["customer_id"],
+                                                   customer_id)]
+
+    def order_aggregates(self) -> OrderAggregates:
+        if not self._aggregates_ready:
+            # Holding the state lock keeps writes out while the totals are summed
+            with self._state_lock:
+                if not self._aggregates_ready:
+                    for order in self.iter_orders():
+                        self._aggregates.add(order)
+                    self._aggregates_ready = True
+        return self._aggregates
+
+    def _write(self, i: int, status: int) -> None:
+        with self._state_lock:
+            old = self._status(i)
+            seq = self._wal.append(i, status)
+            self._overlay[i] = status
+            if self._aggregates_ready:
+                self._aggregates.change_status(self._order(i), STATUSES[old], STATUSES[status])
+            if self._wal.records >= self.snapshot_every and self._snapshotting is None:
+                # Started under the lock, so close() never sees a thread it cannot join
+                self._snapshotting = threading.Thread(target=self.snapshot, name="snapshot", daemon=True)
+                self._snapshotting.start()
+        # fsync outside the lock, so writers arriving meanwhile share the next one
+        self._wal.sync_to(seq)
+        self._bump_version()
+
+    def compare_and_set_status(self, order_id: Union[str,int], expected: str, status: str) -> bool:
+        order_id = str(order_id)
+        i = self._order_row(order_id)
+        if i is None:
+            raise KeyError(order_id)
+        with self._order_locks.for_key(order_id):
+            if self._status(i) != _STATUS_CODES[expected]:
+                return False
+            self._write(i, _STATUS_CODES[status])
+        return True
+
+    def set_order_status(self, order_id: Union[str,int], status: str) -> None:
+        order_id = str(order_id)
+        i = self._order_row(order_id)
+        if i is None:
+            raise KeyError(order_id)
+        with self._order_locks.for_key(order_id):
+            self._write(i, _STATUS_CODES[status])
+
+    def iter_customers(self, start: int = 0) -> Iterator[Dict[str, str]]:
+        return (self._customer(i) for i in range(start, self._base.n_customers))
+
+    def iter_orders(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        return (self._order(i) for i in range(start, self._base.n_orders))
+
+    def snapshot(self) -> None:
+        """Fold the logged changes into a new snapshot and drop the log generations it covers"""
+        with self._snapshot_lock:
+            self._snapshot()
+
+    def _snapshot(self) -> None:
+        with self._state_lock:
+            self._frozen, self._overlay = self._overlay, {}
+            generation = self._wal.rotate()
+            base, frozen = self._base, self._frozen
+        written = False
+        try:
+            # The file holds the changes before the overlay they come from is cleared, so readers never miss one
+            base.patch_statuses(self.path, generation, frozen)
+            written = True
+        finally:
+            with self._state_lock:
+                if not written:
+                    # Still logged in the generations before `generation`; keep serving them
+                    self._overlay = {**frozen, **self._overlay}
+                self._frozen = {}
+                # A snapshot() called directly leaves a pending background one in place
+                if self._snapshotting is threading.current_thread():
+                    self._snapshotting = None
+        self._wal.discard_before(generation)
+
+    def close(self) -> None:
+        with self._state_lock:
+            thread = self._snapshotting
+        if thread is not None:
+            thread.join()
+        if self._overlay:
+            self.snapshot()
+        self._wal.close()
+        self._lock_file.close()
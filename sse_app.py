@@ -0,0 +1,74 @@
+from typing import Optional
+
+from mcp.server.fastmcp import FastMCP
+from mcp.server.sse import SseServerTransport
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+from starlette.types import Receive, Scope, Send
+
+from admission import AdmissionControl
+from instrumentation import Metrics, Profiler
+
+
+async def _streamed(scope: Scope, receive: Receive, send: Send) -> None:
+    """Response for an endpoint that has already streamed its own"""
+
+
+def create_sse_app(mcp: FastMCP, debug: bool = False, metrics: Optional[Metrics] = None,
+                   profiler: Optional[Profiler] = None, admission: Optional[AdmissionControl] = None,
+                   endpoint: str = "/messages/") -> Starlette:
+    """Build the Starlette app FastMCP serves for transport='sse'
+
+    FastMCP only exposes it through run(), which also owns the uvicorn
+    server; building it here lets us run it under our own workers and
+    middleware. With `metrics`, GET /metrics serves them in Prometheus text
+    format; with `profiler`, GET /debug/profile returns a hot-path report and
+    POST /debug/profile?mode=cprofile|tracemalloc|off switches it.
+
+    Sessions and in-flight requests are capped by `admission` (default:
+    AdmissionControl.from_env()), so overload is shed instead of queued.
+    Messages are always served at /messages/; `endpoint` is the path clients
+    are told to POST to, for apps mounted behind a prefix.
+    """
+    sse = SseServerTransport(endpoint)
+    admission = admission or AdmissionControl.from_env()
+
+    async def handle_sse(request: Request):
+        rejection = admission.reject_session()
+        if rejection is not None:
+            return rejection
+        async with admission.session(sse, request.scope, request.receive, request._send) as streams:
+            await mcp._mcp_server.run(
+                streams[0], streams[1], mcp._mcp_server.create_initialization_options()
+            )
+        return _streamed
+
+    async def handle_post_message(scope, receive, send):
+        await admission.handle_post_message(sse, scope, receive, send)
+
+    routes = [
+        Route("/sse", endpoint=handle_sse),
+        Mount("/messages/", app=handle_post_message),
+    ]
+    if metrics is not None:
+        metrics.collectors["admission"] = admission.stats
+
+        async def handle_metrics(request: Request):
+            return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+        routes.append(Route("/metrics", endpoint=handle_metrics))
+    if profiler is not None:
+        async def handle_profile(request: Request):
+            if request.method == "POST":
+                mode = request.query_params.get("mode", "off")
+                try:
+                    profiler.stop() if mode == "off" else profiler.start(mode)
+                except ValueError as e:
+                    return PlainTextResponse(str(e), status_code=400)
+                return PlainTextResponse(f"profiler: {profiler.mode or 'off'}\n")
+            return PlainTextResponse(profiler.report())
+
+        routes.append(Route("/debug/profile", endpoint=handle_profile, methods=["GET", "POST"]))
+    return Starlette(debug=debug, routes=routes)
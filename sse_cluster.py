@@ -0,0 +1,221 @@
+"""Run a FastMCP server's SSE app across several worker processes on one port.
+
+    python sse_cluster.py server_sse:mcp --workers 4 --port 8000
+    python sse_cluster.py multi_tools_server:mcp --workers 4 --port 8000
+
+Each worker is a separate process with its own event loop. All of them
+accept connections on one listening socket opened by the parent, so the
+kernel balances clients across workers and no single process relays their
+traffic. A session's `endpoint` event points at /workers/<n>/messages/, so
+every POSTed message names the worker that owns its stream; a worker that
+accepts another's message forwards it over that worker's private port
+(127.0.0.1, port+1+n). No session table is shared between processes.
+
+Workers do not share memory, so with more than one worker the CustomerDB
+server (multi_tools_server) is pointed at one SQLite file
+(CUSTOMERDB_BACKEND=sqlite, CUSTOMERDB_SQLITE_SHARED=1; --sqlite-path,
+default customerdb.sqlite3); WAL mode lets them read concurrently and the
+shared version counter keeps their render caches consistent. Backends that
+keep their data in the process are refused. Apps without data, like
+server_sse, get no database. /debug routes are only served on the private
+ports.
+"""
+import argparse
+import importlib
+import logging
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+import uvicorn
+from loguru import logger
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Headers that describe a single hop and must not be forwarded
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade",
+              "proxy-authorization", "proxy-authenticate", "host", "content-length"}
+
+# Per-worker routes reachable from the public port
+WORKER_ROUTE = re.compile(r"/workers/(\d+)(/messages/|/metrics)")
+
+
+def load_target(target: str):
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attr or "mcp")
+
+
+class WorkerRouter:
+    """Routes a cluster worker's requests to itself or to the worker that owns them
+
+    /workers/<n>/messages/ and /workers/<n>/metrics are served locally when
+    n is this worker and forwarded to worker n's private port otherwise.
+    Everything else is this worker's own app, except /debug, which is only
+    answered on the private port.
+    """
+
+    def __init__(self, app: ASGIApp, index: int, ports: List[int]):
+        self.app = app
+        self.index = index
+        self.ports = ports
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            private = (scope.get("server") or (None, None))[1] == self.ports[self.index]
+            path = scope["path"]
+            match = WORKER_ROUTE.fullmatch(path)
+            if match and int(match[1]) == self.index:
+                scope = dict(scope, path=match[2], raw_path=match[2].encode())
+            elif match and int(match[1]) < len(self.ports):
+                return await self.forward(int(match[1]), match[2], scope, receive, send)
+            elif path.startswith("/workers/") or (path.startswith("/debug/") and not private):
+                return await Response("Not Found", status_code=404)(scope, receive, send)
+        await self.app(scope, receive, send)
+
+    async def forward(self, worker: int, path: str, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+        request = Request(scope, receive)
+        try:
+            upstream = await self.client.request(
+                request.method,
+                f"http://127.0.0.1:{self.ports[worker]}{path}",
+                params=request.query_params,
+                content=await request.body(),
+                headers={k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP},
+            )
+        except httpx.TransportError:
+            # Its sessions died with it; clients reconnect and land on a live worker
+            response = Response("Worker unavailable", status_code=503)
+        else:
+            response = Response(upstream.content, status_code=upstream.status_code,
+                                headers={k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP})
+        await response(scope, receive, send)
+
+
+def run_worker(target: str, port: int, listen_fd: Optional[int] = None, index: int = 0, workers: int = 1) -> None:
+    """Serve one worker on 127.0.0.1:`port`, plus the cluster's shared socket when given one"""
+    from sse_app import create_sse_app
+    module, mcp = load_target(target)
+    observability = dict(metrics=getattr(module, "metrics", None), profiler=getattr(module, "profiler", None))
+    if listen_fd is None:
+        uvicorn.run(create_sse_app(mcp, **observability), host="127.0.0.1", port=port, log_level="warning")
+        return
+    app = create_sse_app(mcp, endpoint=f"/workers/{index}/messages/", **observability)
+    # One INFO line per forwarded message would cost as much as forwarding it
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    ports = [port - index + n for n in range(workers)]
+    sockets = [socket.socket(fileno=listen_fd), socket.create_server(("127.0.0.1", port))]
+    uvicorn.Server(uvicorn.Config(WorkerRouter(app, index, ports), log_level="warning")).run(sockets=sockets)
+
+
+class Worker:
+    def __init__(self, index: int, target: str, port: int, env: dict, listener: socket.socket, count: int):
+        self.index = index
+        self.target = target
+        self.port = port
+        self.env = env
+        self.listener = listener
+        self.count = count
+        self.process = None
+
+    def start(self) -> None:
+        fd = self.listener.fileno()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", self.target, "--port", str(self.port),
+             "--listen-fd", str(fd), "--index", str(self.index), "--workers", str(self.count)],
+            env=self.env,
+            pass_fds=(fd,),
+        )
+        logger.info(f"worker {self.index} started on port {self.port} (pid {self.process.pid})")
+
+
+def supervise(workers: List[Worker], interval: float = 1.0) -> None:
+    """Restart workers that exit; sessions on a dead worker are lost and must reconnect"""
+    while True:
+        time.sleep(interval)
+        for worker in workers:
+            if worker.process.poll() is not None:
+                logger.warning(f"worker {worker.index} exited with {worker.process.returncode}, restarting")
+                worker.start()
+
+
+# Modules whose app serves CustomerDB through create_database(), and so needs
+# one shared copy of the data across workers; other apps keep no data
+CUSTOMERDB_MODULES = {"multi_tools_server"}
+
+
+def prepare_shared_sqlite(env: dict, path: str) -> None:
+    """Point every worker at one SQLite file, creating and seeding it once up front"""
+    from customer_db import SQLiteDatabase
+    path = os.path.abspath(path)
+    SQLiteDatabase(path, shared=True).close()
+    env.update(CUSTOMERDB_BACKEND="sqlite", CUSTOMERDB_SQLITE_PATH=path, CUSTOMERDB_SQLITE_SHARED="1")
+
+
+def serve(args) -> None:
+    env = dict(os.environ)
+    if args.sqlite_path:
+        prepare_shared_sqlite(env, args.sqlite_path)
+    listener = socket.create_server((args.host, args.port), backlog=2048)
+    workers = [Worker(i, args.target, args.port + 1 + i, env, listener, args.workers) for i in range(args.workers)]
+    # Stop the workers on SIGTERM too, not just on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.start()
+        logger.info(f"serving http://{args.host}:{args.port}/sse with {len(workers)} workers")
+        supervise(workers)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        started = [worker.process for worker in workers if worker.process is not None]
+        for process in started:
+            process.terminate()
+        for process in started:
+            # uvicorn's graceful shutdown can wait indefinitely on open SSE streams
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", help="module:attribute of the FastMCP server, e.g. server_sse:mcp")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--sqlite-path", default=None,
+                        help="share this SQLite file between workers (default for multi_tools_server with "
+                             "--workers > 1: customerdb.sqlite3)")
+    parser.add_argument("--worker", action="store_true",
+                        help="serve a single worker on 127.0.0.1:--port")
+    parser.add_argument("--listen-fd", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.target, args.port, args.listen_fd, args.index, args.workers)
+        return
+    if args.workers > 1 and not args.sqlite_path and args.target.split(":")[0] in CUSTOMERDB_MODULES:
+        backend = os.environ.get("CUSTOMERDB_BACKEND", "sqlite").lower()
+        if backend != "sqlite":
+            parser.error(f"CUSTOMERDB_BACKEND={backend} keeps each worker's data in that worker, so their "
+                         "copies would drift apart; use --workers 1 or share a SQLite file with --sqlite-path")
+        args.sqlite_path = os.environ.get("CUSTOMERDB_SQLITE_PATH", "customerdb.sqlite3")
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Fire thousands of concurrent cancel, ship and lookup calls at each backend and check the final state.
+
+Every order starts as Processing. Worker threads race to cancel it
+(cancel_order) or ship it (compare_and_set_status Processing -> Shipped)
+while other threads read it. Exactly one transition must win per order,
+the winner must match the final status, and readers must only ever see
+a valid status. The running aggregates must end up equal to a full scan.
+
+Usage: python stress_cancel_order.py [num_orders] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from rich import print
+
+from customer_db import CANCELLED, NOT_CANCELLABLE, FakeDatabase, SQLiteDatabase
+from columnar_db import ColumnarDatabase
+from snapshot_db import SnapshotDatabase
+
+VALID_STATUSES = {"Processing", "Cancelled", "Shipped"}
+
+
+def make_orders(n: int):
+    return [{"id": str(i), "customer_id": str(i % 100), "product": "Widget",
+             "quantity": 1, "price": 9.99, "status": "Processing"} for i in range(n)]
+
+
+def make_sqlite(customers, orders):
+    path = os.path.join(tempfile.mkdtemp(), "stress.sqlite3")
+    db = SQLiteDatabase(path, pool_size=8, seed=False)
+    db.load(customers, orders)
+    return db
+
+
+def make_snapshot(customers, orders):
+    # Snapshot often so background snapshots race the writers too
+    return SnapshotDatabase(tempfile.mkdtemp(), customers, orders, snapshot_every=500, sync=False)
+
+
+def run(name: str, db, n: int, threads: int) -> bool:
+    ops = []
+    for i in range(n):
+        order_id = str(i)
+        ops += [("cancel", order_id)] * 3 + [("ship", order_id)] * 2 + [("read", order_id)] * 5
+    random.shuffle(ops)
+
+    def apply(op):
+        kind, order_id = op
+        if kind == "cancel":
+            return kind, order_id, db.cancel_order(order_id)
+        if kind == "ship":
+            return kind, order_id, db.compare_and_set_status(order_id, "Processing", "Shipped")
+        return kind, order_id, db.get_order_by_id(order_id)["status"]
+
+    db.status_counts()  # build lazily built aggregates up front, so the writers maintain them
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(apply, ops, chunksize=64))
+    elapsed = time.perf_counter() - start
+
+    winners = {}
+    errors = []
+    for kind, order_id, outcome in results:
+        if kind == "read":
+            if outcome not in VALID_STATUSES:
+                errors.append(f"order {order_id}: read invalid status {outcome!r}")
+        elif (kind == "cancel" and outcome == CANCELLED) or (kind == "ship" and outcome is True):
+            if order_id in winners:
+                errors.append(f"order {order_id}: both {winners[order_id]} and {kind} succeeded")
+            winners[order_id] = kind
+        elif kind == "cancel" and outcome != NOT_CANCELLABLE:
+            errors.append(f"order {order_id}: unexpected cancel outcome {outcome!r}")
+    for i in range(n):
+        order_id = str(i)
+        status = db.get_order_by_id(order_id)["status"]
+        expected = {"cancel": "Cancelled", "ship": "Shipped"}.get(winners.get(order_id))
+        if status != expected:
+            errors.append(f"order {order_id}: final status {status!r}, expected {expected!r}")
+
+    orders = list(db.iter_orders())
+    scanned = dict(Counter(order["status"] for order in orders))
+    if db.status_counts() != scanned:
+        errors.append(f"status counts {db.status_counts()} != scanned {scanned}")
+    for customer_id in {order["customer_id"] for order in orders}:
+        placed = [order for order in orders if order["customer_id"] == customer_id]
+        live = [order for order in placed if order["status"] != "Cancelled"]
+        expected = {"customer_id": customer_id, "orders": len(placed), "cancelled": len(placed) - len(live),
+                    "units": sum(order["quantity"] for order in live),
+                    "spent": round(sum(order["price"] * order["quantity"] for order in live), 2)}
+        if db.customer_totals(customer_id) != expected:
+            errors.append(f"customer {customer_id}: totals {db.customer_totals(customer_id)} != scanned {expected}")
+
+    print(f"{name:>9}: {len(ops)} ops on {threads} threads in {elapsed:.2f}s, "
+          f"{len(errors)} errors")
+    for error in errors[:10]:
+        print(f"  {error}")
+    db.close()
+    return not errors
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    # Switch threads far more often than the default to widen any race window
+    sys.setswitchinterval(1e-6)
+    ok = True
+    for name, factory in [("memory", FakeDatabase), ("columnar", ColumnarDatabase), ("sqlite", make_sqlite),
+                          ("snapshot", make_snapshot)]:
+        ok &= run(name, factory([], make_orders(n)), n, threads)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Exercise the streaming MCP client against the CustomerDB server and a local fake LLM.
+
+    python test_mcp_client.py [--token-delay 0.01]
+
+Starts fake_llm_server.py, points the Anthropic SDK at it and runs a few
+queries through MCPClient.process_query, checking that each tool call was
+started before its streamed response had finished.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+from rich import print
+
+from bench_load import free_port, stop_process, wait_for_port
+
+QUERIES = [
+    "What is the status of order 24601?",
+    "Look up orders 24601, 97531 and 86420 and the customer john@gmail.com",
+    "Please cancel order 13579",
+    "Hello there",
+]
+
+
+def load_client_module():
+    # "client 2.py" is not importable by name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client 2.py")
+    spec = importlib.util.spec_from_file_location("mcp_client", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run(args):
+    port = free_port()
+    llm = subprocess.Popen([sys.executable, "fake_llm_server.py", "--port", str(port),
+                            "--token-delay", str(args.token_delay)])
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("ANTHROPIC_API_KEY", "fake")
+    client = None
+    try:
+        await wait_for_port(port)
+        module = load_client_module()
+        client = module.MCPClient()
+        await client.connect_to_server("multi_tools_server.py")
+
+        # Record when each tool call is submitted and when each stream ends
+        submitted, finished = [], []
+        submit, stream_message = module.ToolCallScheduler.submit, client.stream_message
+
+        def timed_submit(scheduler, block):
+            submitted.append(time.perf_counter())
+            submit(scheduler, block)
+
+        async def timed_stream_message(**kwargs):
+            response = await stream_message(**kwargs)
+            finished.append(time.perf_counter())
+            return response
+
+        module.ToolCallScheduler.submit = timed_submit
+        client.stream_message = timed_stream_message
+
+        for query in QUERIES:
+            print(f"\n=== {query} ===")
+            submitted.clear()
+            start = time.perf_counter()
+            print(await client.process_query(query))
+            elapsed = time.perf_counter() - start
+            if submitted:
+                lead = finished[-1] - submitted[0]
+                status = "[green]ok[/green]" if lead > 0 else "[red]FAIL[/red]"
+                print(f"{status} {len(submitted)} tool call(s); first started {lead * 1000:.1f} ms "
+                      f"before the response finished streaming ({elapsed * 1000:.1f} ms total)")
+    finally:
+        if client is not None:
+            await client.cleanup()
+        stop_process(llm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake LLM delay per streamed chunk")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,9 @@ logger.configure(handlers=[{"sink": RichHandler(markup=True),
                          "format": "[red]{function}[/red] {message}"}])
 from typing import Optional, List, Dict, Any
 
+NEXT_PAGE_PREFIX = "Next page: "
+PAGINATED_RESOURCES = {"customers://all", "orders://all"}
+
 class CustomerDBClient:
     def __init__(self):
         self.session: Optional[ClientSession] = None
@@ -42,16 +45,29 @@ class CustomerDBClient:
     
 
     
-    async def read_all_resources(self):
-        """Read and display all available resources"""
+    async def read_all_resources(self, page_size: int = 100):
+        """Read and display all available resources, one page at a time"""
         print("\n=== Reading All Resources ===")
         response = await self.session.list_resources()
          
         for resource in response.resources:
             print(f"\nResource: {resource.uri}")
-            response = await self.session.read_resource(resource.uri)
-            # import pdb;pdb.set_trace()
-            print(response.contents[0].text)
+            uri = str(resource.uri)
+            if uri in PAGINATED_RESOURCES:
+                uri = f"{uri}/start/{page_size}"
+            async for page in self.read_resource_pages(uri):
+                print(page)
+
+    async def read_resource_pages(self, uri: str):
+        """Yield the pages of a paginated resource, following its 'Next page:' links"""
+        while uri:
+            response = await self.session.read_resource(uri)
+            text = response.contents[0].text
+            uri = None
+            if text.rsplit("\n", 1)[-1].startswith(NEXT_PAGE_PREFIX):
+                text, next_line = text.rsplit("\n", 1) if "\n" in text else ("", text)
+                uri = next_line[len(NEXT_PAGE_PREFIX):]
+            yield text
     
     async def test_get_user(self, key: str, value: str):
         """Test the get_user tool"""
@@ -92,6 +108,40 @@ class CustomerDBClient:
         )
         print(result.content[0].text)
 
+    async def test_batch_tools(self, emails: List[str], order_ids: List[str]):
+        """Test the get_users, get_orders_by_ids and cancel_orders batch tools"""
+        print(f"\n=== Testing batch tools (emails: {emails}, orders: {order_ids}) ===")
+        result = await self.session.call_tool("get_users", {"key": "email", "values": emails})
+        print(result.content[0].text)
+        result = await self.session.call_tool("get_orders_by_ids", {"order_ids": order_ids})
+        print(result.content[0].text)
+        result = await self.session.call_tool("cancel_orders", {"order_ids": order_ids})
+        print(result.content[0].text)
+
+    async def test_search_customers(self, query: str, limit: int = 3):
+        """Test the search_customers tool"""
+        print(f"\n=== Testing search_customers (query: {query}) ===")
+        result = await self.session.call_tool("search_customers", {"query": query, "limit": limit})
+        print(result.content[0].text)
+
+    async def test_json_output(self, order_id: str, customer_id: str):
+        """Test the compact JSON output mode of the read tools"""
+        print(f"\n=== Testing JSON output (order: {order_id}, customer: {customer_id}) ===")
+        result = await self.session.call_tool("get_order_by_id", {"order_id": order_id, "output_format": "json"})
+        print(result.content[0].text)
+        result = await self.session.call_tool("get_customer_orders", {"customer_id": customer_id, "output_format": "json"})
+        print(result.content[0].text)
+
+    async def test_aggregates(self, customer_id: str):
+        """Test the get_customer_totals, get_order_status_counts and get_top_products tools"""
+        print(f"\n=== Testing aggregate tools (customer: {customer_id}) ===")
+        result = await self.session.call_tool("get_customer_totals", {"customer_id": customer_id})
+        print(result.content[0].text)
+        result = await self.session.call_tool("get_order_status_counts", {"output_format": "json"})
+        print(result.content[0].text)
+        result = await self.session.call_tool("get_top_products", {"limit": 3})
+        print(result.content[0].text)
+
     async def close(self):
         """Clean up resources"""
         await self.exit_stack.aclose()
@@ -126,6 +176,21 @@ async def main():
         await client.test_cancel_order("13579")  # Processing order that can be cancelled
         await client.test_cancel_order("24601")  # Shipped order that can't be cancelled
         await client.test_cancel_order("99999")  # Non-existent order
+
+        # Test batch tools in a single round trip each
+        await client.test_batch_tools(["john@gmail.com", "nonexistent@email.com"], ["19283", "24601", "99999"])
+
+        # Test ranked search with partial and misspelt values
+        await client.test_search_customers("pri")
+        await client.test_search_customers("hiroshi@gmal.com")
+        await client.test_search_customers("jon do")
+        await client.test_search_customers("zzzz")
+
+        # Test structured output
+        await client.test_json_output("24601", "1213210")
+
+        # Test aggregates, which reflect the cancellations above
+        await client.test_aggregates("1213210")
         
     except Exception as e:
         print(f"\nError during testing: {str(e)}")
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse 'tool=limit,tool=limit' into a dict"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+class ToolExecutor:
+    """Runs blocking tool functions off the event loop with per-tool concurrency limits
+
+    With max_workers > 0 calls run on a bounded thread pool, so a slow
+    lookup only occupies a worker instead of stalling every session on the
+    event loop. With max_workers == 0 they run inline, which is cheaper for
+    purely in-memory backends. Per-tool limits apply in both modes; calls
+    over the limit wait on an asyncio semaphore rather than a worker.
+    """
+
+    def __init__(self, max_workers: int = 8, limits: Optional[Dict[str, int]] = None):
+        self.max_workers = max_workers
+        self.limits = dict(limits or {})
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="tool") if max_workers > 0 else None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls, default_workers: int = 8) -> "ToolExecutor":
+        """Configure from CUSTOMERDB_TOOL_WORKERS and CUSTOMERDB_TOOL_LIMITS (e.g. 'cancel_orders=2')"""
+        return cls(
+            max_workers=int(os.environ.get("CUSTOMERDB_TOOL_WORKERS", default_workers)),
+            limits=parse_limits(os.environ.get("CUSTOMERDB_TOOL_LIMITS", "")),
+        )
+
+    def _semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        limit = self.limits.get(name)
+        if limit is None:
+            return None
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+    async def run(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        semaphore = self._semaphore(name)
+        if semaphore is None:
+            return await self._call(fn, args, kwargs)
+        async with semaphore:
+            return await self._call(fn, args, kwargs)
+
+    async def _call(self, fn: Callable[..., Any], args, kwargs) -> Any:
+        if self._pool is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def offload(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Decorator turning a sync tool into an async one that runs through this executor
+
+        functools.wraps keeps the name, docstring and signature FastMCP uses
+        to build the tool schema.
+        """
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(fn.__name__, fn, *args, **kwargs)
+        return wrapper
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,204 @@
+import base64
+import json
+import os
+from collections.abc import Mapping
+from typing import Optional, Any, Dict, List, Iterable, Sequence
+
+# orjson is optional; it encodes several times faster than the stdlib and
+# returns bytes, which are decoded once for the MCP text content
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OUTPUT_FORMATS = ("text", "json")
+# Resource pages are capped so a single read never renders an unbounded string
+MAX_PAGE_SIZE = 1000
+NEXT_PAGE_PREFIX = "Next page: "
+MAX_SEARCH_RESULTS = 50
+CUSTOMER_FIELDS = ("id", "name", "email", "phone", "username")
+ORDER_FIELDS = ("id", "customer_id", "product", "quantity", "price", "status")
+# A customer's orders all share its id, so their table leaves the column out
+CUSTOMER_ORDER_FIELDS = ("id", "product", "quantity", "price", "status")
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON encoding with the fastest encoder available"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def customer_record(customer: Mapping) -> Dict[str, str]:
+    """Plain dict of a customer row, whatever view the backend returned"""
+    return {field: customer[field] for field in CUSTOMER_FIELDS}
+
+
+def order_record(order: Mapping) -> Dict[str, Any]:
+    """Plain dict of an order row; every backend already types quantity and price"""
+    return {field: order[field] for field in ORDER_FIELDS}
+
+
+def table(rows: Iterable[Optional[Mapping]], fields: Sequence[str]) -> Dict[str, Any]:
+    """Lists of records as {"fields": [...], "rows": [[...], ...]}
+
+    Field names are sent once instead of once per record, which keeps a
+    long list smaller than its text rendering. Missing rows stay null.
+    """
+    return {"fields": list(fields),
+            "rows": [[row[field] for field in fields] if row else None for row in rows]}
+
+
+def records(payload: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """Expand a table() payload back into one dict per row"""
+    fields = payload["fields"]
+    return [dict(zip(fields, row)) if row is not None else None for row in payload["rows"]]
+
+
+def cancellation_records(order_ids: Sequence, outcomes: Sequence[str]) -> List[Dict[str, str]]:
+    """One {"id", "outcome"} record per cancellation, in request order"""
+    return [{"id": str(order_id), "outcome": outcome} for order_id, outcome in zip(order_ids, outcomes)]
+
+
+def user_record(result: Any) -> Dict[str, str]:
+    """A customer's record, or {"error": message} for a failed lookup"""
+    return customer_record(result) if isinstance(result, Mapping) else {"error": str(result)}
+
+
+def resolve_format(requested: Optional[str] = None) -> str:
+    """The requested output format, or CUSTOMERDB_TOOL_OUTPUT (default text)"""
+    fmt = (requested or os.environ.get("CUSTOMERDB_TOOL_OUTPUT", "text")).lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}; expected one of {', '.join(OUTPUT_FORMATS)}")
+    return fmt
+
+
+# A page cursor holds the row id of the last row served (see
+# StorageBackend.iter_customer_rows); 'start' is row id 0
+def encode_cursor(row: int) -> str:
+    return base64.urlsafe_b64encode(f"r:{row}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    if cursor == "start":
+        return 0
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, row = decoded.split(":", 1)
+        if prefix != "r" or int(row) < 0:
+            raise ValueError
+        return int(row)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def page_limit(limit: str) -> int:
+    limit = int(limit)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+# Text renderings, shared by multi_tools_server.py and the shard router so
+# both answer every tool with the same prose
+def format_customer(c: Mapping) -> str:
+    return f"Customer {c['id']}: {c['name']} ({c['email']})"
+
+
+def format_order_line(o: Mapping) -> str:
+    return f"Order {o['id']}: {o['product']} (Status: {o['status']})"
+
+
+def format_user(result: Any) -> str:
+    if isinstance(result, Mapping):
+        return (
+            f"Found user:\n"
+            f"Name: {result['name']}\n"
+            f"Email: {result['email']}\n"
+            f"Phone: {result['phone']}\n"
+            f"Username: {result['username']}\n"
+            f"Customer ID: {result['id']}"
+        )
+    return str(result)
+
+
+def format_order(order: Optional[Mapping]) -> str:
+    if order:
+        return (
+            f"Order details:\n"
+            f"ID: {order['id']}\n"
+            f"Product: {order['product']}\n"
+            f"Quantity: {order['quantity']}\n"
+            f"Price: ${order['price']}\n"
+            f"Status: {order['status']}\n"
+            f"Customer ID: {order['customer_id']}"
+        )
+    return "Order not found"
+
+
+def format_customer_orders(customer_id: str, orders: Sequence[Mapping]) -> str:
+    if not orders:
+        return f"No orders found for customer {customer_id}"
+
+    order_list = "\n\n".join([
+        f"Order ID: {order['id']}\n"
+        f"Product: {order['product']}\n"
+        f"Quantity: {order['quantity']}\n"
+        f"Price: ${order['price']}\n"
+        f"Status: {order['status']}"
+        for order in orders
+    ])
+
+    return f"Orders for customer {customer_id}:\n\n{order_list}"
+
+
+def format_search(query: str, matches: Sequence) -> str:
+    """Ranked (customer, score) pairs"""
+    if not matches:
+        return f"No customers match '{query}'"
+    lines = [
+        f"{rank}. {c['name']} (Email: {c['email']}, Username: {c['username']}) "
+        f"Customer ID: {c['id']}, score {score}"
+        for rank, (c, score) in enumerate(matches, 1)
+    ]
+    return f"Customers matching '{query}':\n" + "\n".join(lines)
+
+
+def format_customer_totals(totals: Mapping) -> str:
+    return (
+        f"Customer {totals['customer_id']}:\n"
+        f"Orders: {totals['orders']} ({totals['cancelled']} cancelled)\n"
+        f"Units: {totals['units']}\n"
+        f"Total spent: ${totals['spent']:.2f}"
+    )
+
+
+def format_status_counts(counts: Mapping) -> str:
+    return "\n".join(f"{status}: {count}" for status, count in counts.items()) or "No orders"
+
+
+def format_top_products(products: Sequence[Mapping]) -> str:
+    return "\n".join(
+        f"{rank}. {p['product']}: ${p['revenue']:.2f} from {p['units']} units in {p['orders']} orders"
+        for rank, p in enumerate(products, 1)
+    ) or "No products"
+
+
+def format_orders(order_ids: Sequence, orders: Sequence[Optional[Mapping]]) -> str:
+    return "\n\n".join(
+        format_order(order) if order else f"Order {order_id} not found"
+        for order_id, order in zip(order_ids, orders)
+    )
+
+
+def format_cancellations(order_ids: Sequence, outcomes: Sequence[str]) -> str:
+    return "\n".join(
+        f"Order {order_id}: {outcome}"
+        for order_id, outcome in zip(order_ids, outcomes)
+    )
@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import json
+import sys
+from contextlib import asynccontextmanager
+from typing import Deque, Tuple
+
+import anyio
+import anyio.lowlevel
+from anyio.abc import Process
+from anyio.streams.text import TextReceiveStream
+from mcp import StdioServerParameters, types
+from mcp.client.stdio import get_default_environment
+
+# Sent to a spare as soon as it starts; the reply proves imports are done,
+# and spares load their data eagerly (CUSTOMERDB_DEFER_LOAD=0) before
+# answering it. Servers accept a repeated initialize, so the session
+# that later takes the process over still performs the normal handshake.
+WARMUP_REQUEST = {
+    "jsonrpc": "2.0",
+    "id": "warm-spare",
+    "method": "initialize",
+    "params": {
+        "protocolVersion": types.LATEST_PROTOCOL_VERSION,
+        "capabilities": {},
+        "clientInfo": {"name": "warm-spare", "version": "0.1.0"},
+    },
+}
+
+
+class WarmSpawner:
+    """Drop-in replacement for stdio_client that hands out already-started servers
+
+    Keeps `spares` server processes running ahead of demand. Each has
+    finished importing, loaded its data and answered a warm-up initialize,
+    so a new session skips the cold start; taking one immediately starts
+    its replacement.
+
+        spawner = WarmSpawner(StdioServerParameters(command="python", args=["multi_tools_server.py"]))
+        async with spawner.client() as (read, write):
+            ...
+        await spawner.aclose()
+    """
+
+    def __init__(self, server: StdioServerParameters, spares: int = 1):
+        self.server = server
+        self.spares = spares
+        self._pending: Deque[asyncio.Task] = collections.deque()
+
+    async def _spawn(self) -> Tuple[Process, str]:
+        env = dict(self.server.env if self.server.env is not None else get_default_environment())
+        # A spare has time to spare: load the data now, not on the first real call
+        env.setdefault("CUSTOMERDB_DEFER_LOAD", "0")
+        process = await anyio.open_process([self.server.command, *self.server.args], env=env, stderr=sys.stderr)
+        try:
+            await process.stdin.send((json.dumps(WARMUP_REQUEST) + "\n").encode(self.server.encoding))
+            buffer = ""
+            async for chunk in TextReceiveStream(process.stdout, encoding=self.server.encoding,
+                                                 errors=self.server.encoding_error_handler):
+                buffer += chunk
+                if "\n" in buffer:
+                    # Drop the warm-up reply; anything after it belongs to the session
+                    return process, buffer.split("\n", 1)[1]
+            raise RuntimeError(f"server exited during warm-up with {await process.wait()}")
+        except BaseException:
+            process.kill()
+            raise
+
+    def prestart(self) -> None:
+        """Top the spares up to `spares` processes"""
+        while len(self._pending) < self.spares:
+            self._pending.append(asyncio.create_task(self._spawn()))
+
+    async def ready(self) -> None:
+        """Wait until every spare has finished warming up"""
+        self.prestart()
+        await asyncio.gather(*self._pending)
+
+    async def _take(self) -> Tuple[Process, str]:
+        self.prestart()
+        task = self._pending.popleft()
+        self.prestart()
+        return await task
+
+    @asynccontextmanager
+    async def client(self):
+        """Like stdio_client(server), but served from a spare process"""
+        process, buffer = await self._take()
+        read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+        write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+        encoding, errors = self.server.encoding, self.server.encoding_error_handler
+
+        async def stdout_reader(buffer: str):
+            try:
+                async with read_stream_writer:
+                    async for chunk in TextReceiveStream(process.stdout, encoding=encoding, errors=errors):
+                        lines = (buffer + chunk).split("\n")
+                        buffer = lines.pop()
+                        for line in lines:
+                            try:
+                                message = types.JSONRPCMessage.model_validate_json(line)
+                            except Exception as exc:
+                                await read_stream_writer.send(exc)
+                                continue
+                            await read_stream_writer.send(message)
+            except anyio.ClosedResourceError:
+                await anyio.lowlevel.checkpoint()
+
+        async def stdin_writer():
+            try:
+                async with write_stream_reader:
+                    async for message in write_stream_reader:
+                        line = message.model_dump_json(by_alias=True, exclude_none=True)
+                        await process.stdin.send((line + "\n").encode(encoding, errors))
+            except anyio.ClosedResourceError:
+                await anyio.lowlevel.checkpoint()
+
+        async with anyio.create_task_group() as tg, process:
+            tg.start_soon(stdout_reader, buffer)
+            tg.start_soon(stdin_writer)
+            yield read_stream, write_stream
+
+    async def aclose(self) -> None:
+        """Stop the spares that were never handed out"""
+        while self._pending:
+            task = self._pending.popleft()
+            task.cancel()
+            try:
+                process, _ = await task
+            except BaseException:
+                continue
+            process.kill()
+            await process.aclose()